@@ -0,0 +1,66 @@
+"""Time each program in programs/ under each of the interpreter's engines
+
+Parsing is left out: each program is parsed once, then interpreted
+repeatedly with its output discarded, and the best time is reported. A last
+row times a while loop of LOOP_ITERATIONS passes, for loop throughput.
+
+    python benchmarks/bench_engines.py [repeats]
+"""
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_parser import Parser
+from rivulet.riv_tokens import Command, Glyph, Subtype, Token, TokenType
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+LOOP_ITERATIONS = 20000
+
+
+def countdown(n):
+    "Glyphs for a while loop moving n from list 2 to list 1, one at a time"
+    add = Token(type=TokenType.action, subtype=Subtype.element, command=Command.addition_assignment)
+    sub = Token(type=TokenType.action, subtype=Subtype.element, command=Command.subtraction_assignment)
+    return [
+        Glyph(level=1, list_size=2, tokens=[
+            Token(type=TokenType.data, subtype=Subtype.value, value=n, list=2, assign_to_cell=0, action=None)]),
+        Glyph(level=2, list_size=2, tokens=[
+            Token(type=TokenType.data, subtype=Subtype.value, value=1, list=1, assign_to_cell=0, action=add),
+            Token(type=TokenType.data, subtype=Subtype.value, value=1, list=2, assign_to_cell=0, action=sub),
+            Token(type=TokenType.question_marker, applies_to="cell", ref_cell=[2, 0], block_type="while")]),
+    ]
+
+
+def best_time(glyphs, engine, repeats):
+    "Fastest of repeats runs of the parsed program, in seconds"
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.engine = engine
+    best = None
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            intr.interpret_glyphs(glyphs)
+            secs = time.perf_counter() - start
+        best = secs if best is None else min(best, secs)
+    return best
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    engines = list(Interpreter.Engine)
+    print(f"{'program':20}" + "".join(f"{e.value:>12}" for e in engines))
+    for path in sorted(PROGRAMS.glob("*.riv")):
+        glyphs = Parser().parse_program(path.read_text(encoding="utf-8"))
+        times = [best_time(glyphs, e, repeats) for e in engines]
+        print(f"{path.name:20}" + "".join(f"{t * 1e3:9.3f} ms" for t in times))
+    glyphs = countdown(LOOP_ITERATIONS)
+    times = [best_time(glyphs, e, max(repeats // 10, 1)) for e in engines]
+    print(f"{'loop':20}" + "".join(f"{t * 1e3:9.3f} ms" for t in times))
+
+
+if __name__ == "__main__":
+    main()
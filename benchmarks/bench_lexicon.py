@@ -0,0 +1,63 @@
+"""Per-character cost of lexicon lookups and of parsing
+
+Compares a linear scan of the lexicon (how the parser used to find a
+character's entry) against the compiled tables from riv_lexicon, then
+reports the parse cost per source character on a scaled-up program.
+
+    python benchmarks/bench_lexicon.py [copies]
+"""
+import sys
+import timeit
+from pathlib import Path
+
+from rivulet.riv_parser import Parser
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+
+def scaled_program(copies):
+    "Repeat a program vertically so it holds many glyphs"
+    text = (PROGRAMS / "fibonacci1.riv").read_text(encoding="utf-8")
+    return "\n\n".join([text.strip("\n")] * copies)
+
+
+def bench_lookups(chars, number=20):
+    "Time the entry lookup for every character in chars, before and after"
+    try:
+        from rivulet.riv_lexicon import compile_lexicon
+    except ImportError:
+        return
+    lex = compile_lexicon()
+    entries = lex.entries
+
+    def linear():
+        for ch in chars:
+            _ = [l for l in entries if ch in l["symbol"]]
+
+    def table():
+        for ch in chars:
+            _ = lex.by_char.get(ch)
+
+    for name, fn in (("linear scan", linear), ("compiled table", table)):
+        secs = min(timeit.repeat(fn, number=number, repeat=5)) / number
+        print(f"{name:>16}: {secs / len(chars) * 1e9:8.1f} ns/char")
+
+
+def bench_parse(program, number=3):
+    "Time Parser construction and a full parse, per source character"
+    secs = min(timeit.repeat(Parser, number=200, repeat=5)) / 200
+    print(f"{'Parser()':>16}: {secs * 1e6:8.1f} us")
+
+    secs = min(timeit.repeat(lambda: Parser().parse_program(program), number=number, repeat=3)) / number
+    print(f"{'parse_program':>16}: {secs / len(program) * 1e6:8.2f} us/char ({len(program)} chars, {secs:.3f} s)")
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    program = scaled_program(copies)
+    bench_lookups(program)
+    bench_parse(program)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Time list questions as their list grows
+
+Models a while loop over a state holding one list of the given number of
+cells: each iteration changes a cell and asks a list question of the list.
+The question is answered from the list's counts, or by scanning every cell,
+as it was before lists kept counts. Reported times are per iteration.
+
+    python benchmarks/bench_list_questions.py [cells ...]
+"""
+import sys
+import time
+
+from rivulet.riv_counted import CountedList, list_question, scan
+
+ITERATIONS = 1000
+
+
+def per_iteration(values, question):
+    "Seconds per loop iteration, asking question of values"
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        values[i % len(values)] += 1
+        question(values)
+    return (time.perf_counter() - start) / ITERATIONS
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5]
+    print(f"{'cells':>9}{'counted':>14}{'scanned':>14}")
+    for cells in sizes:
+        counted = per_iteration(CountedList(range(cells)), list_question)
+        scanned = per_iteration(list(range(cells)), scan)
+        print(f"{cells:>9}{counted * 1e6:>11.2f} us{scanned * 1e6:>11.2f} us")
+
+
+if __name__ == "__main__":
+    main()
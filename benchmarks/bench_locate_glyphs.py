@@ -0,0 +1,41 @@
+"""Time the glyph location phase on multi-megabyte sources
+
+Every program in programs/ is stacked, then repeated, until the source
+reaches the requested size.
+
+    python benchmarks/bench_locate_glyphs.py [megabytes ...]
+"""
+import sys
+import time
+from pathlib import Path
+
+from rivulet.riv_parser import Parser
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+
+def scaled_source(megabytes):
+    "All of programs/ stacked and repeated to roughly the given size (in utf-8 bytes)"
+    block = "\n\n".join(p.read_text(encoding="utf-8").strip("\n") for p in sorted(PROGRAMS.glob("*.riv")))
+    copies = max(1, round(megabytes * 2 ** 20 / len(block.encode("utf-8"))))
+    return "\n\n".join([block] * copies)
+
+
+def main():
+    sizes = [float(a) for a in sys.argv[1:]] or [1, 2, 4]
+    parser = Parser()
+    for size in sizes:
+        source = scaled_source(size)
+        grid = [list(ln) for ln in source.splitlines()]
+
+        start = time.perf_counter()
+        glyph_locs = parser._Parser__locate_glyphs(grid) # pylint: disable=protected-access
+        secs = time.perf_counter() - start
+
+        mb = len(source.encode("utf-8")) / 2 ** 20
+        print(f"{mb:6.2f} MB, {len(source):>9} chars, {len(glyph_locs):>6} glyphs: "
+              f"{secs:7.3f} s ({secs / len(source) * 1e9:6.1f} ns/char)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Compare serial and process-pool parsing of a large source
+
+Every program in programs/ is stacked, then repeated, until the source
+reaches the requested size.
+
+    python benchmarks/bench_parallel_parse.py [megabytes] [workers ...]
+
+As well as timing each worker count, it models the time on a machine with
+that many free cores: the workers share the lexing and the packing and
+pickling of their tokens, and the parent unpickles and unpacks them all.
+"""
+import os
+import pickle
+import sys
+import time
+
+from rivulet.riv_parser import Parser
+from rivulet.riv_tokens import pack_token, unpack_token
+from bench_locate_glyphs import scaled_source
+
+
+def transfer_costs(glyphs):
+    "Seconds to send the glyphs' tokens from the workers, and to receive them in the parent"
+    tokens = [g["tokens"] for g in glyphs]
+    start = time.perf_counter()
+    data = pickle.dumps([[pack_token(t) for t in ts] for ts in tokens])
+    sending = time.perf_counter() - start
+    start = time.perf_counter()
+    _ = [[unpack_token(t) for t in ts] for ts in pickle.loads(data)]
+    return sending, time.perf_counter() - start
+
+
+def main():
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    worker_counts = [int(a) for a in sys.argv[2:]] or [1, 2, os.cpu_count() or 1]
+    source = scaled_source(size)
+
+    serial = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        glyphs = Parser(workers=workers).parse_program(source)
+        secs = time.perf_counter() - start
+        serial = secs if workers == 1 else serial
+        print(f"{workers:>3} workers, {len(glyphs):>6} glyphs: {secs:7.3f} s")
+
+    if serial is None:
+        start = time.perf_counter()
+        glyphs = Parser().parse_program(source)
+        serial = time.perf_counter() - start
+    sending, receiving = transfer_costs(glyphs)
+    print(f"serial {serial:.3f} s, sending tokens {sending:.3f} s, receiving them {receiving:.3f} s")
+    for workers in (2, 4, 8):
+        modelled = (serial + sending) / workers + receiving
+        print(f"modelled, {workers} cores: {modelled:7.3f} s ({serial / modelled:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Compare a full parse with re-parsing after a one-line edit
+
+Every program in programs/ is stacked, then repeated, until the source
+reaches the requested size.
+
+    python benchmarks/bench_reparse.py [megabytes ...]
+"""
+import sys
+import time
+
+from rivulet.riv_parser import Parser
+from bench_locate_glyphs import scaled_source
+
+
+def main():
+    sizes = [float(a) for a in sys.argv[1:]] or [0.25, 0.5, 1]
+    parser = Parser()
+    for size in sizes:
+        source = scaled_source(size)
+
+        start = time.perf_counter()
+        parsed = parser.parse_for_edits(source)
+        full = time.perf_counter() - start
+
+        # open a blank line above the middle glyph
+        at = parsed.tops[len(parsed.glyphs) // 2]
+        start = time.perf_counter()
+        parser.reparse_lines(parsed, at, at, [""])
+        edit = time.perf_counter() - start
+
+        lines = source.splitlines()
+        lines.insert(at, "")
+        start = time.perf_counter()
+        parser.reparse_program(parsed, "\n".join(lines))
+        diffed = time.perf_counter() - start
+
+        print(f"{len(parsed.glyphs):>6} glyphs: parse {full * 1e3:8.1f} ms, "
+              f"reparse_lines {edit * 1e3:6.2f} ms, reparse_program {diffed * 1e3:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Compare rollback strategies as the state grows
+
+Models a while loop over a state holding one list of the given number of
+cells: each iteration takes a savepoint (as each repeat of a block does),
+changes a few cells, appends to a second list, and the last iteration rolls
+back. Reported times are per iteration.
+
+    python benchmarks/bench_rollback.py [cells ...]
+"""
+import sys
+import time
+
+from rivulet.riv_journal import JournalRollback, SnapshotRollback
+from rivulet.riv_state import State
+
+ITERATIONS = 20
+
+
+def per_iteration(strategy, cells):
+    "Seconds per loop iteration with the given strategy"
+    state = State([1, 2, 3])
+    state.of(1).extend(range(cells))
+    state = strategy.track(state)
+    start = time.perf_counter()
+    savepoint = None
+    for i in range(ITERATIONS):
+        savepoint = strategy.savepoint(state)
+        values = state.of(1)
+        values[i] += 1
+        values[-1 - i] -= 1
+        values[cells // 2] = i
+        state.of(2).append(i)
+    state = strategy.rollback(state, savepoint)
+    return (time.perf_counter() - start) / ITERATIONS
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+    print(f"{'cells':>9}{'journal':>14}{'snapshot':>14}")
+    for cells in sizes:
+        journal = per_iteration(JournalRollback(), cells)
+        snapshot = per_iteration(SnapshotRollback(), cells)
+        print(f"{cells:>9}{journal * 1e6:>11.2f} us{snapshot * 1e6:>11.0f} us")
+
+
+if __name__ == "__main__":
+    main()
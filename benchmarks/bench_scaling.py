@@ -0,0 +1,96 @@
+"""Time parsing and interpreting synthetic programs of growing size, per glyph
+
+Programs of each size are drawn by riv_synthetic, all of the same shape, and
+each is parsed and interpreted (under each engine asked for) repeatedly; the
+best time is reported per glyph. The final state of a run is checked against
+the one the generator expects. Per glyph, the time should hold steady as
+programs grow: a phase whose time per glyph at some size is more than the
+threshold times its time at the smallest size grows faster than linearly, and
+the runner exits with status 1. The python engine compiles a program as one
+module, which takes some 60 KB of memory per glyph: give it smaller sizes.
+
+    python benchmarks/bench_scaling.py [--sizes N ...] [--repeats N] [--engines ENGINE ...]
+                                       [--seed N] [--threshold RATIO]
+"""
+import contextlib
+import io
+import sys
+import time
+from argparse import ArgumentParser
+
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_parser import Parser
+from rivulet.riv_synthetic import Shape, generate
+
+
+def best_time(run, repeats):
+    "Fastest of repeats runs, in seconds, with anything they print discarded"
+    best = None
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            secs = time.perf_counter() - start
+        best = secs if best is None else min(best, secs)
+    return best
+
+
+def interpret(glyphs, engine, debug=None):
+    "Run parsed glyphs under an engine"
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.engine = engine
+    intr.interpret_glyphs(glyphs, debug)
+
+
+def final_state(glyphs, engine):
+    "The state a run of the glyphs ends with"
+    states = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        interpret(glyphs, engine, states.append)
+    return states[-1]
+
+
+def main():
+    arg_parser = ArgumentParser(description="Time parsing and interpreting synthetic programs, per glyph")
+    arg_parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000],
+                            help="glyphs in each program")
+    arg_parser.add_argument("--repeats", type=int, default=3, help="runs of each phase")
+    arg_parser.add_argument("--engines", nargs="*", type=Interpreter.Engine, default=[Interpreter.Engine.compiled],
+                            choices=list(Interpreter.Engine), help="engines to interpret with")
+    arg_parser.add_argument("--seed", type=int, default=0, help="seed the programs are drawn with")
+    arg_parser.add_argument("--threshold", type=float, default=2.0,
+                            help="growth in time per glyph, over the smallest size, that counts as a regression")
+    args = arg_parser.parse_args()
+
+    phases = ["parse"] + [f"interpret {engine.name}" for engine in args.engines]
+    print(f"{'glyphs':>8}{'source MB':>11}" + "".join(f"{p:>22}" for p in phases) + "   (us per glyph)")
+    per_glyph = dict((p, {}) for p in phases)
+    failed = False
+    for size in sorted(args.sizes):
+        program = generate(Shape(glyphs=size), args.seed)
+        glyphs = Parser().parse_program(program.source)
+        per_glyph["parse"][size] = best_time(lambda: Parser().parse_program(program.source), args.repeats) / size
+        for engine in args.engines:
+            phase = f"interpret {engine.name}"
+            per_glyph[phase][size] = best_time(lambda: interpret(glyphs, engine), args.repeats) / size
+            if final_state(glyphs, engine) != program.expected:
+                print(f"WRONG STATE {size} glyphs, {engine.name} engine")
+                failed = True
+        megabytes = len(program.source.encode("utf-8")) / 2 ** 20
+        print(f"{size:>8}{megabytes:>11.1f}" + "".join(f"{per_glyph[p][size] * 1e6:>22.2f}" for p in phases))
+
+    smallest = min(args.sizes)
+    for phase, times in per_glyph.items():
+        for size, secs in times.items():
+            ratio = secs / times[smallest]
+            if ratio > args.threshold:
+                print(f"REGRESSION {phase}: {ratio:.2f}x the time per glyph at {size} glyphs as at {smallest}")
+                failed = True
+    if failed:
+        sys.exit(1)
+    print(f"time per glyph within {args.threshold:g}x of that at {smallest} glyphs")
+
+
+if __name__ == "__main__":
+    main()
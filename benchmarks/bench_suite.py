@@ -0,0 +1,151 @@
+"""Time each phase of running Rivulet: parse, interpret, transpile and draw as SVG
+
+Every program in programs/ is timed, then the whole of programs/ stacked and
+repeated to each of the scaled sizes (see bench_locate_glyphs), which is parsed,
+transpiled and drawn but not run, the programs stacked being no program, and
+while loops of each of the loop sizes (see bench_engines), which are run. Each
+phase is run repeatedly and reported as the median time and its spread. Results can be
+written as JSON, and compared against a baseline written the same way: a
+phase whose median is more than the threshold slower than the baseline's is a
+regression, and the runner exits with status 1.
+
+    python benchmarks/bench_suite.py [--repeats N] [--sizes MB ...] [--loops N ...]
+                                     [--json FILE] [--baseline FILE] [--threshold FRACTION]
+"""
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_parser import Parser
+from rivulet.riv_python_transpiler import PythonTranspiler
+from rivulet.riv_svg_generator import SvgGenerator
+from rivulet.riv_themes import Themes
+from bench_engines import countdown
+from bench_locate_glyphs import scaled_source
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+PHASES = ("parse", "interpret", "transpile", "svg")
+
+
+def phases(source, svg_file, glyphs=None):
+    "Each phase as a function of no arguments, run against the source once parsed (or the glyphs given)"
+    if glyphs is None:
+        glyphs = Parser().parse_program(source)
+
+    def interpret():
+        intr = Interpreter()
+        intr.output = Interpreter.OutputOption.numeric
+        intr.interpret_glyphs(glyphs)
+
+    def svg():
+        SvgGenerator(Themes["default"]).generate(glyphs, svg_file)
+        # the generator writes elsewhere if the file is there already
+        os.remove(svg_file)
+
+    return {
+        "parse": lambda: Parser().parse_program(source),
+        "interpret": interpret,
+        "transpile": lambda: PythonTranspiler().print_program(glyphs),
+        "svg": svg,
+    }
+
+
+def times(run, repeats):
+    "Seconds taken by each of repeats runs, with anything they print discarded"
+    secs = []
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            secs.append(time.perf_counter() - start)
+    return secs
+
+
+def summary(secs) -> dict:
+    "The median of a phase's times and their spread"
+    return {
+        "median": statistics.median(secs),
+        "stdev": statistics.stdev(secs) if len(secs) > 1 else 0.0,
+        "min": min(secs),
+        "max": max(secs),
+        "runs": secs,
+    }
+
+
+def cases(sizes, loops, svg_file):
+    "(name, phases to time) of each case: each program, programs/ scaled to each size, then each loop"
+    for path in sorted(PROGRAMS.glob("*.riv")):
+        yield path.name, phases(path.read_text(encoding="utf-8"), svg_file)
+    for size in sizes:
+        scaled = phases(scaled_source(size), svg_file)
+        del scaled["interpret"]
+        yield f"scaled-{size:g}MB", scaled
+    for iterations in loops:
+        yield f"loop-{iterations}", {"interpret": phases(None, svg_file, countdown(iterations))["interpret"]}
+
+
+def regressions(results, baseline, threshold):
+    "(case, phase, ratio) for each phase slower than the baseline by more than threshold"
+    slower = []
+    for case, case_phases in results.items():
+        for phase, stats in case_phases.items():
+            before = baseline.get(case, {}).get(phase)
+            if before is None or before["median"] <= 0:
+                continue
+            ratio = stats["median"] / before["median"]
+            if ratio > 1 + threshold:
+                slower.append((case, phase, ratio))
+    return slower
+
+
+def main():
+    arg_parser = ArgumentParser(description="Time each phase of running Rivulet programs")
+    arg_parser.add_argument("--repeats", type=int, default=11, help="runs of each phase")
+    arg_parser.add_argument("--sizes", type=float, nargs="*", default=[0.05, 0.2],
+                            help="sizes in MB to scale programs/ to")
+    arg_parser.add_argument("--loops", type=int, nargs="*", default=[1000, 10000],
+                            help="iterations of the while loops to run")
+    arg_parser.add_argument("--json", dest="json_file", default=None, metavar="FILE", help="write the results to FILE")
+    arg_parser.add_argument("--baseline", default=None, metavar="FILE", help="compare against results in FILE")
+    arg_parser.add_argument("--threshold", type=float, default=0.1,
+                            help="slowdown against the baseline, as a fraction, that counts as a regression")
+    args = arg_parser.parse_args()
+
+    results = {}
+    print(f"{'case':20}" + "".join(f"{p:>22}" for p in PHASES))
+    with tempfile.TemporaryDirectory() as tmp:
+        svg_file = os.path.join(tmp, "bench.svg")
+        for name, case_phases in cases(args.sizes, args.loops, svg_file):
+            # large inputs get fewer runs, but never fewer than three
+            repeats = args.repeats if name.endswith(".riv") else max(3, args.repeats // 4)
+            results[name] = dict((phase, summary(times(run, repeats))) for phase, run in case_phases.items())
+            print(f"{name:20}" + "".join(
+                f"{results[name][p]['median'] * 1e3:11.3f} ms +- {results[name][p]['stdev'] * 1e3:6.3f}"
+                if p in results[name] else f"{'-':>22}" for p in PHASES))
+
+    if args.json_file:
+        with open(args.json_file, "w", encoding="utf-8") as file:
+            json.dump({"python": platform.python_version(), "results": results}, file, indent=1)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        slower = regressions(results, baseline, args.threshold)
+        for case, phase, ratio in slower:
+            print(f"REGRESSION {case} {phase}: {ratio:.2f}x the baseline")
+        if slower:
+            sys.exit(1)
+        print(f"no phase more than {args.threshold:.0%} slower than the baseline")
+
+
+if __name__ == "__main__":
+    main()
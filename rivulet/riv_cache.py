@@ -0,0 +1,225 @@
+"On-disk cache of parsed Rivulet programs, and of the Python the python engine compiles them to, keyed by the program text and the language tables"
+import hashlib
+import json
+import marshal
+import os
+import stat
+import sys
+import tempfile
+import zlib
+from functools import cache
+from pathlib import Path
+
+from rivulet import __version__
+from rivulet.riv_parser import Parser
+from rivulet.riv_tokens import glyphs_from_json, to_json
+
+# bump when the shape of the parser's output changes
+CACHE_FORMAT = 1
+
+CACHE_SUFFIX = ".rivc"
+CODE_SUFFIX = ".rivpyc"
+
+
+@cache
+def tables_digest() -> str:
+    "Hash of everything besides the program text that decides how it parses"
+    digest = hashlib.sha256(f"{__version__}:{CACHE_FORMAT}".encode("utf-8"))
+    here = Path(__file__).parent
+    for table in ("_lexicon.json", "_commands.json"):
+        digest.update((here / table).read_bytes())
+    return digest.hexdigest()
+
+
+def default_cache_dir() -> Path:
+    "RIVULET_CACHE_DIR if set, otherwise rivulet/ in the user's cache directory"
+    if os.environ.get("RIVULET_CACHE_DIR"):
+        return Path(os.environ["RIVULET_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "rivulet"
+
+
+def _private(path) -> bool:
+    "Whether a path (or open file descriptor) is the user's own, and no one else can write to it"
+    if not hasattr(os, "geteuid"):
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return st.st_uid == os.geteuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+class ParseCache:
+    """Stores the output of Parser.parse_program as compressed JSON, one file per program,
+    and the compiled Python the python engine runs programs as (see riv_python_backend),
+    so that runs in new processes (each riv command, say) reuse both
+
+    directory: where entries are kept (see default_cache_dir)
+    max_bytes: once the entries take more than this, the least recently used are removed
+
+    Entries are written to a temporary file and renamed into place, so readers
+    never see a partial entry and concurrent writers of the same program simply
+    replace one another's (identical) result. An entry that can't be read is
+    treated as a miss. The compiled Python is kept as marshalled code objects,
+    which only the Python version that wrote them reads: its key includes the
+    version (see code_key).
+
+    Code entries are run as they are loaded, so whoever can write to the
+    directory can run code as anyone loading them. Parses are only data, but
+    code is only kept, or loaded, in a directory that is trusted: one of the
+    user's own that no one else can write to. Nothing checks where the code in
+    a trusted directory came from; the interpreter only keeps code in its cache
+    when asked to (Interpreter.cache_code, riv --cache-code).
+    """
+
+    DEFAULT_MAX_BYTES = 64 * 2 ** 20
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory) if directory else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+
+    def key(self, program:str) -> str:
+        "Content address for a program"
+        digest = hashlib.sha256(tables_digest().encode("utf-8"))
+        digest.update(program.encode("utf-8"))
+        return digest.hexdigest()
+
+
+    def code_key(self, *parts) -> str:
+        "Content address for the compiled Python of a program, given what its source depends on"
+        digest = hashlib.sha256(f"{tables_digest()}:{sys.implementation.cache_tag}".encode("utf-8"))
+        digest.update(repr(parts).encode("utf-8"))
+        return digest.hexdigest()
+
+
+    def __path(self, key, suffix=CACHE_SUFFIX):
+        return self.directory / f"{key}{suffix}"
+
+
+    @staticmethod
+    def __touch(path):
+        "Mark an entry as recently used, for eviction"
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+    def load(self, key):
+        "The cached parse for a key, or None"
+        path = self.__path(key)
+        try:
+            with open(path, "rb") as file:
+                glyphs = glyphs_from_json(json.loads(zlib.decompress(file.read())))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError, zlib.error):
+            return None
+        self.__touch(path)
+        return glyphs
+
+
+    def store(self, key, glyphs):
+        "Write a parse to the cache, then evict old entries if over size"
+        data = zlib.compress(json.dumps(glyphs, separators=(",", ":"), ensure_ascii=False, default=to_json).encode("utf-8"))
+        self.__write(self.__path(key), data)
+
+
+    def trusted(self) -> bool:
+        """Whether code kept in the directory can be run: the directory is the
+        user's and no one else can write to it (never, where that can't be told)"""
+        return _private(self.directory)
+
+
+    def load_code(self, key):
+        "The cached code object for a key (see code_key), or None, as always if the directory isn't trusted"
+        if not self.trusted():
+            return None
+        path = self.__path(key, CODE_SUFFIX)
+        try:
+            with open(path, "rb") as file:
+                if not _private(file.fileno()):
+                    return None
+                code = marshal.loads(file.read())
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+        self.__touch(path)
+        return code
+
+
+    def store_code(self, key, code):
+        "Write a code object to the cache, if the directory is trusted, then evict old entries if over size"
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if self.trusted():
+            self.__write(self.__path(key, CODE_SUFFIX), marshal.dumps(code))
+
+
+    def __write(self, path, data):
+        "Write an entry through a temporary file renamed into place, then evict"
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+        self.evict()
+
+
+    def evict(self):
+        "Remove least recently used entries until the cache fits in max_bytes"
+        entries = []
+        for path in self.__entries():
+            try:
+                st = path.stat()
+            except OSError:
+                continue # removed by another process
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total -= size
+
+
+    def clear(self):
+        "Remove every entry"
+        for path in self.__entries():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+    def __entries(self):
+        "The paths of the entries, parses and code alike"
+        yield from self.directory.glob(f"*{CACHE_SUFFIX}")
+        yield from self.directory.glob(f"*{CODE_SUFFIX}")
+
+
+    def parse(self, program:str, parser=None):
+        "Parse a program, using the cached result when there is one"
+        key = self.key(program)
+        glyphs = self.load(key)
+        if glyphs is not None:
+            self.hits += 1
+            return glyphs
+
+        self.misses += 1
+        glyphs = (parser or Parser()).parse_program(program)
+        self.store(key, glyphs)
+        return glyphs
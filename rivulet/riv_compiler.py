@@ -0,0 +1,225 @@
+"""Compiles parsed glyphs into execution plans: a tuple of Python callables per glyph,
+one per token, with the token's source, target cell, command and padding bound ahead
+of time. Each callable takes the state and returns an Action (question markers)
+or None (every other token), exactly as the interpreter's tree-walker would."""
+import operator
+from enum import Enum
+from functools import partial
+
+from rivulet.riv_counted import list_question
+from rivulet.riv_limits import bounded_kernel
+from rivulet.riv_tokens import Command, Subtype, TokenType
+from rivulet.riv_vector import new_values
+
+Action = Enum('Action', [
+    ('rollback', 1),    # undo all changes to state and exit block
+    ('cont', 2),        # continue to next glyph
+    ('repeat', 3)       # repeat the block
+])
+
+# command kernels: (value in the cell, value applied to it) -> new value for the cell
+KERNELS = {
+    Command.addition_assignment: operator.add,
+    Command.subtraction_assignment: operator.sub,
+    Command.reverse_subtraction_assignment: lambda initial, assign: assign - initial,
+    Command.overwrite: lambda initial, assign: assign,
+    Command.multiplication_assignment: operator.mul,
+    Command.division_assignment: operator.truediv,
+    Command.reverse_division_assignment: lambda initial, assign: assign / initial,
+    Command.mod_assignment: operator.mod,
+    Command.reverse_mod_assignment: lambda initial, assign: assign % initial,
+    Command.exponent_assignment: operator.pow,
+    Command.root_assignment: lambda initial, assign: initial ** (1 / assign),
+}
+
+
+def kernel(command):
+    "The kernel for a command (commands without one leave None in the cell)"
+    return KERNELS.get(command, lambda initial, assign: None)
+
+
+def compile_glyph(glyph, reference, vector=False, checked=False, slot=None, max_bits=None) -> tuple:
+    """The execution plan for a glyph: a callable for each of its tokens, in order
+
+    reference: the tree-walker's step, reference(token, state), used for any
+    token whose fields don't fit one of the compiled forms
+    vector: run list and list to list commands over whole lists with NumPy where
+    it gives the same result (see riv_vector)
+    checked: check list questions' counts against the list (see riv_counted)
+    slot: the slot of a list id in the state, or None if it has no such list (see
+    riv_state); without it, the state is indexed by list id
+    max_bits: the most bits an integer made by multiplication or an exponent may
+    have (see riv_limits)
+    """
+    return tuple(compile_token(token, reference, vector, checked, slot, max_bits) for token in glyph.tokens)
+
+
+def compile_token(token, reference, vector=False, checked=False, slot=None, max_bits=None):
+    "A callable running one token against the state"
+    if slot is None:
+        slot = lambda list_id: list_id
+    if token.type == TokenType.question_marker:
+        return _compile_question(token, reference, checked, slot)
+
+    # a list the state doesn't have is reported by the tree-walker, as it runs the token
+    target_list = slot(token.get("list"))
+    ref_list = slot(token.ref_cell[0]) if "ref_cell" in token else None
+    if target_list is None or ("ref_cell" in token and ref_list is None):
+        return partial(reference, token)
+
+    action = token.get("action")
+    if action is not None and "command" not in action:
+        # the tree-walker reports this as it runs the token
+        return partial(reference, token)
+    command = action.command if action is not None else None
+    list2list = action is not None and action.get("subtype") == Subtype.list2list
+    # a command checking the size of the integers it makes runs cell by cell
+    op = bounded_kernel(command, max_bits)
+    if op is None:
+        op = kernel(command)
+    else:
+        vector = False
+
+    if list2list:
+        if token.subtype != Subtype.ref:
+            return partial(reference, token)
+        return _compile_list2list(token, target_list, ref_list, command, op, vector)
+
+    if token.subtype == Subtype.value:
+        source = _value_source(token.value)
+    elif token.subtype == Subtype.ref:
+        source = _ref_source(ref_list, token.ref_cell[1])
+    else:
+        source = _no_source
+
+    cell = token.assign_to_cell
+    # if the cell is not in the list, it is initialized to zero (unless it is appended to)
+    pad = command not in (Command.pop_and_append, Command.append)
+
+    if action is None:
+        # defaults to add_assign
+        if token.subtype == Subtype.value:
+            value = token.value
+            def step(state):
+                target = state[target_list]
+                if len(target) == cell:
+                    target.append(0)
+                target[cell] += value
+            return step
+
+        def step(state):
+            target = state[target_list]
+            if len(target) == cell:
+                target.append(0)
+            target[cell] += source(state)
+        return step
+
+    if command == Command.insert:
+        apply = lambda state, target, value: target.insert(cell, value)
+    elif command == Command.append:
+        apply = lambda state, target, value: target.append(value)
+    elif command == Command.pop:
+        if token.subtype == Subtype.ref:
+            ref_idx = token.ref_cell[1]
+            def apply(state, target, value):
+                target[cell] += value
+                state[ref_list].pop(ref_idx)
+        else:
+            def apply(state, target, value):
+                target[cell] += value
+    elif command == Command.pop_and_append:
+        if "ref_cell" not in token:
+            return partial(reference, token)
+        ref_idx = token.ref_cell[1]
+        apply = lambda state, target, value: target.append(state[ref_list].pop(ref_idx))
+    elif action.get("subtype") == Subtype.list:
+        def apply(state, target, value):
+            if vector:
+                values = new_values(command, target, value)
+                if values is not None:
+                    target[:] = values
+                    return
+            for i, v in enumerate(target):
+                target[i] = op(v, value)
+    else:
+        def apply(state, target, value):
+            target[cell] = op(target[cell], value)
+
+    if pad:
+        def step(state):
+            target = state[target_list]
+            if len(target) == cell:
+                target.append(0)
+            apply(state, target, source(state))
+    else:
+        def step(state):
+            apply(state, state[target_list], source(state))
+    return step
+
+
+def _value_source(value):
+    return lambda state: value
+
+
+def _ref_source(ref_list, ref_idx):
+    def source(state):
+        values = state[ref_list]
+        # a cell not yet populated reads as zero
+        return values[ref_idx] if ref_idx < len(values) else 0
+    return source
+
+
+def _no_source(state):
+    return None
+
+
+def _compile_list2list(token, target_list, source_list, command, op, vector=False):
+    "A list to list action: the whole of the ref list (in slot source_list) is applied to the target list"
+    cell = token.assign_to_cell
+
+    if command == Command.pop_and_append:
+        def step(state):
+            target = state[target_list]
+            source = state[source_list]
+            if len(source) == 0:
+                target.append(0)
+            else:
+                target.append(source.pop(-1))
+        return step
+
+    pad = command != Command.append
+    def step(state):
+        target = state[target_list]
+        if pad and len(target) == cell:
+            target.append(0)
+        source = state[source_list]
+        # append zeroes to create space for the new values
+        target.extend([0] * (len(source) - len(target)))
+        if vector:
+            values = new_values(command, target, source)
+            if values is not None:
+                target[:] = values
+                return
+        for i, v in enumerate(target):
+            target[i] = op(v, source[i])
+    return step
+
+
+def _compile_question(token, reference, checked, slot):
+    "A question marker: whether its cell (or list) holds positive values decides what follows"
+    applies_to = token.get("applies_to")
+    if applies_to == "cell":
+        ref_list, ref_idx = slot(token.ref_cell[0]), token.ref_cell[1]
+        def succeeds(state):
+            values = state[ref_list]
+            return len(values) > ref_idx and values[ref_idx] > 0
+    elif applies_to == "list":
+        ref_list = slot(token.ref_list)
+        succeeds = lambda state: list_question(state[ref_list], checked)
+    else:
+        return partial(reference, token)
+    if ref_list is None:
+        return partial(reference, token)
+
+    passed = Action.repeat if token.get("block_type") == "while" else Action.cont
+    return lambda state: passed if succeeds(state) else Action.rollback
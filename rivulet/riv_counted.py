@@ -0,0 +1,130 @@
+"""Lists that keep count of their zero and negative cells, so list questions are answered without a scan
+
+A list question succeeds when its list holds a value other than zero and no
+value below zero. A CountedList updates its counts with every change made to
+it, so the question is answered from them in constant time. Values that can't
+be ordered against zero (None, complex numbers) are counted apart: while a list
+holds any, its questions scan it as before, raising just as the scan would.
+"""
+from rivulet.riv_exceptions import InternalError
+
+
+class CountedList(list):
+    "A list of numbers that counts its zero and negative cells as they change"
+    __slots__ = ("zeros", "negatives", "unordered")
+
+    def __init__(self, values=()):
+        super().__init__(values)
+        self.recount()
+
+    def recount(self):
+        "Count the cells again from scratch"
+        self.zeros = self.negatives = self.unordered = 0
+        for value in self:
+            self._count(value, 1)
+
+    def _count(self, value, n):
+        "Count value into (n = 1) or out of (n = -1) the list"
+        try:
+            if value < 0:
+                self.negatives += n
+            elif value == 0:
+                self.zeros += n
+        except TypeError:
+            self.unordered += n
+
+    def positive(self) -> bool:
+        "Whether a list question on the list succeeds"
+        if self.unordered:
+            return scan(self)
+        return len(self) > self.zeros and not self.negatives
+
+    def __setitem__(self, index, value):
+        if index.__class__ is slice:
+            list.__setitem__(self, index, value)
+            self.recount()
+            return
+        old = list.__getitem__(self, index)
+        list.__setitem__(self, index, value)
+        self._count(old, -1)
+        self._count(value, 1)
+
+    def __delitem__(self, index):
+        if index.__class__ is slice:
+            list.__delitem__(self, index)
+            self.recount()
+            return
+        old = list.__getitem__(self, index)
+        list.__delitem__(self, index)
+        self._count(old, -1)
+
+    def append(self, value):
+        list.append(self, value)
+        self._count(value, 1)
+
+    def insert(self, index, value):
+        list.insert(self, index, value)
+        self._count(value, 1)
+
+    def pop(self, index=-1):
+        value = list.pop(self, index)
+        self._count(value, -1)
+        return value
+
+    def extend(self, values):
+        values = tuple(values)
+        list.extend(self, values)
+        for value in values:
+            self._count(value, 1)
+
+    def __iadd__(self, values):
+        CountedList.extend(self, values)
+        return self
+
+    def __imul__(self, n):
+        list.__imul__(self, n)
+        self.recount()
+        return self
+
+    def remove(self, value):
+        list.remove(self, value)
+        self.recount()
+
+    def clear(self):
+        list.clear(self)
+        self.zeros = self.negatives = self.unordered = 0
+
+    def __copy__(self):
+        copied = CountedList.__new__(CountedList)
+        list.extend(copied, self)
+        copied.zeros, copied.negatives, copied.unordered = self.zeros, self.negatives, self.unordered
+        return copied
+
+    def __deepcopy__(self, memo):
+        # the values are numbers, so a copy of the list is a deep copy
+        return self.__copy__()
+
+    def __reduce__(self):
+        return (CountedList, (list(self),))
+
+
+def scan(values) -> bool:
+    "Whether a list question on values succeeds, from a scan of every cell"
+    return any(v != 0 for v in values) and not any(v < 0 for v in values)
+
+
+def list_question(values, checked=False) -> bool:
+    """Whether a list question on values succeeds: from its counts, if it keeps them
+
+    checked: check the counts against a fresh count of the list, raising an
+    InternalError if they differ
+    """
+    if not isinstance(values, CountedList):
+        return scan(values)
+    if checked:
+        counts = (values.zeros, values.negatives, values.unordered)
+        values.recount()
+        if counts != (values.zeros, values.negatives, values.unordered):
+            raise InternalError(f"list counts {counts} out of step with the list's "
+                                f"{(values.zeros, values.negatives, values.unordered)}")
+    return values.positive()
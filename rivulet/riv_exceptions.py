@@ -4,10 +4,42 @@ class RivuletSyntaxError(Exception):
     "An issue with strand- or glyph-level syntax"
 
     def __init__(self, message):
+        self.message = message
         super().__init__(f"SYNTAX ERROR: {message}")
 
+    def __reduce__(self):
+        # rebuild from the original message (e.g. when raised in a worker process)
+        return (type(self), (self.message,))
+
 class InternalError(Exception):
     "An internal issue with the interpreter"
 
     def __init__(self, message):
+        self.message = message
         super().__init__(f"INTERNAL ERROR: {message}")
+
+    def __reduce__(self):
+        return (type(self), (self.message,))
+
+class LimitExceeded(Exception):
+    """A program ran past one of the limits set on it (see riv_limits)
+
+    limit: which: glyphs, tokens, seconds, cells or int_bits
+    bound: the limit set
+    glyph: id of the glyph running when it was hit
+    glyph_runs, token_runs: glyphs and tokens run until then
+    state: a copy of the state then, by list id
+    """
+
+    def __init__(self, limit, bound, glyph=None, glyph_runs=None, token_runs=None, state=None):
+        self.limit = limit
+        self.bound = bound
+        self.glyph = glyph
+        self.glyph_runs = glyph_runs
+        self.token_runs = token_runs
+        self.state = state
+        where = f" in glyph {glyph}, after {glyph_runs} glyph and {token_runs} token runs" if glyph_runs is not None else ""
+        super().__init__(f"LIMIT EXCEEDED: {limit} over {bound}{where}")
+
+    def __reduce__(self):
+        return (type(self), (self.limit, self.bound, self.glyph, self.glyph_runs, self.token_runs, self.state))
@@ -1,15 +1,31 @@
 "Interpreter for the Rivulet programming language"
 import copy
+import hashlib
 import json
-import math
+import sys
 from argparse import ArgumentParser
+from contextlib import nullcontext
 from enum import Enum
 
-from rivulet.riv_exceptions import RivuletSyntaxError
+from rivulet.riv_cache import ParseCache
+from rivulet.riv_compiler import Action, compile_glyph
+from rivulet.riv_counted import list_question
+from rivulet.riv_exceptions import LimitExceeded, RivuletSyntaxError
+from rivulet.riv_journal import JournalRollback, SnapshotRollback, StateDelta
+from rivulet.riv_limits import BOUNDED, Budget, Limits, bounded_power, bounded_product
 from rivulet.riv_parser import Parser
+from rivulet.riv_primes import list_ids
+from rivulet.riv_profile import GlyphProfiler
+from rivulet.riv_python_backend import PythonBackend
 from rivulet.riv_python_transpiler import PythonTranspiler
+from rivulet.riv_record import Recorder
+from rivulet.riv_state import State
 from rivulet.riv_svg_generator import SvgGenerator
 from rivulet.riv_themes import Themes
+from rivulet.riv_timing import PhaseTimer
+from rivulet.riv_tokens import Command, Subtype, TokenType
+from rivulet.riv_trace import GlyphEvent, JsonLinesTrace, NullTrace, SampledTrace, TextTrace
+from rivulet.riv_vector import AVAILABLE as NUMPY_AVAILABLE, new_values
 from rivulet import __version__
 
 VERSION = __version__
@@ -22,18 +38,62 @@ class Interpreter:
         unicode = 'unicode'
         numeric = 'numeric'
 
-    Action = Enum('Action', [
-        ('rollback', 1),    # undo all changes to state and exit block
-        ('cont', 2),        # continue to next glyph
-        ('repeat', 3)       # repeat the block
-    ])
+    class Engine(Enum):
+        compiled = 'compiled'   # run each glyph's execution plan (see riv_compiler)
+        tree = 'tree'           # walk the tokens directly: the reference implementation
+        python = 'python'       # run the program translated to Python (see riv_python_backend)
+
+    class Rollback(Enum):
+        journal = 'journal'     # undo the changes logged since the block started
+        snapshot = 'snapshot'   # restore a deep copy of the state taken as the block started
+
+    class ListEngine(Enum):
+        python = 'python'       # list and list to list commands run cell by cell
+        numpy = 'numpy'         # over whole lists at once, where NumPy gives the same result (see riv_vector)
+
+    Action = Action
 
 
     def __init__(self):
         self.outfile = None
         self.verbose = False
         self.debug = None
+        self.debug_deltas = False   # debug callbacks get a StateDelta rather than a copy of the state
         self.output = Interpreter.OutputOption.none
+        self.cache = None   # optional ParseCache
+        self.cache_code = False # keep the python engine's compiled code in the cache too (see ParseCache)
+        self.parse_workers = 1  # processes to lex large programs across
+        self.engine = Interpreter.Engine.compiled
+        self.plans = {}     # execution plan of each glyph, by id
+        self.backend = PythonBackend()
+        self.program_key = None # hash of the program text, to find its Python module
+        self.rollback = Interpreter.Rollback.journal
+        self.list_engine = Interpreter.ListEngine.python
+        self.states = None  # the rollback strategy in use
+        self.questions = set()  # ids of the glyphs with a question marker
+        self.trace = None   # TraceSink for each glyph run; None for riv's text trace (see __trace_sink)
+        self.sink = NullTrace()
+        self.check_counts = False   # check list questions' counts against a full scan of the list
+        self.limits = None  # Limits on each run (see riv_limits)
+        self.budget = None  # what the last run used of them
+        self.max_bits = None    # the limit on the bits in integers made, in this run
+        self.profiler = None    # GlyphProfiler to profile each run with (see riv_profile)
+        self.timer = None   # PhaseTimer to time parsing, running and output with (see riv_timing)
+        self.recorder = None    # Recorder to record the run with (see riv_record)
+
+
+    def __phase(self, name):
+        "A phase of the timer, or a context that times nothing when there is none"
+        return self.timer.phase(name) if self.timer is not None else nullcontext()
+
+
+    def __parse(self, program):
+        "Parse the program text, through the parse cache if there is one"
+        parser = Parser(workers=self.parse_workers)
+        parser.timer = self.timer
+        if self.cache:
+            return self.cache.parse(program, parser)
+        return parser.parse_program(program)
 
 
     def interpret_file(self, progfile, verbose, output):
@@ -52,63 +112,200 @@ class Interpreter:
         
         program: program text as string
         verbose: flag
-        debug: callback function called in the processing of each glyph
+        debug: callback function called in the processing of each glyph, with a copy of
+            the state (or a StateDelta, if debug_deltas is set), and again at the end
         """
         self.verbose = verbose
 
-        parser = Parser()
+        with self.__phase("parse"):
+            glyphs = self.__parse(program)
 
-        glyphs = parser.parse_program(program)
+        self.program_key = hashlib.sha256(program.encode("utf-8")).hexdigest()
+        try:
+            self.__interpret(glyphs, debug)
+        finally:
+            self.program_key = None
 
+
+    def interpret_glyphs(self, glyphs, debug = None):
+        """Interpret a Rivulet program already parsed
+
+        glyphs: the glyphs of the program, as Parser.parse_program returns them
+        debug: callback function, as for interpret_program
+        """
         self.__interpret(glyphs, debug)
 
 
     def __interpret(self, glyphs, debug = None):
-        state = dict([(1,[])])
+        with self.__phase("execute"):
+            state, final = self.__execute(glyphs, debug)
 
+        with self.__phase("output"):
+            if 1 in state:
+                if self.output == Interpreter.OutputOption.unicode:
+                    print("".join(chr(num) for num in state[1] if isinstance(num, int) and 0 <= num <= 0x10FFFF))
+                elif self.output == Interpreter.OutputOption.numeric:
+                    print(" ".join(str(num) for num in state[1] if isinstance(num, int) and 0 <= num <= 0x10FFFF))
+
+        if debug:
+            debug(final if final is not None else state)
+
+    def __execute(self, glyphs, debug):
+        "Run the glyphs and return the lists they end with by id, and the final StateDelta if debug deltas are on"
         prime_size = max(glyphs, key=lambda x: x["list_size"])["list_size"]
 
-        # initialize state with lists required
-        for num in range(2, prime_size ** 2):
-            if all(num % i != 0 for i in range(2, int(math.sqrt(num)) + 1)):
-                state[num] = []
-                if len(state) >= prime_size:
-                    break
-        if self.verbose:
-            self.debug = PythonTranspiler()
+        # the lists the program refers to, each in a slot of the state; the python
+        # engine's generated code changes plain lists, the others lists that count
+        # their zeros and negatives
+        referenced = set()
+        for g in glyphs:
+            for t in g["tokens"]:
+                referenced.update((t.get("list"), t.get("ref_list"), t.get("ref_cell", [None])[0]))
+        if self.engine == Interpreter.Engine.python:
+            state = State(list_ids(max(prime_size, 1)), referenced, lambda list_id: [])
+        else:
+            state = State(list_ids(max(prime_size, 1)), referenced)
 
         for idx, g in enumerate(glyphs):
             g["id"] = idx
 
-        parse_tree = self.__treeify_glyphs(copy.deepcopy(glyphs), 1, [])
+        # treeify and decorate only write the glyphs' own fields (never their
+        # tokens), so the caller's glyphs are protected by a shallow copy of each
+        parse_tree = self.__treeify_glyphs([copy.copy(g) for g in glyphs], 1, [])
 
         self.__decorate_blocks(parse_tree, 0, None)
 
-        state = self.__interpret_block(parse_tree, state, debug)
-
-        if 1 in state:
-            if self.output == Interpreter.OutputOption.unicode:
-                print("".join(chr(num) for num in state[1] if isinstance(num, int) and 0 <= num <= 0x10FFFF))
-            elif self.output == Interpreter.OutputOption.numeric:
-                print(" ".join(str(num) for num in state[1] if isinstance(num, int) and 0 <= num <= 0x10FFFF))
+        # glyphs with a question marker, which can repeat or roll back their block
+        self.questions = set(g["id"] for g in glyphs if any(t["type"] == TokenType.question_marker for t in g["tokens"]))
+
+        if self.list_engine == Interpreter.ListEngine.numpy and not NUMPY_AVAILABLE:
+            raise ValueError("the numpy list engine needs NumPy installed")
+        vector = self.list_engine == Interpreter.ListEngine.numpy
+
+        self.budget = Budget(self.limits) if self.limits is not None else None
+        self.max_bits = self.limits.int_bits if self.limits is not None else None
+
+        self.plans = {}
+        if self.engine == Interpreter.Engine.compiled:
+            for g in glyphs:
+                self.plans[g["id"]] = compile_glyph(g, self.__interpret_token, vector, self.check_counts, state.slot,
+                                                    self.max_bits)
+
+        deltas = debug is not None and self.debug_deltas
+        # the changes each glyph makes are read from the journal, for debug deltas or a recording
+        reporting = deltas or self.recorder is not None
+        final = None
+        try:
+            if self.engine == Interpreter.Engine.python:
+                if reporting:
+                    raise ValueError(f"{'debug deltas are' if deltas else 'a recording is'} read from the journal: the python engine has none")
+                state = self.__run_python(glyphs, parse_tree, state, debug)
+            else:
+                if self.rollback == Interpreter.Rollback.journal:
+                    self.states = JournalRollback(reporting=reporting)
+                elif reporting:
+                    raise ValueError(f"{'debug deltas are' if deltas else 'a recording is'} read from the journal: they need the journal rollback")
+                else:
+                    self.states = SnapshotRollback()
+                state = self.states.track(state)
+
+                self.sink = self.__trace_sink()
+                if self.profiler is not None:
+                    self.profiler.start(parse_tree, self.states)
+                if self.recorder is not None:
+                    self.recorder.start(state)
+                try:
+                    state = self.__interpret_block(parse_tree, state, debug)
+                finally:
+                    self.sink.flush()
+                    # the changes since the last glyph ran: its block's rollback, if any
+                    changes = self.states.changes() if reporting else None
+                    if self.recorder is not None:
+                        self.recorder.finish(changes)
+
+                if deltas:
+                    final = StateDelta(None, changes, state)
+                state = self.states.release(state)
+        except LimitExceeded as error:
+            if error.glyph_runs is not None or self.budget is None:
+                raise
+            # hit as an integer was made: say where
+            raise self.budget.exceeded(error.limit, error.bound) from None
+
+        return state, final
+
+    def __run_python(self, glyphs, parse_tree, state, debug):
+        "Run the program translated to Python, changing state in place, and return its lists by id"
+        self.sink = self.__trace_sink()
+        if self.profiler is not None:
+            self.profiler.start(parse_tree)
+        # the budget is counted as each glyph finishes
+        traced = bool(debug) or self.sink.enabled or self.budget is not None
+        vector = self.list_engine == Interpreter.ListEngine.numpy
+        self.backend.cache = self.cache if self.cache_code else None
+        run = self.backend.load(parse_tree, state.slots, traced, self.program_key, vector, self.max_bits)
+
+        # the glyphs as decorated in the tree, by id
+        glyphs = list(glyphs)
+        blocks = [parse_tree]
+        while blocks:
+            for g in blocks.pop():
+                if isinstance(g, list):
+                    blocks.append(g)
+                else:
+                    glyphs[g.id] = g
+
+        def after(glyph_id, outcome):
+            if self.budget is not None:
+                self.budget.start(glyph_id, len(glyphs[glyph_id].tokens), state)
+            if debug:
+                debug(state.copy_lists())
+            if self.sink.enabled:
+                self.sink.glyph(GlyphEvent(glyphs[glyph_id], state.view(), outcome))
+
+        try:
+            run(state, glyphs, self.__interpret_token, after)
+        finally:
+            self.sink.flush()
+        return state.copy_lists()
+
+
+    def __trace_sink(self):
+        """The trace sink, or the text trace riv prints (none unless verbose or with output none),
+        passed its events by the profiler if there is one"""
+        if self.trace is not None:
+            sink = self.trace
+        elif self.verbose:
+            sink = TextTrace(verbose=True)
+        elif self.output == Interpreter.OutputOption.none:
+            sink = TextTrace()
+        else:
+            sink = NullTrace()
+        if self.profiler is not None:
+            self.profiler.sink = sink
+            return self.profiler
+        return sink
 
-        if debug:
-            debug(state)
 
     def __treeify_glyphs(self, glyphs, curr_level, tree):
-        "Reorganize a flat list of glyphs into a tree by level"
-        if glyphs[0]["level"] == curr_level:
-            tree.append(glyphs.pop(0))
-        elif glyphs[0]["level"] > curr_level:
-            level = []
-            tree.append(level)
-            self.__treeify_glyphs(glyphs, curr_level + 1, level)
-        else:
-            # go back up one level
-            return tree
-
-        if len(glyphs) > 0:
-            self.__treeify_glyphs(glyphs, curr_level, tree)
+        """Reorganize a flat list of glyphs into a tree by level
+
+        The blocks open at each level are kept on a stack, so programs of any
+        length are treeified without growing the call stack; a glyph below
+        curr_level ends the tree."""
+        blocks = [tree]
+        for g in glyphs:
+            # close the blocks deeper than the glyph
+            while g["level"] < curr_level + len(blocks) - 1 and len(blocks) > 1:
+                blocks.pop()
+            if g["level"] < curr_level:
+                break
+            # and open blocks down to its level
+            while g["level"] > curr_level + len(blocks) - 1:
+                level = []
+                blocks[-1].append(level)
+                blocks.append(level)
+            blocks[-1].append(g)
 
         return tree
 
@@ -144,128 +341,188 @@ class Interpreter:
 
 
     def __interpret_block(self, parse_tree, state, debug = False):
-
-        rollback_state = copy.deepcopy(state)
-
-        for g in parse_tree:
+        """Run a block, and the blocks nested in it, with an explicit stack of frames
+
+        Each frame is [block, index of its next glyph, savepoint]. A rollback restores
+        the frame's savepoint and exits its block. A repeat runs the block again from a
+        new savepoint, then carries on after the repeating glyph; when that glyph is the
+        last in its block there is nothing to carry on with, so the frame is reused
+        rather than stacked, and a loop runs in constant stack and savepoints.
+
+        A repeat from any other glyph can't be collapsed like that: each pass waiting
+        to carry on keeps a frame and a live savepoint of its own, since it may still
+        roll back to it. Memory grows with the number of such passes: a deep copy of
+        the state each with snapshot rollback, and with journal rollback, every change
+        made since the earliest of them, as the journal can't drop any of those.
+        """
+        frames = [[parse_tree, 0, self.__savepoint(parse_tree, state)]]
+
+        while frames:
+            frame = frames[-1]
+            block, idx, savepoint = frame
+            if idx == len(block):
+                frames.pop()
+                self.states.discard(savepoint)
+                continue
+
+            g = block[idx]
+            frame[1] = idx + 1
             if isinstance(g, list):
-                state = self.__interpret_block(g, state, debug)
-            else:
-                action = self.__interpret_glyph(g, state, debug)
-                if action == self.Action.rollback:
-                    state = copy.deepcopy(rollback_state)
-                    return state # a rollback also exits the block
-                if action == self.Action.cont:
-                    continue
-                if action == self.Action.repeat:
-                    state = self.__interpret_block(parse_tree, state, debug)
+                frames.append([g, 0, self.__savepoint(g, state)])
+                continue
+
+            action = self.__interpret_glyph(g, state, debug)
+            if action == self.Action.rollback:
+                state = self.states.rollback(state, savepoint)
+                self.states.discard(savepoint)
+                frames.pop() # a rollback also exits the block
+            elif action == self.Action.repeat:
+                if idx + 1 == len(block):
+                    self.states.discard(savepoint)
+                    frame[1] = 0
+                    frame[2] = self.__savepoint(block, state)
+                else:
+                    frames.append([block, 0, self.__savepoint(block, state)])
         return state
 
 
+    def __savepoint(self, block, state):
+        "A savepoint for a block, or None if none of its glyphs can roll it back"
+        if not any(not isinstance(g, list) and g.id in self.questions for g in block):
+            return None
+        return self.states.savepoint(state)
+
+
     def __interpret_glyph(self, glyph, state, debug = False) -> Action:
 
         retval = self.Action.cont
 
-        for token in glyph["tokens"]:
-            if token["type"] == "question_marker":
-                retval = self.__resolve_question(token, state)
-            else: # is a value or a ref marker
-
-                # if the cell is not in the list, initialize it to zero
-                if 'assign_to_cell' in token and \
-                    len(state[token['list']]) == token['assign_to_cell'] and \
-                        (not token["action"] or not "command" in token["action"] or \
-                        not token["action"]["command"] in ["pop_and_append","append"]):
-                    state[token['list']].append(0)
-                # elif 'assign_to_cell' in token and len(state[token['list']]) < token['assign_to_cell']:
-                #     # shouldn't be possible
-                #     pass
-
-                source = None
-
-                list2list = not token["action"] is None and \
-                    "subtype" in token["action"] and \
-                    token["action"]["subtype"] == "list2list"
-
-                # find source item
-                if list2list:
-                    # the token will have ref_cell but it's actually just the list,
-                    # the first value, that indicates this
-                    source = state[token["ref_cell"][0]]
-                if token["subtype"] == "value":
-                    source = token["value"]
-                elif token["subtype"] == "ref" and \
-                    (not "action" in token or not token["action"] or \
-                    not "subtype" in token["action"] or \
-                    not token["action"]["subtype"] or \
-                    token["action"]["subtype"] != "list2list"):
-                    # rule out list2list, which has a special case for source
-                    # FIXME: simpler way to test for all this?
-
-                    if not token["ref_cell"][0] in state:
-                        raise RivuletSyntaxError("List reference out of bounds")
-
-                    if token["ref_cell"][1] >= len(state[token["ref_cell"][0]]):
-                        # this cell has not yet been populated
-                        source = 0
-                    else:
-                        source = state[token["ref_cell"][0]][token["ref_cell"][1]]
-
-                # find item to apply to
-                if list2list:
-                    # special case for pop/append
-                    # FIXME: there may be other cases where list2list requires the last item
-                    if token["action"]["command"] == "pop_and_append":
-                        if len(state[token["ref_cell"][0]]) == 0:
-                            state[token["list"]].append(0)
-                        else:
-                            state[token["list"]].append(state[token["ref_cell"][0]].pop(-1))
-                    else:
-                        for a in range(len(state[token["list"]]), len(source)):
-                            # append zeroes to create space for the new values
-                            state[token["list"]].append(0)
-                        for i in range(len(state[token["list"]])):
-                            state[token["list"]][i] = self.__resolve_cmd(token, state[token["list"]][i], source[i])
-                elif token["action"] is None or "command" not in token["action"]:
-                    # defaults to add_assign
-                    state[token["list"]][token["assign_to_cell"]] += source
-                elif token["action"]["command"] == "insert":
-                    state[token["list"]].insert(token["assign_to_cell"], source)
-                elif token["action"]["command"] == "append":
-                    state[token["list"]].append(source)
-                elif token["action"]["command"] == "pop":
-                    state[token["list"]][token["assign_to_cell"]] += source
-                    if token["subtype"] == "ref":
-                        state[token["ref_cell"][0]].pop(token["ref_cell"][1])
-                elif token["action"]["command"] == "pop_and_append":
-                    state[token["list"]].append(state[token["ref_cell"][0]].pop(token["ref_cell"][1]))
-                elif token["action"]["subtype"] == "list":
-                    for i in range(len(state[token["list"]])):
-                        state[token["list"]][i] = self.__resolve_cmd(token, state[token["list"]][i], source)
-                else:
-                    state[token["list"]][token["assign_to_cell"]] = self.__resolve_cmd(token, state[token["list"]][token["assign_to_cell"]], source)
+        if self.budget is not None:
+            self.budget.start(glyph.id, len(glyph.tokens), state)
+
+        plan = self.plans.get(glyph.id)
+        if plan is not None:
+            for step in plan:
+                outcome = step(state)
+                if outcome is not None:
+                    retval = outcome
+        else:
+            for token in glyph.tokens:
+                outcome = self.__interpret_token(token, state)
+                if outcome is not None:
+                    retval = outcome
 
+        deltas = debug and self.debug_deltas
+        changes = self.states.changes() if deltas or self.recorder is not None else None
         if debug:
-            debug(copy.deepcopy(state))
-        if self.verbose:
-            print(self.debug.glyph_drawn(glyph["glyph"]))
-            print(self.debug.glyph_pseudo(glyph))
-            print(state)
-            print("\n")
-        elif self.output == Interpreter.OutputOption.none:
-            print(" ")
-            print(f"glyph: {glyph['id']}")
-            print("\n".join([f"{k}: {v}" for k, v in state.items() if v]))
+            if deltas:
+                debug(StateDelta(glyph.id, changes, state))
+            else:
+                debug(state.copy_lists())
+        if self.recorder is not None:
+            self.recorder.glyph(glyph.id, retval, changes, state)
+        if self.sink.enabled:
+            self.sink.glyph(GlyphEvent(glyph, state.view(), retval))
 
         return retval
     
 
+    def __interpret_token(self, token, state):
+        "Run one token against the state, returning an Action for a question marker"
+        if token.type == TokenType.question_marker:
+            return self.__resolve_question(token, state)
+        else: # is a value or a ref marker
+
+            action = token.action
+            command = action.command if action is not None else None
+            target = state.of(token.list)
+
+            # if the cell is not in the list, initialize it to zero
+            if len(target) == token.assign_to_cell and \
+                command not in (Command.pop_and_append, Command.append):
+                target.append(0)
+
+            source = None
+
+            list2list = action is not None and action.subtype == Subtype.list2list
+
+            # find source item
+            if list2list:
+                # the token will have ref_cell but it's actually just the list,
+                # the first value, that indicates this
+                source = state.of(token.ref_cell[0])
+            if token.subtype == Subtype.value:
+                source = token.value
+            elif token.subtype == Subtype.ref and not list2list:
+                # rule out list2list, which has a special case for source
+
+                ref_list, ref_idx = token.ref_cell
+                if state.slot(ref_list) is None:
+                    raise RivuletSyntaxError("List reference out of bounds")
+
+                if ref_idx >= len(state.of(ref_list)):
+                    # this cell has not yet been populated
+                    source = 0
+                else:
+                    source = state.of(ref_list)[ref_idx]
+
+            # find item to apply to
+            if list2list:
+                # special case for pop/append
+                # FIXME: there may be other cases where list2list requires the last item
+                if command == Command.pop_and_append:
+                    if len(state.of(token.ref_cell[0])) == 0:
+                        target.append(0)
+                    else:
+                        target.append(state.of(token.ref_cell[0]).pop(-1))
+                else:
+                    for a in range(len(target), len(source)):
+                        # append zeroes to create space for the new values
+                        target.append(0)
+                    if not self.__apply_to_list(token, target, source):
+                        for i in range(len(target)):
+                            target[i] = self.__resolve_cmd(token, target[i], source[i])
+            elif action is None:
+                # defaults to add_assign
+                target[token.assign_to_cell] += source
+            elif command == Command.insert:
+                target.insert(token.assign_to_cell, source)
+            elif command == Command.append:
+                target.append(source)
+            elif command == Command.pop:
+                target[token.assign_to_cell] += source
+                if token.subtype == Subtype.ref:
+                    state.of(token.ref_cell[0]).pop(token.ref_cell[1])
+            elif command == Command.pop_and_append:
+                target.append(state.of(token.ref_cell[0]).pop(token.ref_cell[1]))
+            elif action.subtype == Subtype.list:
+                if not self.__apply_to_list(token, target, source):
+                    for i in range(len(target)):
+                        target[i] = self.__resolve_cmd(token, target[i], source)
+            else:
+                target[token.assign_to_cell] = self.__resolve_cmd(token, target[token.assign_to_cell], source)
+        return None
+
+
+    def __apply_to_list(self, token, target, source) -> bool:
+        "Run a list command over the whole list with NumPy, if that is on and gives the same result"
+        if self.list_engine != Interpreter.ListEngine.numpy or "command" not in token.action:
+            return False
+        if self.max_bits is not None and token.action.command in BOUNDED:
+            # checks the size of the integers it makes, cell by cell
+            return False
+        values = new_values(token.action.command, target, source)
+        if values is None:
+            return False
+        target[:] = values
+        return True
+
+
     def print_and_exit(self, progfile):
         "Print source and pseudo-code for complete program"
         with open(progfile, "r", encoding="utf-8") as file:
             program = file.read()
-        parser = Parser()
-        glyphs = parser.parse_program(program)
+        glyphs = self.__parse(program)
 
         self.debug = PythonTranspiler()        
         print(self.debug.print_program(glyphs, False))
@@ -275,38 +532,41 @@ class Interpreter:
         "Generate an SVG of the program source code"
         with open(progfile, "r", encoding="utf-8") as file:
             program = file.read()
-        parser = Parser()
-        glyphs = parser.parse_program(program)
+        glyphs = self.__parse(program)
         svg = SvgGenerator(Themes[theme])
         svg.generate(glyphs)
 
 
     def __resolve_cmd(self, token, initial_value, assign_value):
-        if not token["action"] or not "command" in token["action"]:
+        if not token.action or "command" not in token.action:
             raise RivuletSyntaxError("No command found in token")
 
-        match token["action"]["command"]:
-            case "addition_assignment":
+        match token.action.command:
+            case Command.addition_assignment:
                 return initial_value + assign_value
-            case "subtraction_assignment":
+            case Command.subtraction_assignment:
                 return initial_value - assign_value
-            case "reverse_subtraction_assignment":
+            case Command.reverse_subtraction_assignment:
                 return assign_value - initial_value
-            case "overwrite":
+            case Command.overwrite:
                 return assign_value
-            case "multiplication_assignment":
+            case Command.multiplication_assignment:
+                if self.max_bits is not None:
+                    return bounded_product(initial_value, assign_value, self.max_bits)
                 return initial_value * assign_value
-            case "division_assignment":
+            case Command.division_assignment:
                 return initial_value / assign_value
-            case "reverse_division_assignment":
+            case Command.reverse_division_assignment:
                 return assign_value / initial_value
-            case "mod_assignment":
+            case Command.mod_assignment:
                 return initial_value % assign_value
-            case "reverse_mod_assignment":
+            case Command.reverse_mod_assignment:
                 return assign_value % initial_value
-            case "exponent_assignment":
+            case Command.exponent_assignment:
+                if self.max_bits is not None:
+                    return bounded_power(initial_value, assign_value, self.max_bits)
                 return initial_value ** assign_value
-            case "root_assignment":
+            case Command.root_assignment:
                 return initial_value ** (1 / assign_value)
 
 
@@ -315,23 +575,18 @@ class Interpreter:
 
         succeeds = False
 
-        if token["applies_to"] == "cell":
-            if len(state[token["ref_cell"][0]]) <= token["ref_cell"][1]:
+        if token.applies_to == "cell":
+            if len(state.of(token.ref_cell[0])) <= token.ref_cell[1]:
                 succeeds = False
             else:
-                succeeds = state[token["ref_cell"][0]][token["ref_cell"][1]] > 0
-        elif token["applies_to"] == "list":
-            if len(state[token["ref_list"]]) == 0:
-                succeeds = False
-            elif all(i == 0 for i in state[token["ref_list"]]):
-                succeeds = False
-            else:
-                succeeds = not any(i < 0 for i in state[token["ref_list"]])
+                succeeds = state.of(token.ref_cell[0])[token.ref_cell[1]] > 0
+        elif token.applies_to == "list":
+            succeeds = list_question(state.of(token.ref_list), self.check_counts)
         else:
             raise RivuletSyntaxError("Could not determine what question marker applies to")
 
         if succeeds:
-            if token["block_type"] == "while":
+            if token.block_type == "while":
                 retval = self.Action.repeat
         else:
             retval = self.Action.rollback
@@ -355,10 +610,77 @@ def main():
                         help='generate svg of program, then exit')
     arg_parser.add_argument('-o', dest='output', type=Interpreter.OutputOption, default=Interpreter.OutputOption.none, choices=list(Interpreter.OutputOption))
     arg_parser.add_argument('--theme', dest='color_set', default="default", help="color scheme for svg")
+    arg_parser.add_argument('--cache', dest='cache', action='store_true', default=False,
+                        help='reuse parse results from the on-disk parse cache')
+    arg_parser.add_argument('--cache-dir', dest='cache_dir', default=None,
+                        help='parse cache location (implies --cache; default $RIVULET_CACHE_DIR or ~/.cache/rivulet)')
+    arg_parser.add_argument('--cache-size', dest='cache_size', type=float, default=ParseCache.DEFAULT_MAX_BYTES / 2 ** 20,
+                        help='maximum size of the parse cache in MB')
+    arg_parser.add_argument('--cache-code', dest='cache_code', action='store_true', default=False,
+                        help='keep the python engine\'s compiled code in the parse cache too (implies --cache); '
+                             'it is run from there, so only in a directory no one else can write to')
+    arg_parser.add_argument('--engine', dest='engine', type=Interpreter.Engine, default=Interpreter.Engine.compiled, choices=list(Interpreter.Engine),
+                        help='run compiled execution plans, walk the parsed tokens, or run the program translated to Python')
+    arg_parser.add_argument('--rollback', dest='rollback', type=Interpreter.Rollback, default=Interpreter.Rollback.journal, choices=list(Interpreter.Rollback),
+                        help='undo failed blocks from a journal of their changes, or from a snapshot of the state')
+    arg_parser.add_argument('--list-engine', dest='list_engine', type=Interpreter.ListEngine, default=Interpreter.ListEngine.python, choices=list(Interpreter.ListEngine),
+                        help='run list commands cell by cell, or over whole lists with NumPy')
+    arg_parser.add_argument('--trace-json', dest='trace_json', default=None, metavar='FILE',
+                        help='write a JSON-lines trace of each glyph run to FILE instead of printing one')
+    arg_parser.add_argument('--trace-every', dest='trace_every', type=int, default=1, metavar='N',
+                        help='trace only every Nth glyph run')
+    arg_parser.add_argument('--trace-rollbacks', dest='trace_rollbacks', action='store_true', default=False,
+                        help='trace only glyphs whose question marker rolls back their block')
+    arg_parser.add_argument('--parse-workers', dest='parse_workers', type=int, default=1,
+                        help='lex the glyphs of large programs across this many processes')
+    arg_parser.add_argument('--max-glyphs', dest='max_glyphs', type=int, default=None, metavar='N',
+                        help='stop after N glyph runs')
+    arg_parser.add_argument('--max-tokens', dest='max_tokens', type=int, default=None, metavar='N',
+                        help='stop after N token runs')
+    arg_parser.add_argument('--max-seconds', dest='max_seconds', type=float, default=None, metavar='S',
+                        help='stop after S seconds of running')
+    arg_parser.add_argument('--max-cells', dest='max_cells', type=int, default=None, metavar='N',
+                        help='stop once the lists hold more than N cells together')
+    arg_parser.add_argument('--max-int-bits', dest='max_int_bits', type=int, default=None, metavar='N',
+                        help='stop before multiplying or raising to a power makes an integer of more than N bits')
+    arg_parser.add_argument('--profile', dest='profile', action='store_true', default=False,
+                        help='report the runs and time of each glyph, to stderr, after the program ends')
+    arg_parser.add_argument('--profile-folded', dest='profile_folded', default=None, metavar='FILE',
+                        help='write each glyph\'s time to FILE as folded stacks of the blocks around it, for flamegraph tools')
+    arg_parser.add_argument('--record', dest='record', default=None, metavar='FILE',
+                        help='record each glyph run and the changes it makes to FILE, to replay with python -m rivulet.riv_record')
+    arg_parser.add_argument('--time', dest='time', action='store_true', default=False,
+                        help='report the time spent parsing (by phase), running and writing output, to stderr, after the program ends')
     args = arg_parser.parse_args()
 
     intr = Interpreter()
 
+    intr.parse_workers = args.parse_workers
+    intr.engine = args.engine
+    intr.rollback = args.rollback
+    if args.list_engine == Interpreter.ListEngine.numpy and not NUMPY_AVAILABLE:
+        arg_parser.error("--list-engine numpy needs NumPy installed")
+    intr.list_engine = args.list_engine
+    bounds = (args.max_glyphs, args.max_tokens, args.max_seconds, args.max_cells, args.max_int_bits)
+    if any(bound is not None for bound in bounds):
+        intr.limits = Limits(*bounds)
+    if args.cache or args.cache_dir or args.cache_code:
+        intr.cache = ParseCache(args.cache_dir, int(args.cache_size * 2 ** 20))
+    intr.cache_code = args.cache_code
+    if args.trace_json or args.trace_every > 1 or args.trace_rollbacks:
+        sink = JsonLinesTrace(args.trace_json) if args.trace_json else TextTrace(verbose=args.verbose)
+        if args.trace_every > 1 or args.trace_rollbacks:
+            sink = SampledTrace(sink, args.trace_every, args.trace_rollbacks)
+        intr.trace = sink
+    if args.profile or args.profile_folded:
+        intr.profiler = GlyphProfiler()
+    if args.time:
+        intr.timer = PhaseTimer()
+    if args.record:
+        if args.engine == Interpreter.Engine.python or args.rollback != Interpreter.Rollback.journal:
+            arg_parser.error("--record reads the journal: it needs the journal rollback and the compiled or tree engine")
+        intr.recorder = Recorder(args.record)
+
     if args.print:
         intr.print_and_exit(args.progfile)
         exit(0)
@@ -366,7 +688,22 @@ def main():
         intr.draw_svg(args.progfile, args.color_set)
         exit(0)
 
-    intr.interpret_file(args.progfile, args.verbose, args.output)
+    try:
+        intr.interpret_file(args.progfile, args.verbose, args.output)
+    except LimitExceeded as error:
+        arg_parser.exit(1, f"{error}\n")
+    finally:
+        if intr.trace:
+            intr.trace.close()
+        if intr.recorder:
+            intr.recorder.close()
+        if args.profile:
+            intr.profiler.report(sys.stderr)
+        if args.profile_folded:
+            with open(args.profile_folded, "w", encoding="utf-8") as file:
+                file.writelines(line + "\n" for line in intr.profiler.folded())
+        if args.time:
+            intr.timer.report(sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,283 @@
+"""Rollback strategies for the interpreter's state
+
+A block takes a savepoint of the state as it starts and, if a question marker
+fails, restores the state to it. SnapshotRollback deep copies the whole state
+for each savepoint. JournalRollback keeps the state's lists as JournaledLists,
+which record how to undo each change as it is made, so a savepoint is just a
+position in the journal and a rollback undoes the changes made since then.
+
+The journal also says what each change did, so JournalRollback can report the
+changes to the state as ChangeRecords (see changes) without copying it.
+"""
+import copy
+import sys
+from collections import namedtuple
+
+from rivulet.riv_counted import CountedList
+
+# journal records: (op, list, index, old, new)
+_SET = 0        # list[index] went from old to new
+_APPEND = 1     # new was appended at index
+_INSERT = 2     # new was inserted at index
+_POP = 3        # old was popped from index
+_EXTEND = 4     # the values in new were appended from index (the old length) on
+_REPLACE = 5    # the whole list went from old to new (copies), by some other change
+
+_KINDS = {_SET: "set", _APPEND: "append", _INSERT: "insert", _POP: "pop", _EXTEND: "extend", _REPLACE: "replace"}
+
+ChangeRecord = namedtuple("ChangeRecord", ["kind", "list_id", "index", "old", "new"])
+ChangeRecord.__doc__ = """One change to a list in the state
+
+kind: set, append, insert, pop, extend (new holds the values appended from index),
+    truncate (old holds the values removed from index on) or replace (old and new
+    hold the whole list)
+index: the cell changed, counted from the start of the list before the change
+old, new: the cell's values before and after (None for a cell that was not there)
+"""
+
+
+class JournaledList(CountedList):
+    """A list of numbers that records each change to it, and how to undo it, in a journal
+
+    It keeps the counts of a CountedList too, and a rollback undoes the changes
+    through CountedList's methods, so the counts are restored with the values.
+    """
+    __slots__ = ("journal", "list_id")
+
+    def __init__(self, journal, values=(), list_id=None):
+        super().__init__(values)
+        self.journal = journal
+        self.list_id = list_id
+
+    def __setitem__(self, index, value):
+        if index.__class__ is slice:
+            old = list(self)
+            CountedList.__setitem__(self, index, value)
+            self.journal.append((_REPLACE, self, None, old, list(self)))
+            return
+        old = list.__getitem__(self, index)
+        CountedList.__setitem__(self, index, value)
+        self.journal.append((_SET, self, index + len(self) if index < 0 else index, old, value))
+
+    def append(self, value):
+        CountedList.append(self, value)
+        self.journal.append((_APPEND, self, len(self) - 1, None, value))
+
+    def insert(self, index, value):
+        n = len(self)
+        at = min(max(index + n if index < 0 else index, 0), n)
+        CountedList.insert(self, index, value)
+        self.journal.append((_INSERT, self, at, None, value))
+
+    def pop(self, index=-1):
+        at = index + len(self) if index < 0 else index
+        value = CountedList.pop(self, index)
+        self.journal.append((_POP, self, at, value, None))
+        return value
+
+    def extend(self, values):
+        values = tuple(values)
+        n = len(self)
+        CountedList.extend(self, values)
+        self.journal.append((_EXTEND, self, n, None, values))
+
+    def __replaced(name): # pylint: disable=no-self-argument
+        "Any other change is recorded as a copy of the whole list before and after it"
+        method = getattr(CountedList, name)
+        def change(self, *args, **kwargs):
+            old = list(self)
+            result = method(self, *args, **kwargs)
+            self.journal.append((_REPLACE, self, None, old, list(self)))
+            return result
+        change.__name__ = name
+        return change
+
+    __delitem__ = __replaced("__delitem__")
+    __iadd__ = __replaced("__iadd__")
+    __imul__ = __replaced("__imul__")
+    remove = __replaced("remove")
+    clear = __replaced("clear")
+    sort = __replaced("sort")
+    reverse = __replaced("reverse")
+    del __replaced
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        # the values are numbers, so a copy of the list is a deep copy
+        return list(self)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+class SnapshotRollback:
+    "Savepoints are deep copies of the whole state"
+
+    def __init__(self):
+        self.copied = 0     # bytes of lists copied, for profiling
+
+    def track(self, state):
+        "The state to run with"
+        return state
+
+    def savepoint(self, state):
+        "Where the state can be rolled back to"
+        self.copied += _size(state)
+        return copy.deepcopy(state)
+
+    def rollback(self, state, savepoint):
+        "The state as it was at savepoint"
+        self.copied += _size(savepoint)
+        return copy.deepcopy(savepoint)
+
+    def discard(self, savepoint):
+        "savepoint will not be rolled back to"
+
+    def release(self, state):
+        "The state as plain lists by id, once the program has finished"
+        return state.copy_lists()
+
+
+class JournalRollback:
+    """Savepoints are positions in a journal of the changes made to the state's lists
+
+    Savepoints are taken and discarded innermost first. Changes made before the
+    earliest savepoint still in use can never be undone, so they are dropped
+    from the journal, which then holds only what the blocks running can undo
+    (and, if reporting, what has not yet been reported).
+    """
+
+    copied = 0  # bytes of lists copied: the journal copies none
+
+    def __init__(self, reporting=False):
+        self.journal = []
+        self.dropped = 0    # changes dropped from the start of the journal
+        self.live = []      # savepoints in use, earliest first
+        self.reporting = reporting  # keep ChangeRecords for changes()
+        self.reported = 0   # changes already reported
+        self.undone = []    # ChangeRecords for rollbacks not yet reported
+
+    def track(self, state):
+        "The state to run with: the same lists, journaled"
+        self.journal = []
+        self.dropped = 0
+        self.live = []
+        self.reported = 0
+        self.undone = []
+        for list_id, slot in state.slots.items():
+            state[slot] = JournaledList(self.journal, state[slot], list_id)
+        state.new_list = self.__new_list
+        return state
+
+    def __new_list(self, list_id):
+        "A list made after the state is tracked: empty, and journaled"
+        return JournaledList(self.journal, (), list_id)
+
+    def savepoint(self, state):
+        "Where the state can be rolled back to"
+        savepoint = self.dropped + len(self.journal)
+        self.live.append(savepoint)
+        return savepoint
+
+    def rollback(self, state, savepoint):
+        "Undo every change since savepoint, in place"
+        journal = self.journal
+        keep = savepoint - self.dropped
+        while len(journal) > keep:
+            record = journal.pop()
+            op, values, index, old, new = record
+            if op == _SET:
+                CountedList.__setitem__(values, index, old)
+            elif op == _APPEND:
+                CountedList.pop(values)
+            elif op == _INSERT:
+                CountedList.__delitem__(values, index)
+            elif op == _POP:
+                CountedList.insert(values, index, old)
+            elif op == _EXTEND:
+                CountedList.__delitem__(values, slice(index, None))
+            else:
+                CountedList.__setitem__(values, slice(None), old)
+            if self.reporting and self.dropped + len(journal) < self.reported:
+                # a change never reported needs no undoing in the report
+                self.undone.append(_undo_record(record))
+        self.reported = min(self.reported, savepoint)
+        return state
+
+    def discard(self, savepoint):
+        "savepoint will not be rolled back to"
+        if savepoint is None:
+            return
+        if self.live[-1] == savepoint:
+            self.live.pop()
+        else:
+            self.live.remove(savepoint)
+        self.__drop()
+
+    def __drop(self):
+        "Drop the changes no savepoint needs (and that have been reported)"
+        earliest = self.live[0] if self.live else self.dropped + len(self.journal)
+        if self.reporting:
+            earliest = min(earliest, self.reported)
+        unneeded = earliest - self.dropped
+        # drop in bulk, so each change is moved at most a few times
+        if unneeded and unneeded * 2 >= len(self.journal):
+            del self.journal[:unneeded]
+            self.dropped += unneeded
+
+    def changes(self) -> list:
+        "ChangeRecords for the changes to the state since the last call, oldest first"
+        records = self.undone
+        self.undone = []
+        start = self.reported - self.dropped
+        records.extend(ChangeRecord(_KINDS[op], values.list_id, index, old, new)
+                       for op, values, index, old, new in self.journal[start:])
+        self.reported = self.dropped + len(self.journal)
+        if not self.live:
+            self.__drop()
+        return records
+
+    def release(self, state):
+        "The state as plain lists by id, once the program has finished"
+        self.journal.clear()
+        self.live = []
+        return state.copy_lists()
+
+
+def _size(state) -> int:
+    "Bytes in a copy of the state's lists (the numbers in them are shared, not copied)"
+    return sys.getsizeof(state) + sum(map(sys.getsizeof, state))
+
+
+def _undo_record(record) -> ChangeRecord:
+    "The change a rollback makes in undoing a journal record"
+    op, values, index, old, new = record
+    if op == _SET:
+        return ChangeRecord("set", values.list_id, index, new, old)
+    if op in (_APPEND, _INSERT):
+        return ChangeRecord("pop", values.list_id, index, new, None)
+    if op == _POP:
+        return ChangeRecord("insert", values.list_id, index, None, old)
+    if op == _EXTEND:
+        return ChangeRecord("truncate", values.list_id, index, new, None)
+    return ChangeRecord("replace", values.list_id, None, new, old)
+
+
+class StateDelta:
+    """What a glyph changed, for debug callbacks that take deltas (see Interpreter.debug_deltas)
+
+    glyph: id of the glyph that has run (None for the final call, after the program ends)
+    changes: ChangeRecords since the previous call, including any rollback's
+    """
+    __slots__ = ("glyph", "changes", "_state")
+
+    def __init__(self, glyph, changes, state):
+        self.glyph = glyph
+        self.changes = changes
+        self._state = state
+
+    def state(self) -> dict:
+        "A copy of the whole state as it is now (only valid during the callback)"
+        return self._state.copy_lists()
@@ -0,0 +1,152 @@
+"Lexicon and command tables for Rivulet, compiled once per process for constant-time lookups"
+import json
+import re
+from functools import cache
+from pathlib import Path
+
+from rivulet.riv_tokens import intern_command
+
+OPPOSITE_DIR = {
+    "up": "down",
+    "down": "up",
+    "right": "left",
+    "left": "right"
+}
+
+# bit for each direction, used by the connectivity masks
+DIR_BIT = {
+    "up": 1,
+    "down": 2,
+    "left": 4,
+    "right": 8
+}
+
+
+class FrozenDict(dict):
+    "A dict that cannot be modified, so command entries can be shared between tokens without copying"
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("command table entries are read-only")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    __ior__ = _readonly
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __copy__(self):
+        return self
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+class Lexicon:
+    """Lookup tables built from _lexicon.json and _commands.json
+
+    entries: the lexicon, with every reading's dir converted to a list
+    by_char: character -> lexicon entry
+    symbols_by_name: entry name -> tuple of characters
+    readings_by_pos: character -> {pos: reading} (a later reading of the same pos wins)
+    readings_by_type: character -> {type: [readings]}
+    start_readings: character -> {dir: [start readings]}
+    path_reading: character -> the first corner, continue or question_marker reading
+    connects: character -> bitmask of every direction it can join in
+    joins: as connects, but ignoring the decorative pre_start readings
+    glyph_markers: regex matching a run of start_glyph characters (group "start")
+        or a single end_glyph character (group "end")
+    command_map: the raw command table
+    commands: vert_value (as str) -> {"element": command, "list": command}, with
+        each command's name interned as a Command
+    """
+
+    def __init__(self, lexicon, command_map):
+        self.entries = lexicon
+        self.by_char = {}
+        self.symbols_by_name = {}
+        self.readings_by_pos = {}
+        self.readings_by_type = {}
+        self.start_readings = {}
+        self.path_reading = {}
+        self.connects = {}
+        self.joins = {}
+
+        for entry in lexicon:
+            # convert all directions to lists (some are just strings)
+            for r in entry["readings"]:
+                if not isinstance(r["dir"], list):
+                    r["dir"] = [r["dir"]]
+
+            self.symbols_by_name[entry["name"]] = \
+                self.symbols_by_name.get(entry["name"], ()) + tuple(entry["symbol"])
+
+            by_pos = {}
+            by_type = {}
+            starts = {}
+            path = None
+            connects = 0
+            joins = 0
+            for r in entry["readings"]:
+                by_pos[r["pos"]] = r
+                if "type" in r:
+                    by_type.setdefault(r["type"], []).append(r)
+                if r["pos"] == "start":
+                    for d in r["dir"]:
+                        starts.setdefault(d, []).append(r)
+                if path is None and (r["pos"] in ("corner", "continue") or r.get("type") == "question_marker"):
+                    path = r
+                for d in r["dir"]:
+                    connects |= DIR_BIT[d]
+                    if r["pos"] != "pre_start":
+                        joins |= DIR_BIT[d]
+
+            for ch in entry["symbol"]:
+                # the first entry for a character is the one used
+                if ch in self.by_char:
+                    continue
+                self.by_char[ch] = entry
+                self.readings_by_pos[ch] = by_pos
+                self.readings_by_type[ch] = by_type
+                self.start_readings[ch] = starts
+                self.path_reading[ch] = path
+                self.connects[ch] = connects
+                self.joins[ch] = joins
+
+        self.glyph_markers = re.compile(
+            f"(?P<start>[{re.escape(''.join(self.symbols_by_name['start_glyph']))}]+)"
+            f"|(?P<end>[{re.escape(''.join(self.symbols_by_name['end_glyph']))}])")
+
+        self.command_map = FrozenDict((k, FrozenDict(v)) for k, v in command_map.items())
+        self.commands = {}
+        for key, cmd in command_map.items():
+            element = self.__compile_command(cmd)
+            self.commands[key] = {
+                "element": element,
+                "list": self.__compile_command(cmd["list"]) if "list" in cmd else element
+            }
+
+
+    @staticmethod
+    def __compile_command(cmd):
+        "A read-only command entry, without its list variant and with its name interned"
+        return FrozenDict((k, intern_command(v) if k == "name" else v) for k, v in cmd.items() if k != "list")
+
+
+    def command(self, vert_value, applies_to_list:bool):
+        "Return the shared (read-only) command for a vert_value, or None if there is none"
+        cmd = self.commands.get(str(vert_value))
+        if cmd is None:
+            return None
+        return cmd["list"] if applies_to_list else cmd["element"]
+
+
+@cache
+def compile_lexicon() -> Lexicon:
+    "Load and compile the lexicon and command tables (runs once per process)"
+    here = Path(__file__).parent
+    with open(here / '_lexicon.json', encoding='utf-8') as lex:
+        lexicon = json.load(lex)
+    with open(here / '_commands.json', encoding='utf-8') as cmds:
+        command_map = json.load(cmds)
+    return Lexicon(lexicon, command_map)
@@ -0,0 +1,119 @@
+"""Limits on a program's run: glyphs and tokens run, wall-clock time, cells held and the size of integers
+
+A Budget keeps count of what a run has used as each glyph starts. The counts
+of glyphs and tokens are checked every time, which costs a few comparisons;
+the time and the cells held, which cost more, only every Limits.interval glyph
+runs. Integers can grow far faster than that: a loop squaring a number doubles
+its size each pass. So the size of integers is checked as they are made, by
+multiplication and exponent commands (see bounded_kernel), before any number
+too large is computed. Other commands grow integers a bit at a time at most.
+"""
+import math
+import time
+
+from rivulet.riv_exceptions import LimitExceeded
+from rivulet.riv_tokens import Command
+
+
+class Limits:
+    """Limits on a run: each is None for no limit
+
+    glyphs: glyph runs
+    tokens: token runs
+    seconds: wall-clock seconds
+    cells: cells in all the lists together
+    int_bits: bits in an integer made by multiplication or an exponent
+    interval: glyph runs between checks of the time and the cells held
+    """
+
+    def __init__(self, glyphs=None, tokens=None, seconds=None, cells=None, int_bits=None, interval=1000):
+        self.glyphs = glyphs
+        self.tokens = tokens
+        self.seconds = seconds
+        self.cells = cells
+        self.int_bits = int_bits
+        self.interval = interval
+
+
+class Budget:
+    "What one run has used of its Limits"
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.glyph_runs = 0
+        self.token_runs = 0
+        self.glyph = None   # id of the glyph running (or last run)
+        self.state = None   # the state it runs against
+        self.started = time.perf_counter()
+        self.__max_glyphs = math.inf if limits.glyphs is None else limits.glyphs
+        self.__max_tokens = math.inf if limits.tokens is None else limits.tokens
+        self.__next_check = limits.interval
+
+    def start(self, glyph_id, tokens, state):
+        "A glyph is about to run its tokens (a count) against the state"
+        self.glyph = glyph_id
+        self.state = state
+        self.glyph_runs += 1
+        self.token_runs += tokens
+        if self.glyph_runs > self.__max_glyphs:
+            raise self.exceeded("glyphs", self.limits.glyphs)
+        if self.token_runs > self.__max_tokens:
+            raise self.exceeded("tokens", self.limits.tokens)
+        if self.glyph_runs >= self.__next_check:
+            self.__next_check += self.limits.interval
+            self.check()
+
+    def check(self):
+        "Check the time taken and the cells held"
+        limits = self.limits
+        if limits.seconds is not None and time.perf_counter() - self.started > limits.seconds:
+            raise self.exceeded("seconds", limits.seconds)
+        if limits.cells is not None and self.state is not None and sum(map(len, self.state)) > limits.cells:
+            raise self.exceeded("cells", limits.cells)
+
+    def exceeded(self, limit, bound) -> LimitExceeded:
+        "The error for a limit hit now, with the counts so far and a copy of the state"
+        state = self.state.copy_lists() if self.state is not None else None
+        return LimitExceeded(limit, bound, self.glyph, self.glyph_runs, self.token_runs, state)
+
+
+def bounded_product(initial, assign, max_bits):
+    "initial * assign, unless that is an integer of more than max_bits bits"
+    if initial.__class__ is int and assign.__class__ is int:
+        bits = initial.bit_length() + assign.bit_length()
+        # a product has as many bits as its factors together, or one fewer
+        if bits - 1 > max_bits:
+            raise LimitExceeded("int_bits", max_bits)
+        product = initial * assign
+        if bits > max_bits and product.bit_length() > max_bits:
+            raise LimitExceeded("int_bits", max_bits)
+        return product
+    return initial * assign
+
+
+def bounded_power(initial, assign, max_bits):
+    "initial ** assign, unless that is an integer of more than max_bits bits"
+    if initial.__class__ is int and assign.__class__ is int and assign > 1 and abs(initial) > 1:
+        bits = initial.bit_length()
+        # |initial| is at least 2 ** (bits - 1), and below 2 ** bits
+        if (bits - 1) * assign >= max_bits:
+            raise LimitExceeded("int_bits", max_bits)
+        power = initial ** assign
+        if bits * assign > max_bits and power.bit_length() > max_bits:
+            raise LimitExceeded("int_bits", max_bits)
+        return power
+    return initial ** assign
+
+
+BOUNDED = {
+    Command.multiplication_assignment: bounded_product,
+    Command.exponent_assignment: bounded_power,
+}
+
+
+def bounded_kernel(command, max_bits):
+    "The kernel for a command that checks the size of the integers it makes, or None if it needs no check"
+    bounded = BOUNDED.get(command)
+    if bounded is None or max_bits is None:
+        return None
+    return lambda initial, assign: bounded(initial, assign, max_bits)
@@ -1,105 +1,183 @@
-import copy
-import json
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 import math
-import rivulet
-from pathlib import Path
 from rivulet.riv_exceptions import InternalError, RivuletSyntaxError
+from rivulet.riv_lexicon import DIR_BIT, OPPOSITE_DIR, compile_lexicon
+from rivulet.riv_primes import list_ids
+from rivulet.riv_tokens import Cell, Glyph, Subtype, Token, TokenType, pack_token, unpack_token
 # pylint: disable=locally-disabled, fixme, line-too-long
 
+# x, y offset of a step in each direction
+STEP = {
+    "up": (0, -1),
+    "down": (0, 1),
+    "left": (-1, 0),
+    "right": (1, 0)
+}
 
-def _chars_in_list(list1, list2):
-    retset = []
-    for val in list1:
-        retset += [i for i in range(len(list2)) if list2[i] == val]
-    return retset
 
-OPPOSITE_DIR = {
-    "up": "down",
-    "down": "up",
-    "right": "left",
-    "left": "right"
-}
+class _StartIndex:
+    """Glyph Starts indexed by row, with the x values of each row kept sorted,
+    so the Start matching an End can be found without comparing every pair"""
+
+    def __init__(self, starts):
+        self.by_pos = {}
+        self.rows = {}
+        for s in starts:
+            self.by_pos[(s["x"], s["y"])] = s
+            self.rows.setdefault(s["y"], []).append(s["x"])
+        for xs in self.rows.values():
+            xs.sort()
+        self.row_keys = sorted(self.rows)
+
+    def __len__(self):
+        return len(self.by_pos)
+
+    def closest(self, end_x, end_y):
+        """The closest Start up and to the left of (end_x, end_y) with no other Start in
+        the rectangle between them; ties go to the Start that comes first in reading order"""
+        best = None
+        best_dist = None
+        # rightmost x of any Start seen so far: a Start at or left of this is blocked
+        blocking_x = -1
+
+        # walk up the rows from the End; in each row only the rightmost Start at or
+        # left of the End can be unblocked, and the rows are visited closest first
+        for r in range(bisect_right(self.row_keys, end_y) - 1, -1, -1):
+            y = self.row_keys[r]
+            if best is not None and (end_y - y) ** 2 > best_dist:
+                break
+            xs = self.rows[y]
+            i = bisect_right(xs, end_x) - 1
+            if i < 0 or xs[i] <= blocking_x:
+                continue
+            x = xs[i]
+            blocking_x = x
+
+            if x < end_x and y < end_y:
+                dist = (end_x - x) ** 2 + (end_y - y) ** 2
+                if best is None or dist <= best_dist:
+                    best = self.by_pos[(x, y)]
+                    best_dist = dist
+
+            if blocking_x >= end_x:
+                # every Start further up is blocked
+                break
+        return best
+
+    def remove(self, start):
+        "Remove a Start, so it is no longer matched or blocks other matches"
+        del self.by_pos[(start["x"], start["y"])]
+        xs = self.rows[start["y"]]
+        del xs[bisect_left(xs, start["x"])]
+        if not xs:
+            del self.rows[start["y"]]
+            del self.row_keys[bisect_left(self.row_keys, start["y"])]
+
+    def first(self):
+        "The remaining Start that comes first in reading order"
+        y = self.row_keys[0]
+        return self.by_pos[(self.rows[y][0], y)]
+
+
+def glyph_size(glyph):
+    "The longer of a glyph's height and the width of its first row, which decides how many primes it needs"
+    return max(len(glyph["glyph"]), len(glyph["glyph"][0]))
+
+
+class ParsedProgram:
+    """A parse kept so that the program can be re-parsed after an edit (see Parser.reparse_program)
+
+    lines: the program's lines
+    glyphs: the parse, as Parser.parse_program returns it
+    tops, bottoms: the first and last line of each glyph
+    primes: the list ids the glyphs were parsed with
+    sizes: how many glyphs there are of each glyph_size
+    """
+
+    def __init__(self, lines, glyphs, tops, bottoms, primes, sizes=None):
+        self.lines = lines
+        self.glyphs = glyphs
+        self.tops = tops
+        self.bottoms = bottoms
+        self.primes = primes
+        self.sizes = sizes if sizes is not None else Counter(glyph_size(g) for g in glyphs)
+
+    def sizes_of(self, indexes):
+        "glyph_size of each of the glyphs at indexes"
+        return [glyph_size(self.glyphs[g]) for g in indexes]
+
 
 class Parser:
     "Parser for the Rivulet esolang"
 
-    def __init__(self):
-        here = Path(rivulet.__path__[0])
-        with open(here / '_lexicon.json', encoding='utf-8') as lex:
-            self.lexicon = json.load(lex)
-        with open(here / '_commands.json', encoding='utf-8') as cmds:
-            self.command_map = json.load(cmds)
+    # programs with fewer glyphs than this are always parsed serially
+    PARALLEL_MIN_GLYPHS = 256
+
+    def __init__(self, workers=1, parallel_min_glyphs=PARALLEL_MIN_GLYPHS):
+        """workers: number of processes to lex glyphs across (1 lexes in this process)
+        parallel_min_glyphs: programs with fewer glyphs are lexed in this process regardless"""
+        self.workers = workers
+        self.parallel_min_glyphs = parallel_min_glyphs
 
-        # convert all directions to lists (some are just strings)
-        for s in self.lexicon:
-            for r in s["readings"]:
-                if not isinstance(r["dir"], list):
-                    r["dir"] = [r["dir"]]
+        # the lexicon and command tables are compiled once and shared by every Parser
+        self.lex = compile_lexicon()
+        self.lexicon = self.lex.entries
+        self.command_map = self.lex.command_map
 
         self.primes = []
+        self.timer = None   # PhaseTimer to time each phase with (see riv_timing)
 
 
-    def get_symbol_by_name(self, name:str):
-        "Returns symbol representation and readings for a given name"
-        retlist = []
+    def __phase(self, name):
+        "A phase of the timer, or a context that times nothing when there is none"
+        return self.timer.phase(name) if self.timer is not None else nullcontext()
 
-        for ltr in self.lexicon:
-            if ltr["name"] == name:
-                retlist += ltr["symbol"]
 
-        return retlist
+    def get_symbol_by_name(self, name:str):
+        "Returns symbol representation for a given name"
+        return self.lex.symbols_by_name.get(name, ())
 
 
-    def __get_neighbor(self, x, y, dirtn, glyph, include_coords=False):
+    def __get_neighbor(self, x, y, dirtn, glyph):
         if dirtn == "up" and y > 0:
-            if include_coords:
-                return {"symbol": glyph[y-1][x], "x": x, "y": y-1}
             return glyph[y-1][x]
         elif dirtn == "left" and x > 0:
-            if include_coords:
-                return {"symbol": glyph[y][x-1], "x": x-1, "y": y}
             return glyph[y][x-1]
         elif dirtn == "down" and y < len(glyph)-1:
-            if include_coords:
-                return {"symbol": glyph[y+1][x], "x": x, "y": y+1}
             return glyph[y+1][x]
         elif dirtn == "right" and x < len(glyph[y])-1:
             # this assumes the glyph is a perfect rect
-            if include_coords:
-                return {"symbol": glyph[y][x+1], "x": x+1, "y": y}
             return glyph[y][x+1]
         return None
 
 
-    def __find_successful_matches(self, x, y, glyph, readings):
+    def __find_successful_matches(self, x, y, glyph):
         "Find directions where there is a continuing character on the other side of a sign"
 
         successful_matches = []
 
         # assuming only one reading of this kind
-        reading = [r for r in readings \
-                if r["pos"] == "corner" \
-                or r["pos"] == "continue" \
-                or r["type"] == "question_marker"]
+        reading = self.lex.path_reading.get(glyph[y][x])
 
         if not reading:
             return None
 
-        for direction in reading[0]["dir"]:
+        for direction in reading["dir"]:
             neighbor = self.__get_neighbor(x, y, direction, glyph)
             if not neighbor:
                 continue
 
-            # all neighbor's readings
-            nbr_reads = [l["readings"] for l in self.lexicon if neighbor in l["symbol"]]
-            if not nbr_reads or (glyph[y][x] == neighbor and (neighbor == "╷" or neighbor == "╵")):
+            if neighbor not in self.lex.by_char or (glyph[y][x] == neighbor and (neighbor == "╷" or neighbor == "╵")):
                 continue
 
             # we ignore pre_start as it is decorative and adds no value
             # NOTE: a pre_start may become required for left/right hooks
             # as the language develops (need to see how much it affects
             # aesthetics in specific cases)
-            if any(n for n in nbr_reads[0] if OPPOSITE_DIR[direction] in n["dir"] and n["pos"] != "pre_start"):
+            if self.lex.joins[neighbor] & DIR_BIT[OPPOSITE_DIR[direction]]:
                 successful_matches.append(direction)
 
         return successful_matches
@@ -107,44 +185,42 @@ class Parser:
 
     def __check_is_start(self, x, y, glyph):
 
-        symbol = [l for l in self.lexicon if glyph[y][x] in l["symbol"]]
+        symbol = self.lex.by_char.get(glyph[y][x])
 
         # symbol has no reading, ignore
-        if not symbol or len(symbol) == 0:
+        if not symbol:
             return None
 
-        readings = [s["readings"] for s in symbol][0]
+        starts = self.lex.start_readings[glyph[y][x]]
 
         # symbol has no starts, ignore
-        if not any(r["pos"] == "start" for r in readings):
+        if not starts:
             return None
 
-        successful_matches = self.__find_successful_matches(x, y, glyph, readings)
+        successful_matches = self.__find_successful_matches(x, y, glyph)
 
         if len(successful_matches) != 1:
             return None
 
         # the reading compatible with the direction of the strand
-        reading_for_match = [r for r in readings \
-            if r["pos"] == "start" \
-            and r["dir"] == [successful_matches[0]]]
+        reading_for_match = starts.get(successful_matches[0], [])
 
         if len(reading_for_match) != 1:
             raise InternalError(f"{len(reading_for_match)} dirs in a start where 1 was expected")
 
-        return {
-            "symbol": symbol[0]["symbol"],
-            "name": symbol[0]["name"],
-            "x": x,
-            "y": y,
-            "dir": successful_matches[0],
-            "pos": "start",
-            "type": reading_for_match[0]["type"],
-            "action": None,
-            "value": None,
-            "vert_value": None,
-            "subtype": None
-        }
+        return Token(
+            symbol=symbol["symbol"],
+            name=symbol["name"],
+            x=x,
+            y=y,
+            dir=successful_matches[0],
+            pos="start",
+            type=TokenType(reading_for_match[0]["type"]),
+            action=None,
+            value=None,
+            vert_value=None,
+            subtype=None
+        )
 
 
     def __find_strand_starts(self, glyph):
@@ -158,106 +234,124 @@ class Parser:
 
 
     def __interpret_strand(self, glyph, prev, start):
-        """Recursively follow the data strand to determine build out its value and determine its subtype (value vs ref if data strand etc). 
-        
+        """Follow the strand to build out its value and determine its subtype (value vs ref if data strand etc).
+
+        The strand is traced one cell at a time in a loop, so strands of any length
+        are followed without growing the stack.
+
         Parameters:
             glyph: the glyph matrix
-            prev: the current step's data (it will advance to the next step)
+            prev: the hook which begins the strand (its "dir" points to the first cell)
             start: the start of the strand
         This will modify the start object in place.
         """
-        # At the beginning of a strand, prev is the hook which begins it (and never has any other reading).
-        # We already know the direction prev is pointing, so we can look for the next character in that direction and mark as curr.
-        curr = self.__get_neighbor(prev["x"], prev["y"], prev["dir"], glyph, include_coords=True)
+        lex = self.lex
+        primes = self.primes
 
         if "cells" not in start:
             start["cells"] = []
+        cells = start["cells"]
+
+        x = prev["x"]
+        y = prev["y"]
+        # the direction we are travelling in as we enter the next cell
+        dirtn = prev["dir"]
+        value = start["value"]
+        vert_value = start["vert_value"]
+
+        while True:
+            # At the beginning of a strand, prev is the hook which begins it (and never has any other reading).
+            # We already know the direction prev is pointing, so we can look for the next character in that direction and mark as curr.
+            x += STEP[dirtn][0]
+            y += STEP[dirtn][1]
+            if y < 0 or y >= len(glyph) or x < 0 or x >= len(glyph[y]):
+                raise RivuletSyntaxError(f"Strand leaves the glyph after char {x - STEP[dirtn][0]}, {y - STEP[dirtn][1]}")
+            symbol = glyph[y][x]
+
+            curr = Cell(symbol, x, y)
+            cells.append(curr)
+
+            # next_dir is the direction curr continues onto its following character
+            next_dir = False
+
+            # possible interpretations of the character, pulled from the lexicon
+            readings = lex.readings_by_pos.get(symbol)
+
+            if readings is None:
+                if symbol == ' ':
+                    raise InternalError(f"Blank space found at {x},{y}")
+                raise InternalError(f"No symbol found for {symbol}")
+
+            path = readings.get("continue") or readings.get("corner")
+            if path:
+                # if it's for the matching direction
+                came_from = OPPOSITE_DIR[dirtn]
+                if came_from in path['dir']:
+                    # the remaining direction of the reading is where the strand goes next
+                    onward = [d for d in path['dir'] if d != came_from]
+                    if len(onward) != 1:
+                        raise InternalError("More than one direction in next step")
+                    next_dir = onward[0]
+
+            # if it is moving left/right with a continue, add to value
+            if next_dir and "continue" in readings:
+
+                if not value:
+                    value = 0
+                if not vert_value:
+                    vert_value = 0
+
+                # if it's straight and left or right, we add or subtract the prime
+                if next_dir == 'right':
+                    value += primes[y]
+                elif next_dir == 'left':
+                    value -= primes[y]
+
+                # if it's up or down, we add or subtract the prime relative to the start of this strand
+                elif next_dir == 'down':
+                    vert_value += primes[abs((start["x"] - x) // 2)]
+                elif next_dir == 'up':
+                    vert_value -= primes[abs((start["x"] - x) // 2)]
+
+            # TEST FOR END
+            # a loc_marker is also an end, but only if it's pointing in the opposite direction of the previous character
+            if "end" in readings or "loc_marker" in readings:
+                following = None
+                if next_dir:
+                    # does the strand end here
+                    nx = x + STEP[next_dir][0]
+                    ny = y + STEP[next_dir][1]
+                    if 0 <= ny < len(glyph) and 0 <= nx < len(glyph[ny]):
+                        following = lex.connects.get(glyph[ny][nx])
+
+                # if it's possible this is also a continue, we need to check if the next step has a continuation or if this is really the end
+                # NOTE: We can't end on a corner or it would be a "hook" to start a strand (no strand can have a hook on both sides)
+                has_connecting_sign = (next_dir and following and following & DIR_BIT[OPPOSITE_DIR[next_dir]])
+
+                if not next_dir \
+                    or not following \
+                    or not ("continue" in readings and has_connecting_sign):
+
+                    # WE ARE AT THE END of the strand
+                    start["value"] = value
+                    start["vert_value"] = vert_value
+                    self.__mark_end(start, curr, next_dir, dirtn, readings)
+                    return
+
+            # if it continues, move on to the next character
+            if path and next_dir:
+                curr["dir"] = next_dir
+                dirtn = next_dir
+                continue
 
-        start["cells"].append(curr)
-
-        # next_dir is the direction curr continues onto its following character
-        next_dir = False
-
-        # symbol is the metadata, pulled from the lexicon, for curr's character
-        symbol = [l for l in self.lexicon if curr['symbol'] in l['symbol']]
-
-        if not symbol or len(symbol) == 0:
-            if curr['symbol'] == ' ':
-                raise InternalError(f"Blank space found at {curr['x']},{curr['y']}")
-            raise InternalError(f"No symbol found for {curr['symbol']}")
-        if len(symbol) > 1:
-            raise InternalError(f"More than one symbol found for {curr['symbol']}")
-
-        # possible interpretations of the character
-        readings = {}
-        for r in [s['readings'] for s in symbol][0]:
-            readings[r["pos"]] = r
-
-        if "continue" in readings or "corner" in readings:
-            # if it's for the matching direction
-            if OPPOSITE_DIR[prev['dir']] in r['dir']:
-                # remove entries from r['dir'] matching opposite of start['dir']
-                next_dir = set(r['dir']) - set([OPPOSITE_DIR[prev['dir']]])
-                if len(next_dir) != 1:
-                    raise InternalError("More than one direction in next step")
-                next_dir = next_dir.pop()
-
-        # if it is moving left/right with a continue, add to value
-        if "continue" in readings and next_dir:
-
-            if not start["value"]:
-                start["value"] = 0
-            if not start["vert_value"]:
-                start["vert_value"] = 0
-
-            # if it's straight and left or right, we add or subtract the prime
-            if next_dir == 'right':
-                start['value'] += self.primes[curr["y"]]
-            elif next_dir == 'left':
-                start['value'] -= self.primes[curr["y"]]
-
-            # if it's up or down, we add or subtract the prime relative to the start of this strand
-            if next_dir == 'down':
-                start['vert_value'] += self.primes[abs(math.floor((start["x"] - curr["x"])/2))]
-            elif next_dir == 'up':
-                start['vert_value'] -= self.primes[abs(math.floor((start["x"] - curr["x"])/2))]
-
-        # TEST FOR END
-        # a loc_marker is also an end, but only if it's pointing in the opposite direction of the previous character
-        if "end" in readings or "loc_marker" in readings:
-            if next_dir:
-                # does the strand end here
-                following = [i for i in self.lexicon if self.__get_neighbor(curr['x'], curr['y'], next_dir, glyph) in i['symbol']]
-
-                # there should only be one
-                if following:
-                    following = following[0]
-                else:
-                    following = None
-
-            # if it's possible this is also a continue, we need to check if the next step has a continuation or if this is really the end
-            # NOTE: We can't end on a corner or it would be a "hook" to start a strand (no strand can have a hook on both sides)
-            has_connecting_sign = (next_dir and following and OPPOSITE_DIR[next_dir] in [x for xs in [r["dir"] for r in following["readings"]]for x in xs])
-
-            if not next_dir \
-                or not following \
-                or not ("continue" in readings and has_connecting_sign):
-
-                # WE ARE AT THE END of the strand
-                self.__mark_end(start, curr, next_dir, prev, readings)
-                return
-
-        # if it continues, load the next character
-        if ("continue" in readings or "corner" in readings) and next_dir:
-            curr["dir"] = next_dir
-            self.__interpret_strand(glyph, curr, start)
-            return
+            raise RivuletSyntaxError(f"No valid reading found for char {x}, {y}")
 
-        raise RivuletSyntaxError(f"No valid reading found for char {curr['x']}, {curr['y']}")
 
+    def __mark_end(self, start, curr, next_dir, prev_dir, readings):
+        """Determine what kind of strand we have and null out anything irrelevant to its reading
 
-    def __mark_end(self, start, curr, next_dir, prev, readings):
-        "Determine what kind of strand we have and null out anything irrelevant to its reading"
+        prev_dir is the direction the strand was travelling in as it reached curr
+        """
 
         if start["type"] == "question_marker":
             start['end_x'] = curr['x']
@@ -268,7 +362,7 @@ class Parser:
         # if it's a value strand, we need to mark it as such
         # check if the loc_marker reading has the right direction
         elif "loc_marker" in readings and \
-            OPPOSITE_DIR[prev['dir']] in readings["loc_marker"]['dir']:
+            OPPOSITE_DIR[prev_dir] in readings["loc_marker"]['dir']:
 
             # REF or LIST2LIST:
 
@@ -277,36 +371,30 @@ class Parser:
             start['end_y'] = curr['y']
             if start['type'] == "data":
                 start["vert_value"] = None
-                start['subtype'] = "ref"
+                start['subtype'] = Subtype.ref
             if start['type'] == "action":
-                start["subtype"] = "list2list"
+                start["subtype"] = Subtype.list2list
                 start["applies_to"] = "list"
-                start["command"] = copy.deepcopy(self.command_map[str(start["vert_value"])])
-                if "list" in start['command']:
-                    start['command'] = start['command']['list']
+                start["command"] = self.lex.commands[str(start["vert_value"])]["list"]
         else:
 
             # DATA or ACTION to a val:
 
             if start['type'] == "data":
-                start['subtype'] = "value"
+                start['subtype'] = Subtype.value
                 start["vert_value"] = None
             if start['type'] == "action":
                 start["value"] = None
                 if not str(start["vert_value"]) in self.command_map:
                     raise RivuletSyntaxError(f"Command not found for {start['vert_value']}")
-                start["command"] = copy.deepcopy(self.command_map[str(start["vert_value"])])
+                # the command tables are shared and read-only, with the list and
+                # element versions of each command already separated
                 if next_dir in ("right", "left"):
-                    start['subtype'] = "list"
-                    if "list" in start['command']:
-                        start['command'] = start['command']['list']
+                    start['subtype'] = Subtype.list
+                    start["command"] = self.lex.command(start["vert_value"], True)
                 else:
-                    start['subtype'] = "element"
-
-        # at this point, we've either used the list version or not, and can get rid of the additional reading
-
-        if "command" in start and "list" in start["command"]:
-            del start["command"]["list"]
+                    start['subtype'] = Subtype.element
+                    start["command"] = self.lex.command(start["vert_value"], False)
 
 
     def __lex_glyph(self, glyph):
@@ -314,7 +402,8 @@ class Parser:
         #FIXME: should ensure that starts and ends are cleared OR TAKE PARAM
 
         # make glyph rectangular
-        glyph = [ln + [' '] * (max([len(i) for i in glyph]) - len(ln)) for ln in glyph]
+        width = max(len(i) for i in glyph)
+        glyph = [ln + [' '] * (width - len(ln)) for ln in glyph]
 
         starts = self.__find_strand_starts(glyph)
         for s in starts:
@@ -322,103 +411,93 @@ class Parser:
         return starts
 
 
-    def __has_continuation(self, x, y, program, dirtn):
-        "Look for continuations, meant to rule out potential Starts and Ends"
-        try:
-            neighbor = self.__get_neighbor(x, y, dirtn, program, include_coords=True)
-        except IndexError:
-            return False # if we are at the edge of the glyph, we can't have a continuation
-        if neighbor:
-            n_read = [l["readings"] for l in self.lexicon if neighbor["symbol"] in l["symbol"]]
-            if n_read:
-                n_read = n_read[0]
-            if n_read and len([t for t in n_read if OPPOSITE_DIR[dirtn] in t["dir"]])  != 0:
-                return True # has a continuation
-        return False
-
-
     def __match_starts_ends(self, starts, ends):
-        matches = []
-        for e in ends:
-            # build possible Starts for this End
-            possible_starts = []
+        """Pair each End with its Start: the closest Start above and to the left
+        of the End with no other Start inside the rectangle between them.
 
-            # start has to have a smaller x value and y value
-            # exclude starts where another end would be in its block
-            for s in [s for s in starts if s['x'] < e['x'] and s['y'] < e['y']]:
-                in_betweens = [os for os in starts if os['x'] >= s['x'] and os['x'] <= e['x'] and os['y'] >= s['y'] and os['y'] <= e['y'] and s != os]
+        Ends are matched in the order given and a matched Start is no longer
+        a candidate (or an obstacle) for the Ends that follow.
+        """
+        matches = []
+        index = _StartIndex(starts)
 
-                if len(in_betweens) == 0:
-                    possible_starts.append(s)
+        for e in ends:
+            closest_start = index.closest(e["x"], e["y"])
 
-            if not possible_starts:
+            if not closest_start:
                 raise RivuletSyntaxError(f"End glyph at {e['x']}, {e['y']} has no corresponding Start")
 
-            # get the cloest start for that end
-            closest_start = min(possible_starts, key=lambda s: math.dist([s["x"], s["y"]], [e["x"], e["y"]]))
-
             level = closest_start["level"]
             del closest_start["level"]
             matches.append({"start": closest_start, "end": e, "level": level})
 
-            # remove that starta s a possibility for the ohter ends
-            starts.remove(closest_start)
+            # remove that start as a possibility for the other ends
+            index.remove(closest_start)
 
-        if len(starts) > 0:
-            s = starts[0]
+        if index:
+            s = index.first()
             raise RivuletSyntaxError(f"Start glyph at {s['x']}, {s['y']} has no matching end")
 
         return sorted(matches, key=lambda x: (x["start"]['y'], x["start"]['x']))
 
 
-    def __locate_glyphs(self, program):
+    def __locate_glyphs(self, program, first=0, last=None):
         """Find all the Starts and Ends where:
             - everything in the col left of Start down to End is blank
             - everything in the row below End back to Start is blank
             - the Start and End are not connected to other symbols
             - the Start and End are not on the same line
           Determine level of glyph
+        Only markers in rows first up to (not including) last are considered.
+
+        This is a single sweep over the rows: each run of start_glyph characters
+        is a candidate Start at its right-most character, its length the glyph's
+        level, and each end_glyph character is a candidate End. Either is dropped
+        if the character above or below it connects to it.
         """
         starts = []
         ends = []
 
-        for y, ln in enumerate(program):
-            for x in _chars_in_list(self.get_symbol_by_name("start_glyph"), ln):
-                # make sure immediate right does not also have start symbol
+        markers = self.lex.glyph_markers
+        connects = self.lex.connects
+        up = DIR_BIT["up"]
+        down = DIR_BIT["down"]
+
+        last = len(program) if last is None else last
+        above = program[first - 1] if first > 0 else None
+        for y in range(first, last):
+            ln = program[y]
+            below = program[y + 1] if y + 1 < len(program) else None
+
+            for marker in markers.finditer("".join(ln)):
+                x = marker.end() - 1
+
                 # it does not have a continuation up or down
-                if (x == len(ln) - 1 or not ln[x+1] in self.get_symbol_by_name("start_glyph")) \
-                and not self.__has_continuation(x, y, program, "up") \
-                and not self.__has_continuation(x, y, program, "down"):
-                    level = 1
-                    if x > 0 and ln[x-1] in self.get_symbol_by_name("start_glyph"):
-                        # find the level of the glyph by walking to the left
-                        for i in reversed(range(0, x)):
-                            if ln[i] in self.get_symbol_by_name("start_glyph"):
-                                level += 1
-                            else:
-                                break
-                    starts.append({"y":y, "x":x, "level":level})
-
-            for x in _chars_in_list(self.get_symbol_by_name("end_glyph"), ln):
-                if not self.__has_continuation(x, y, program, "down") and not self.__has_continuation(x, y, program, "up"):
+                if above is not None and x < len(above) and connects.get(above[x], 0) & down:
+                    continue
+                if below is not None and x < len(below) and connects.get(below[x], 0) & up:
+                    continue
+
+                if marker.lastgroup == "start":
+                    # the level of the glyph is the number of start symbols in a row
+                    starts.append({"y":y, "x":x, "level":marker.end() - marker.start()})
+                else:
                     ends.append({"y":y, "x":x})
 
+            above = ln
+
+        if self.timer is not None:
+            self.timer.count("characters scanned", sum(len(program[y]) for y in range(first, last)))
+            self.timer.count("glyph candidates", len(starts) + len(ends))
+
         # now we have a list of possible starts and ends, pass to match them
         return self.__match_starts_ends(starts, ends)
 
 
     def __load_primes(self, glyphs):
         "Load a list of primes up to the length of the longest dimension of any glyph"
-        self.primes = [1]
-        primes_to_count = max( \
-            *[len(i['glyph']) for i in glyphs], \
-            *[len(i['glyph'][0]) for i in glyphs] \
-        )
-        for num in range(2, primes_to_count ** 2):
-            if all(num % i != 0 for i in range(2, int(math.sqrt(num)) + 1)):
-                self.primes.append(num)
-                if len(self.primes) >= primes_to_count:
-                    break
+        primes_to_count = max(glyph_size(i) for i in glyphs)
+        self.primes = list_ids(max(primes_to_count, 1))
 
 
     def __remove_blank_lines(self, program):
@@ -443,7 +522,7 @@ class Parser:
                 glyph[0][i] = ' '
             glyph[-1][-1] = ' '
 
-            block_tree.append({"level":g["level"], "end_loc":[len(glyph), len(glyph[-1])], "glyph":glyph})
+            block_tree.append(Glyph(level=g["level"], end_loc=[len(glyph), len(glyph[-1])], glyph=glyph))
 
         return block_tree
 
@@ -452,142 +531,318 @@ class Parser:
         "Arrange Strands in order to be run and fill out with what they assign to, what is tested, etc"
 
         for g, glyph in enumerate(glyphs):
-            order = 0
-            count_per_list = {}
+            self.__parse_glyph(g, glyph)
 
-            # primes list count = max number of lines in a glyph
-            for idx in range(len(self.primes)):
-                count_per_list[idx] = 0
 
-            # build out new array in sort order
-            sorted_tokens = []
-
-            # Tokens read in X, Y order and exclude tokens that run later
-            # or modify other tokens
-            for token in \
-                [t for t in sorted(glyph["tokens"], \
-                key=lambda x: (x['x'], x['y'])) \
-                    if t["type"] != "question_marker"
-                    and t["type"] != "action"]:
+    def __count_parsed(self, glyphs):
+        "Count the glyphs parsed, their strands, the cells of those and the references resolved"
+        strands = cells = refs = 0
+        for glyph in glyphs:
+            for token in glyph["tokens"]:
+                # action strands and second question markers are parsed into the strand they go with
+                for strand in (token, token.get("action"), token.get("second")):
+                    if strand is None:
+                        continue
+                    strands += 1
+                    cells += len(strand.get("cells") or ())
+                    if strand.get("ref_cell") is not None or strand.get("ref_list") is not None:
+                        refs += 1
+        self.timer.count("glyphs", len(glyphs))
+        self.timer.count("strands traced", strands)
+        self.timer.count("cells visited", cells)
+        self.timer.count("refs resolved", refs)
+
+
+    def __parse_glyph(self, g, glyph):
+        "Arrange the Strands of glyph number g (see __parse_glyphs)"
+
+        order = 0
+
+        # build out new array in sort order
+        sorted_tokens = []
+
+        # the tokens are sorted once, in X, Y order; the data tokens are then
+        # indexed by row (x values, in order) and by column (in y order)
+        in_order = sorted(glyph["tokens"], key=lambda t: (t["x"], t["y"]))
+        row_xs = {}
+        column_data = {}
+
+        # Tokens read in X, Y order and exclude tokens that run later
+        # or modify other tokens
+        for token in in_order:
+            if token["type"] == "question_marker" or token["type"] == "action":
+                continue
 
-                token["list"] = self.primes[token["y"]]
+            token["list"] = self.primes[token["y"]]
+            token["order"] = order
+            order += 1
+
+            # the cells of a list are assigned left to right
+            xs = row_xs.setdefault(token["y"], [])
+            token["assign_to_cell"] = len(xs)
+            xs.append(token["x"])
+            if token["type"] == "data":
+                column_data.setdefault(token["x"], []).append(token)
+            sorted_tokens.append(token)
+
+        def cell_after(x, y):
+            "The cell a reference at x, y points to: the one after the last assigned to its left"
+            # no data cells declared for this list before where the ref points gives cell 0
+            return [self.primes[y], bisect_left(row_xs.get(y, ()), x)]
+
+        # Question Markers are to be run last
+        # read in vertical order
+        for idx, token in \
+            enumerate(sorted([t for t in glyph["tokens"] if t["type"] == "question_marker"], \
+            key=lambda x: x['y'])):
+
+            if idx == 0:
+                token["subtype"] = Subtype.first
                 token["order"] = order
                 order += 1
-
-                token["assign_to_cell"] = count_per_list[token["y"]]
-                count_per_list[token["y"]] += 1
                 sorted_tokens.append(token)
-
-            # Question Markers are to be run last
-            # read in vertical order
-            for idx, token in \
-                enumerate([t for t in sorted(glyph["tokens"], \
-                key=lambda x: x['y']) if t["type"] == "question_marker"]):
-
-                if idx == 0:
-                    token["subtype"] = "first"
-                    token["order"] = order
-                    order += 1
-                    sorted_tokens.append(token)
-                    first_qm = token
-                    if token["x"] < token["end_x"]:
-                        token["position"] = "right"
-                        token["block_type"] = "while"
-                    else:
-                        token["position"] = "left"
-                        token["block_type"] = "if"
-                elif idx == 1:
-                    token["subtype"] = "second"
-                    if first_qm["end_x"] != token["x"] or first_qm["end_y"] != token["y"]:
-                        raise RivuletSyntaxError(f"A second question marker must begin just below where the first ends [glyph {g}]")
-                    first_qm["second"] = token
-
-                    last_marker_type = [x for x in self.lexicon if token["cells"][-1]["symbol"] in x["symbol"]]
-                    if len(last_marker_type) == 0:
-                        raise RivuletSyntaxError("Could not determine end of second question marker in a set")
-                    last_marker_type = last_marker_type[0]
-                    first_qm["end_pos"] = last_marker_type["name"]
-                    if first_qm["end_pos"] == "horizontal":
-                        first_qm["applies_to"] = "list"
-                        first_qm["ref_list"] = first_qm["ref_cell"][0]
-                        del first_qm["ref_cell"]
-                    else:
-                        first_qm["applies_to"] = "cell"
+                first_qm = token
+                if token["x"] < token["end_x"]:
+                    token["position"] = "right"
+                    token["block_type"] = "while"
                 else:
-                    raise RivuletSyntaxError(f"Invalid number of question markers: only 0 or 2 are allowed in a glyph [glyph {g}]")
+                    token["position"] = "left"
+                    token["block_type"] = "if"
+            elif idx == 1:
+                token["subtype"] = Subtype.second
+                if first_qm["end_x"] != token["x"] or first_qm["end_y"] != token["y"]:
+                    raise RivuletSyntaxError(f"A second question marker must begin just below where the first ends [glyph {g}]")
+                first_qm["second"] = token
+
+                last_marker_type = self.lex.by_char.get(token["cells"][-1]["symbol"])
+                if not last_marker_type:
+                    raise RivuletSyntaxError("Could not determine end of second question marker in a set")
+                first_qm["end_pos"] = last_marker_type["name"]
+                if first_qm["end_pos"] == "horizontal":
+                    first_qm["applies_to"] = "list"
+                    first_qm["ref_list"] = first_qm["ref_cell"][0]
+                    del first_qm["ref_cell"]
+                else:
+                    first_qm["applies_to"] = "cell"
+            else:
+                raise RivuletSyntaxError(f"Invalid number of question markers: only 0 or 2 are allowed in a glyph [glyph {g}]")
+
+            # get ref cell (or list) for the question marker
+            token["ref_cell"] = cell_after(token["x"], token["y"])
+
+        # Ref markers determine their reference cells
+        for token in sorted_tokens:
+            if token["subtype"] == "ref":
+                token["ref_cell"] = cell_after(token["end_x"], token["end_y"])
+
+        # Action strands are added to their respective data strands
+        # The top action strand for an x value goes to the top data strand for that x value
+        curr_x = 0
+        x_count = 0
+        for actiontoken in in_order:
+            if actiontoken["type"] != "action":
+                continue
+            if int(actiontoken["x"]) == curr_x:
+                x_count += 1
+            else:
+                x_count = 0
+                curr_x = int(actiontoken["x"])
+            column = column_data.get(actiontoken["x"], ())
+            if x_count < len(column):
+                datanode = column[x_count]
+                datanode["action"] = actiontoken
+                datanode["action"]["command_note"] = actiontoken["command"]["note"]
+                datanode["action"]["command"] = actiontoken["command"]["name"]
+        for token in sorted_tokens:
+            if token["subtype"] == "first":
+                if "second" not in token:
+                    raise RivuletSyntaxError(f"Question marker without a second marker at [{token['x']}, {token['y']}] in glyph {g}")
+        glyph['tokens'] = sorted_tokens
+
+
+    @staticmethod
+    def _lex_glyph_chunk(primes, chunk):
+        """Lex and parse a chunk of (glyph number, glyph) pairs, returning the tokens of each,
+        packed as tuples. Runs in a worker process, so the glyphs it is sent are its own to modify"""
+        parser = Parser()
+        parser.primes = primes
+        tokens = []
+        for g, glyph in chunk:
+            glyph["tokens"] = parser.__lex_glyph(glyph["glyph"])
+            parser.__parse_glyph(g, glyph)
+            tokens.append([pack_token(token) for token in glyph["tokens"]])
+        return tokens
+
+
+    def __lex_glyphs_in_parallel(self, glyphs):
+        "Lex and parse the glyphs across a pool of worker processes, keeping their order"
+        # a few chunks per worker balances the load while keeping pickling to a minimum;
+        # tokens come back as tuples, as pickling records costs more than lexing them
+        chunk_size = math.ceil(len(glyphs) / (self.workers * 4))
+        chunks = [list(enumerate(glyphs))[i:i + chunk_size] for i in range(0, len(glyphs), chunk_size)]
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            results = pool.map(Parser._lex_glyph_chunk, [self.primes] * len(chunks), chunks)
+            for chunk, chunk_tokens in zip(chunks, results):
+                for (_, glyph), tokens in zip(chunk, chunk_tokens):
+                    glyph["tokens"] = [unpack_token(token) for token in tokens]
+
+
+    def __parse_grid(self, program):
+        "Locate, lex and parse the glyphs of a program grid, returning their locations and the glyphs"
+        with self.__phase("locate glyphs"):
+            glyph_locs = self.__locate_glyphs(program)
 
-                # get ref cell (or list) for the question marker
-                ref = [t for t in sorted_tokens if t["y"] == token["y"] and t["x"] < token["x"]]
+        if not glyph_locs:
+            raise RivuletSyntaxError("No glyph found")
 
-                if not ref:
-                    # no data cells have been declared for this list before where the ref points
-                    token["ref_cell"] = [self.primes[token["y"]], 0]
-                else:
-                    # the ref points to somewhere else in the list
-                    token["ref_cell"] = [self.primes[token["y"]], max(t["assign_to_cell"] for t in ref if t["x"] < token["x"] and "assign_to_cell" in t) + 1]
-
-            # Ref markers determine their reference cells
-            # Also do for question marker in case needed
-            for token in [t for t in sorted_tokens if t["subtype"] == "ref"]:
-                ref = [t for t in sorted_tokens if t["y"] == token["end_y"] and t["x"] < token["end_x"]]
-                if not ref:
-                    # no data cells have been declared for this list before where the ref points
-                    token["ref_cell"] = [self.primes[token["end_y"]], 0]
-                else:
-                    # the ref points to somewhere else in the list
-                    token["ref_cell"] = [self.primes[token["end_y"]], max(t["assign_to_cell"] for t in ref if t["x"] < token["end_x"] and "assign_to_cell" in t) + 1]
-
-            # Action strands are added to their respective data strands
-            # The top action strand for an x value goes to the top data strand for that x value
-            curr_x = 0
-            x_count = 0
-            for actiontoken in \
-                [t for t in sorted(glyph["tokens"], \
-                    key=lambda x: (x['x'], x['y'])) \
-                    if t["type"] == "action"]:
-                if int(actiontoken["x"]) == curr_x:
-                    x_count += 1
-                else:
-                    x_count = 0
-                    curr_x = int(actiontoken["x"])
-                for idx, datanode in enumerate([t for t in sorted_tokens \
-                    if t["type"] == "data" and t["x"] == actiontoken["x"]]):
-                    if x_count == idx:
-                        datanode["action"] = actiontoken
-                        datanode["action"]["command_note"] = actiontoken["command"]["note"]
-                        datanode["action"]["command"] = actiontoken["command"]["name"]
-            for token in sorted_tokens:
-                if token["subtype"] == "first":
-                    if "second" not in token:
-                        raise RivuletSyntaxError(f"Question marker without a second marker at [{token['x']}, {token['y']}] in glyph {g}")
-            glyph['tokens'] = sorted_tokens
+        with self.__phase("prepare glyphs"):
+            glyphs = self.__prepare_glyphs_for_lexing(glyph_locs, program)
+
+        # now that we know the size of the largest glyph, we calculate
+        # the primes for the whole program
+        with self.__phase("load primes"):
+            self.__load_primes(glyphs)
+
+        if self.workers > 1 and len(glyphs) >= self.parallel_min_glyphs:
+            # each glyph is lexed and parsed independently of the others
+            with self.__phase("lex and parse glyphs"):
+                self.__lex_glyphs_in_parallel(glyphs)
+        else:
+            with self.__phase("lex glyphs"):
+                for glyph in glyphs:
+                    glyph["tokens"] = self.__lex_glyph(glyph["glyph"])
+
+            # re-arranges and decorates the tokens for each glyph in place
+            with self.__phase("parse glyphs"):
+                self.__parse_glyphs(glyphs)
+
+        for g in glyphs:
+            g["list_size"] = len(g["glyph"])
+
+        if self.timer is not None:
+            self.__count_parsed(glyphs)
+
+        return glyph_locs, glyphs
 
 
     def parse_program(self, program):
         "Parse a Rivulet program and return a list of commands"
 
         # turn into a grid
-        program = [list(ln) for ln in program.splitlines()]
+        with self.__phase("make grid"):
+            program = [list(ln) for ln in program.splitlines()]
 
-        program = self.__remove_blank_lines(program)
-        glyph_locs = self.__locate_glyphs(program)
+        with self.__phase("remove blank lines"):
+            program = self.__remove_blank_lines(program)
+        _, glyphs = self.__parse_grid(program)
 
-        if not glyph_locs:
-            raise RivuletSyntaxError("No glyph found")
+        return glyphs
 
-        glyphs = self.__prepare_glyphs_for_lexing(glyph_locs, program)
 
-        # now that we know the size of the largest glyph, we calculate
-        # the primes for the whole program
-        self.__load_primes(glyphs)
+    def parse_for_edits(self, program) -> ParsedProgram:
+        "Parse a Rivulet program, keeping what reparse_program needs to re-parse it after an edit"
+        lines = program.splitlines()
+        try:
+            glyph_locs, glyphs = self.__parse_grid([list(ln) for ln in lines])
+        except RivuletSyntaxError:
+            # report it as parse_program would, with the blank line it skips taken into account
+            self.parse_program(program)
+            raise
+
+        return ParsedProgram(
+            lines, glyphs,
+            [loc["start"]["y"] for loc in glyph_locs],
+            [loc["end"]["y"] for loc in glyph_locs],
+            self.primes
+        )
 
-        for glyph in glyphs:
-            glyph["tokens"] = self.__lex_glyph(glyph["glyph"])
 
-        # re-arranges and decorates the tokens for each glyph in place
-        self.__parse_glyphs(glyphs)
+    def reparse_program(self, previous:ParsedProgram, program) -> ParsedProgram:
+        "Re-parse a program from an earlier parse of it, redoing only the lines that differ"
+        old = previous.lines
+        new = program.splitlines()
 
-        for g in glyphs:
-            g["list_size"] = len(g["glyph"])
+        first = 0
+        shortest = min(len(old), len(new))
+        while first < shortest and old[first] == new[first]:
+            first += 1
+        if first == len(old) == len(new):
+            return previous
 
-        return glyphs
+        unchanged_after = 0
+        while unchanged_after < shortest - first and old[-1 - unchanged_after] == new[-1 - unchanged_after]:
+            unchanged_after += 1
+
+        return self.reparse_lines(previous, first, len(old) - unchanged_after, new[first:len(new) - unchanged_after])
+
+
+    def reparse_lines(self, previous:ParsedProgram, first, last, new_lines) -> ParsedProgram:
+        """Re-parse after lines first up to (not including) last of the previous parse are replaced by new_lines
+
+        Only glyphs that overlap the changed lines, or the lines either side of them (whose
+        markers may have become connected or disconnected), are located, lexed and parsed
+        again; every other glyph is reused from the previous parse. Glyphs are matched to
+        Ends from the top down and never cross the rows of another glyph, so when no Start
+        or End is left unmatched inside this window, the rest of the program is unaffected.
+        Otherwise (and for any syntax error) the whole program is parsed, to give the same
+        result and errors as parse_program would.
+        """
+        new_lines = list(new_lines)
+        lines = previous.lines[:first] + new_lines + previous.lines[last:]
+        shift = len(new_lines) - (last - first)
+
+        # the window of rows to redo (in previous' rows), widened until no glyph crosses its edges
+        top = max(first - 1, 0)
+        bottom = min(last + 1, len(previous.lines))
+        tallest = max(previous.sizes) if previous.sizes else 0
+        while True:
+            lo = bisect_left(previous.tops, top - tallest)
+            hi = bisect_left(previous.tops, bottom)
+            overlapping = [g for g in range(lo, hi) if previous.bottoms[g] >= top]
+            new_top = min([top] + [previous.tops[g] for g in overlapping])
+            new_bottom = max([bottom] + [previous.bottoms[g] + 1 for g in overlapping])
+            if (new_top, new_bottom) == (top, bottom):
+                break
+            top, bottom = new_top, new_bottom
+
+        # every glyph starting in the window is redone, those before and after it are kept
+        lo = bisect_left(previous.tops, top)
+        hi = bisect_left(previous.tops, bottom)
+        bottom += shift
+
+        try:
+            # include the rows either side of the window, for its markers' neighbors
+            base = max(top - 1, 0)
+            grid = [list(ln) for ln in lines[base:bottom + 1]]
+            glyph_locs = self.__locate_glyphs(grid, top - base, bottom - base)
+            if not glyph_locs and lo == 0 and hi == len(previous.glyphs):
+                raise RivuletSyntaxError("No glyph found")
+            glyphs = self.__prepare_glyphs_for_lexing(glyph_locs, grid)
+
+            sizes = previous.sizes.copy()
+            sizes.subtract(previous.sizes_of(range(lo, hi)))
+            sizes.update(glyph_size(glyph) for glyph in glyphs)
+            sizes = +sizes
+
+            # the primes only change when the largest glyph does
+            if len(previous.primes) == max(sizes):
+                self.primes = previous.primes
+            else:
+                self.primes = list_ids(max(sizes))
+
+            for g, glyph in enumerate(glyphs, start=lo):
+                glyph["tokens"] = self.__lex_glyph(glyph["glyph"])
+                self.__parse_glyph(g, glyph)
+                glyph["list_size"] = len(glyph["glyph"])
+        except RivuletSyntaxError:
+            return self.parse_for_edits("\n".join(lines))
+
+        return ParsedProgram(
+            lines,
+            previous.glyphs[:lo] + glyphs + previous.glyphs[hi:],
+            previous.tops[:lo] + [base + loc["start"]["y"] for loc in glyph_locs] + [t + shift for t in previous.tops[hi:]],
+            previous.bottoms[:lo] + [base + loc["end"]["y"] for loc in glyph_locs] + [b + shift for b in previous.bottoms[hi:]],
+            self.primes,
+            sizes
+        )
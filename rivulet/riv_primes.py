@@ -0,0 +1,54 @@
+"Prime numbers for list ids and strand values, from a segmented sieve shared by the whole process"
+from itertools import compress
+
+
+class PrimeTable:
+    """Primes in increasing order, sieved one segment at a time as more are asked for
+
+    Each segment is at most as large as everything sieved so far (and never more
+    than SEGMENT_SIZE), so the primes already found always reach past its square
+    root and are all that is needed to mark it off.
+    """
+
+    SEGMENT_SIZE = 1 << 18
+
+    def __init__(self):
+        self.primes = [2, 3, 5, 7]
+        self.limit = 10     # every prime below this has been found
+
+    def __extend(self):
+        low = self.limit
+        high = low + min(low, self.SEGMENT_SIZE)
+        segment = bytearray([1]) * (high - low)
+        for p in self.primes:
+            if p * p >= high:
+                break
+            first = max(p * p, (low + p - 1) // p * p)
+            segment[first - low::p] = bytes(len(range(first - low, high - low, p)))
+        self.primes.extend(compress(range(low, high), segment))
+        self.limit = high
+
+    def first(self, count):
+        "The first count primes"
+        while len(self.primes) < count:
+            self.__extend()
+        return self.primes[:count]
+
+
+_TABLE = PrimeTable()
+
+
+def first_primes(count):
+    "The first count primes, 2, 3, 5..."
+    return _TABLE.first(count)
+
+
+def list_ids(count):
+    """Ids for count lists: 1 followed by the first count-1 primes
+
+    The same sequence numbers the rows of a glyph (row n is list_ids[n])
+    and weighs each step of a strand.
+    """
+    if count < 1:
+        return []
+    return [1] + _TABLE.first(count - 1)
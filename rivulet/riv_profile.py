@@ -0,0 +1,139 @@
+"""A profile of the glyphs a program runs: how often, for how long, and what they set off
+
+GlyphProfiler is a trace sink (see riv_trace), so it costs nothing unless it is
+set: the interpreter makes no events for it otherwise. It times each glyph run
+as the time since the event before it, so a glyph's time includes whatever
+the interpreter did to get to it (taking a savepoint as its block starts, say).
+
+Each glyph is placed in the blocks around it, each named by its first glyph,
+as a stack: block 0;block 3;glyph 5. A glyph's self time is the time in it; its
+cumulative time is the time in the outermost block it is the first glyph of,
+or just its self time if it starts none. The stacks and their self times can
+be written in the folded format flamegraph tools read.
+"""
+import sys
+import time
+
+from rivulet.riv_trace import NullTrace, TraceSink
+
+
+class GlyphProfile:
+    "What the runs of one glyph took and set off"
+    __slots__ = ("glyph", "level", "runs", "tokens", "seconds", "rollbacks", "repeats", "copied")
+
+    def __init__(self, glyph, level):
+        self.glyph = glyph
+        self.level = level
+        self.runs = 0
+        self.tokens = 0         # token runs
+        self.seconds = 0.0      # self time
+        self.rollbacks = 0      # rollbacks its question marker set off
+        self.repeats = 0        # repeats its question marker set off
+        self.copied = 0         # bytes copied into snapshots after it ran (snapshot rollback only)
+
+
+class GlyphProfiler(TraceSink):
+    """Profiles each glyph run, passing the events on to another sink
+
+    sink: the sink to pass events on to (none by default)
+    """
+
+    def __init__(self, sink:TraceSink=None):
+        self.sink = sink or NullTrace()
+        self.profiles = {}  # GlyphProfile by glyph id
+        self.stacks = {}    # the ids of the blocks around each glyph, outermost first, by glyph id
+        self.rollback = None
+        self.__last = None  # profile of the glyph last run
+        self.__time = 0.0
+        self.__copied = 0
+
+    def start(self, parse_tree, rollback=None):
+        """A program is about to run: its profile starts afresh
+
+        parse_tree: its glyphs, nested in blocks
+        rollback: the rollback strategy in use, to read the bytes it copies from
+        """
+        self.profiles = {}
+        self.stacks = {}
+        blocks = [(parse_tree, ())]
+        while blocks:
+            block, outer = blocks.pop()
+            first = block[0] if block else None
+            while isinstance(first, list):
+                first = first[0]
+            stack = outer + (first.id,) if first is not None else outer
+            for g in block:
+                if isinstance(g, list):
+                    blocks.append((g, stack))
+                else:
+                    self.stacks[g.id] = stack
+                    self.profiles[g.id] = GlyphProfile(g.id, g.level)
+        self.rollback = rollback
+        self.__last = None
+        self.__copied = rollback.copied if rollback is not None else 0
+        self.__time = time.perf_counter()
+
+    def glyph(self, event):
+        now = time.perf_counter()
+        self.__settle()
+        profile = self.profiles[event.glyph.id]
+        profile.runs += 1
+        profile.tokens += len(event.glyph.tokens)
+        profile.seconds += now - self.__time
+        if event.outcome.name == "rollback":
+            profile.rollbacks += 1
+        elif event.outcome.name == "repeat":
+            profile.repeats += 1
+        self.__last = profile
+        if self.sink.enabled:
+            self.sink.glyph(event)
+        # the time to pass the event on is not the next glyph's
+        self.__time = time.perf_counter()
+
+    def __settle(self):
+        "Put the bytes copied since the last glyph ran down to it"
+        if self.rollback is None:
+            return
+        copied = self.rollback.copied
+        if self.__last is not None:
+            self.__last.copied += copied - self.__copied
+        self.__copied = copied
+
+    def flush(self):
+        self.__settle()
+        self.sink.flush()
+
+    def close(self):
+        self.sink.close()
+
+    def cumulative(self) -> dict:
+        "Cumulative seconds, by glyph id"
+        totals = dict((glyph, profile.seconds) for glyph, profile in self.profiles.items())
+        starts = set(block for stack in self.stacks.values() for block in stack)
+        for glyph in starts:
+            totals[glyph] = 0.0
+        for glyph, stack in self.stacks.items():
+            # the time counts once to each glyph starting a block around it
+            for block in set(stack):
+                totals[block] += self.profiles[glyph].seconds
+        return totals
+
+    def report(self, stream=None, limit=None):
+        "Write a table of the glyphs, most self time first"
+        stream = stream or sys.stdout
+        cumulative = self.cumulative()
+        profiles = sorted(self.profiles.values(), key=lambda p: p.seconds, reverse=True)
+        stream.write(f"{'glyph':>6}{'level':>6}{'runs':>9}{'tokens':>10}{'self ms':>11}{'cum ms':>11}"
+                     f"{'rollbacks':>10}{'repeats':>9}{'copied':>12}\n")
+        for p in profiles[:limit]:
+            stream.write(f"{p.glyph:>6}{p.level:>6}{p.runs:>9}{p.tokens:>10}{p.seconds * 1e3:>11.3f}"
+                         f"{cumulative[p.glyph] * 1e3:>11.3f}{p.rollbacks:>10}{p.repeats:>9}{p.copied:>12}\n")
+
+    def folded(self) -> list:
+        "Lines of folded stacks, 'block 0;block 3;glyph 5 <self microseconds>', of each glyph run, for flamegraph tools"
+        lines = []
+        for glyph, stack in sorted(self.stacks.items()):
+            if self.profiles[glyph].runs:
+                frames = [f"block {block}" for block in stack] + [f"glyph {glyph}"]
+                lines.append(f"{';'.join(frames)} {round(self.profiles[glyph].seconds * 1e6)}")
+        return lines
@@ -0,0 +1,444 @@
+"""Translates a parsed program into executable Python, compiled once and cached as a module
+
+Each block becomes a Python function. Its glyphs' tokens become straight-line
+statements on the state's lists, bound to local names, and its question markers
+become native control flow: a rollback undoes the changes recorded in a journal
+since the block's pass started, and returns; a while block repeating from its
+last glyph is a Python while loop. Any token that doesn't fit one of the forms
+here runs through the interpreter's tree-walker, exactly as in the compiled engine.
+
+The generated function is run(state, glyphs, reference, after), where state
+holds the lists in the slots given to the generator (see riv_state),
+reference(token, state) is the tree-walker's step and, if traced, after(glyph id,
+Action) is called as each glyph finishes. If vector, list and list to list
+commands go through riv_vector's new_values first. If max_bits is set,
+multiplication and exponent commands check the size of the integers they
+make (see riv_limits), cell by cell.
+"""
+import hashlib
+import types
+from collections import OrderedDict
+from functools import cache
+from pathlib import Path
+
+from rivulet.riv_tokens import Command, Subtype, TokenType
+
+# (value in the cell, value applied to it) -> expression for the cell's new value
+EXPRESSIONS = {
+    Command.addition_assignment: "{a} + {b}",
+    Command.subtraction_assignment: "{a} - {b}",
+    Command.reverse_subtraction_assignment: "{b} - {a}",
+    Command.overwrite: "{b}",
+    Command.multiplication_assignment: "{a} * {b}",
+    Command.division_assignment: "{a} / {b}",
+    Command.reverse_division_assignment: "{b} / {a}",
+    Command.mod_assignment: "{a} % {b}",
+    Command.reverse_mod_assignment: "{b} % {a}",
+    Command.exponent_assignment: "{a} ** {b}",
+    Command.root_assignment: "{a} ** (1 / {b})",
+}
+
+
+# commands checking the size of the integers they make, if max_bits is set
+BOUNDED = {
+    Command.multiplication_assignment: "_product({a}, {b}, {max_bits})",
+    Command.exponent_assignment: "_power({a}, {b}, {max_bits})",
+}
+
+
+def _expression(command, a, b, max_bits=None):
+    "The new value of a cell: commands without an expression leave None in it"
+    if max_bits is not None and command in BOUNDED:
+        return BOUNDED[command].format(a=a, b=b, max_bits=max_bits)
+    return EXPRESSIONS.get(command, "None").format(a=a, b=b)
+
+
+class PythonBackend:
+    """Generates, compiles and caches the Python for programs
+
+    Modules are kept in memory, shared by every backend in the process, keyed by
+    the program's hash (or, without one, the hash of the generated source). That
+    only helps a process that runs programs again, as a library embedding the
+    interpreter might. Given a ParseCache as its cache (the interpreter gives it
+    one when its cache_code is set), the backend also keeps the compiled code of
+    programs with a hash on disk, for runs in new processes (each riv command,
+    say) to load rather than generate and compile again.
+    """
+
+    MAX_MODULES = 64
+    modules = OrderedDict()
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.cache = None   # ParseCache to keep compiled code in, on disk
+
+
+    def load(self, parse_tree, lists, traced=False, key=None, vector=False, max_bits=None):
+        """The run function for a program's block tree, compiled if it isn't cached
+
+        lists: the slot of each list in the state, by id, or just the ids of a
+        state indexed by list id
+        """
+        lists = _slots(lists)
+        code_key = None
+        if key is not None:
+            key = (key, tuple(lists.items()), traced, vector, max_bits)
+            module = self.modules.get(key)
+            if module is not None:
+                self.hits += 1
+                self.modules.move_to_end(key)
+                return module.run
+            if self.cache is not None:
+                code_key = self.cache.code_key(key, _backend_digest())
+                code = self.cache.load_code(code_key)
+                if code is not None:
+                    self.hits += 1
+                    return self.__module(key, code).run
+        source = self.source(parse_tree, lists, traced, vector, max_bits)
+        if key is None:
+            key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+            module = self.modules.get(key)
+            if module is not None:
+                self.hits += 1
+                self.modules.move_to_end(key)
+                return module.run
+        self.misses += 1
+        code = compile(source, _FILE, "exec")
+        if code_key is not None:
+            self.cache.store_code(code_key, code)
+        return self.__module(key, code).run
+
+
+    def __module(self, key, code):
+        "A module running code, cached in memory under key"
+        module = types.ModuleType("rivulet_program")
+        module.__file__ = _FILE
+        exec(code, module.__dict__) # pylint: disable=exec-used
+        self.modules[key] = module
+        while len(self.modules) > self.MAX_MODULES:
+            self.modules.popitem(last=False)
+        return module
+
+
+    def source(self, parse_tree, lists, traced=False, vector=False, max_bits=None) -> str:
+        "Python source for a block tree, with the glyph ids set by the interpreter (lists as for load)"
+        return _Generator(_slots(lists), traced, vector, max_bits).program(parse_tree)
+
+
+_FILE = "<rivulet program>"
+
+
+@cache
+def _backend_digest() -> str:
+    "Hash of this module, which decides the Python a program is compiled to"
+    return hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+
+
+def _slots(lists) -> dict:
+    "The slot of each list, by id"
+    return dict(lists) if isinstance(lists, dict) else dict((list_id, list_id) for list_id in lists)
+
+
+# undo records in the generated code's journal: (op, list, ...)
+_SET = 0        # (op, list, index, old value)
+_APPEND = 1     # (op, list)
+_INSERT = 2     # (op, list, index)
+_POP = 3        # (op, list, index, value popped)
+_EXTEND = 4     # (op, list, length before)
+_REPLACE = 5    # (op, list, copy of the whole list)
+
+
+def undo(journal, savepoint):
+    "Undo the changes recorded in journal since savepoint, latest first"
+    while len(journal) > savepoint:
+        record = journal.pop()
+        op, values = record[0], record[1]
+        if op == _SET:
+            values[record[2]] = record[3]
+        elif op == _APPEND:
+            values.pop()
+        elif op == _INSERT:
+            del values[record[2]]
+        elif op == _POP:
+            values.insert(record[2], record[3])
+        elif op == _EXTEND:
+            del values[record[2]:]
+        else:
+            values[:] = record[2]
+
+
+class _Generator:
+    """Writes the Python for one program
+
+    A block that can roll back takes a savepoint, the length of the journal, as
+    each pass starts. Changes made in it, or in any block inside it, are recorded
+    in the journal as they are made, so a rollback undoes just those. Code that no
+    block can roll back records nothing, and the journal is emptied whenever the
+    outermost pass that could need it ends.
+
+    A block whose while question repeats it from a glyph that isn't its last runs
+    the block again and then carries on after that glyph. Such a block is one loop
+    over its passes, with a stack of the passes waiting to carry on, rather than a
+    recursive call, so a long loop of that shape doesn't exhaust Python's stack.
+    """
+
+    def __init__(self, slots, traced, vector, max_bits=None):
+        self.slots = slots
+        self.traced = traced
+        self.vector = vector
+        self.max_bits = max_bits
+        self.lines = []
+        self.blocks = {}    # id of each block (the Python list) -> its function's name
+
+    def program(self, parse_tree) -> str:
+        self.lines = [
+            "from rivulet.riv_compiler import Action",
+            "from rivulet.riv_limits import bounded_power as _power, bounded_product as _product",
+            "from rivulet.riv_python_backend import undo as _undo",
+            "from rivulet.riv_tokens import Command",
+            "from rivulet.riv_vector import new_values as _new_values",
+            "_ROLLBACK, _CONT, _REPEAT = Action.rollback, Action.cont, Action.repeat",
+            "",
+            "def run(_state, _glyphs, _reference, _after):",
+            "    _journal = []",
+        ]
+        for list_id in sorted(self.slots):
+            self.lines.append(f"    L{list_id} = _state[{self.slots[list_id]}]")
+        self.__block(parse_tree, 1, False)
+        self.lines.append(f"    {self.blocks[id(parse_tree)]}()")
+        self.lines.append("")
+        return "\n".join(self.lines)
+
+    def __emit(self, depth, line):
+        self.lines.append("    " * depth + line)
+
+    def __block(self, block, depth, journaled):
+        """A function for the block, after the functions for the blocks nested in it
+
+        journaled: whether a block around this one can roll back
+        """
+        name = f"_block{len(self.blocks)}"
+        self.blocks[id(block)] = name
+        can_roll_back = any(self.__questions(g) for g in block if not isinstance(g, list))
+        outermost = can_roll_back and not journaled
+        journaled = journaled or can_roll_back
+        for g in block:
+            if isinstance(g, list):
+                self.__block(g, depth, journaled)
+
+        # the glyphs a while question can repeat the block from, other than the last
+        repeats = [idx for idx, g in enumerate(block[:-1]) if not isinstance(g, list) and self.__repeats(g)]
+        loops = bool(block) and not isinstance(block[-1], list) and self.__repeats(block[-1])
+        self.__emit(depth, f"def {name}():")
+        if repeats:
+            self.__resumable_block(block, depth + 1, journaled, outermost, repeats)
+            return
+
+        inner = depth + 1
+        if loops:
+            self.__emit(inner, "while True:")
+            inner += 1
+        if can_roll_back:
+            self.__emit(inner, "_savepoint = len(_journal)")
+        ends = (["_journal.clear()"] if outermost else []) + ["return"]
+        for idx, g in enumerate(block):
+            if isinstance(g, list):
+                self.__emit(inner, f"{self.blocks[id(g)]}()")
+                continue
+            # from the last glyph, the block's loop starts it again
+            repeat = (["_journal.clear()"] if outermost else []) + ["continue"]
+            self.__glyph(g, inner, journaled, ["_undo(_journal, _savepoint)"] + ends, repeat)
+        for line in ends:
+            self.__emit(inner, line)
+
+    def __resumable_block(self, block, depth, journaled, outermost, repeats):
+        "A block repeated from some glyph before its last: one loop over its passes"
+        self.__emit(depth, "_pending = []    # passes to carry on with: (where, savepoint)")
+        self.__emit(depth, "_resume = 0      # where the pass carries on from, or -1 once it ends")
+        self.__emit(depth, "while True:")
+        inner = depth + 1
+        self.__emit(inner, "if _resume < 0:")
+        self.__emit(inner + 1, "if not _pending:")
+        if outermost:
+            self.__emit(inner + 2, "_journal.clear()")
+        self.__emit(inner + 2, "return")
+        self.__emit(inner + 1, "_resume, _savepoint = _pending.pop()")
+        self.__emit(inner, "else:")
+        self.__emit(inner + 1, "_savepoint = len(_journal)")
+
+        rollback = ["_undo(_journal, _savepoint)", "_resume = -1", "continue"]
+        # from the last glyph, the block starts again with no pass of its own to carry on
+        restart = (["if not _pending: _journal.clear()"] if outermost else []) + ["_resume = 0", "continue"]
+        segment = 0
+        self.__emit(inner, "if _resume <= 0:")
+        for idx, g in enumerate(block):
+            if isinstance(g, list):
+                self.__emit(inner + 1, f"{self.blocks[id(g)]}()")
+                continue
+            if idx in repeats:
+                # run the block again, then carry on after this glyph
+                repeat = [f"_pending.append(({segment + 1}, _savepoint))", "_resume = 0", "continue"]
+            else:
+                repeat = restart
+            self.__glyph(g, inner + 1, journaled, rollback, repeat)
+            if idx in repeats:
+                segment += 1
+                self.__emit(inner, f"if _resume <= {segment}:")
+        self.__emit(inner, "_resume = -1")
+
+    def __glyph(self, glyph, depth, journaled, rollback, repeat):
+        "A glyph's tokens, then what to do (rollback, repeat: lines of code) if it rolls back or repeats"
+        self.__emit(depth, f"# glyph {glyph.id}")
+        questions = self.__questions(glyph)
+        if questions:
+            self.__emit(depth, "_outcome = _CONT")
+        for idx, token in enumerate(glyph.tokens):
+            lines = self.__token(token, journaled)
+            if lines is None:
+                call = f"_reference(_glyphs[{glyph.id}].tokens[{idx}], _state)"
+                if token.type == TokenType.question_marker:
+                    lines = [f"_outcome = {call}"]
+                else:
+                    lines = self.__replacing(journaled, *self.__lists_of(token)) + [call]
+            for line in lines:
+                self.__emit(depth, line)
+        if self.traced:
+            self.__emit(depth, f"_after({glyph.id}, {'_outcome' if questions else '_CONT'})")
+        if questions:
+            self.__emit(depth, "if _outcome is _ROLLBACK:")
+            for line in rollback:
+                self.__emit(depth + 1, line)
+            if self.__repeats(glyph):
+                self.__emit(depth, "if _outcome is _REPEAT:")
+                for line in repeat:
+                    self.__emit(depth + 1, line)
+
+    def __questions(self, glyph):
+        return [t for t in glyph.tokens if t.type == TokenType.question_marker]
+
+    def __repeats(self, glyph):
+        return any(t.get("block_type") == "while" for t in self.__questions(glyph))
+
+    def __lists_of(self, token):
+        "Names of the bound lists a token might change"
+        lists = [token.get("list")]
+        if "ref_cell" in token:
+            lists.append(token.ref_cell[0])
+        return sorted(set(f"L{l}" for l in lists if self.__bound(l)))
+
+    def __replacing(self, journaled, *targets):
+        "Records for lists about to change as a whole"
+        if not journaled:
+            return []
+        return [f"_journal.append(({_REPLACE}, {t}, {t}[:]))" for t in targets]
+
+    def __bound(self, list_id):
+        return list_id in self.slots
+
+    def __token(self, token, journaled):
+        """Statements for a token, or None if the tree-walker should run it
+
+        journaled: whether to record how to undo its changes
+        """
+        if token.type == TokenType.question_marker:
+            return self.__question(token)
+
+        action = token.get("action")
+        if action is not None and "command" not in action:
+            return None
+        if not self.__bound(token.get("list")):
+            return None
+        if token.subtype == Subtype.ref and not self.__bound(token.ref_cell[0]):
+            return None
+        command = action.command if action is not None else None
+        target = f"L{token.list}"
+        cell = token.assign_to_cell
+        pad = [f"if len({target}) == {cell}: {target}.append(0)" + self.__record(journaled, f"({_APPEND}, {target})")]
+        setting = [f"_journal.append(({_SET}, {target}, {cell}, {target}[{cell}]))"] if journaled else []
+
+        if action is not None and action.get("subtype") == Subtype.list2list:
+            if token.subtype != Subtype.ref:
+                return None
+            source = f"L{token.ref_cell[0]}"
+            if command == Command.pop_and_append:
+                return [
+                    "_v = 0",
+                    f"if {source}: _v = {source}.pop()" + self.__record(journaled, f"({_POP}, {source}, len({source}), _v)"),
+                    f"{target}.append(_v)" + self.__record(journaled, f"({_APPEND}, {target})"),
+                ]
+            # append zeroes to create space for the new values; the tree-walker reads
+            # a source cell for every target cell, so a shorter source is an error
+            return (pad if command != Command.append else []) + self.__replacing(journaled, target) + [
+                f"{target}.extend([0] * (len({source}) - len({target})))",
+                f"if len({target}) > len({source}): raise IndexError('list index out of range')",
+            ] + self.__each_cell(command, target, source,
+                f"[{_expression(command, '_x', '_y', self.max_bits)} for _x, _y in zip({target}, {source})]")
+
+        if token.subtype == Subtype.value:
+            value = token.value
+            source = f"({value!r})" if isinstance(value, (int, float)) and value < 0 else repr(value)
+        elif token.subtype == Subtype.ref:
+            ref_list, ref_idx = token.ref_cell
+            # a cell not yet populated reads as zero
+            source = f"(L{ref_list}[{ref_idx}] if {ref_idx} < len(L{ref_list}) else 0)"
+        else:
+            source = "None"
+        if command not in (Command.pop_and_append, Command.append):
+            lines = pad
+        else:
+            lines = []
+
+        if action is None:
+            # defaults to add_assign
+            return lines + setting + [f"{target}[{cell}] += {source}"]
+        if command == Command.insert:
+            return lines + [f"{target}.insert({cell}, {source})"
+                            + self.__record(journaled, f"({_INSERT}, {target}, min({cell}, len({target}) - 1))")]
+        if command == Command.append:
+            return lines + [f"{target}.append({source})" + self.__record(journaled, f"({_APPEND}, {target})")]
+        if command == Command.pop:
+            lines = lines + setting + [f"{target}[{cell}] += {source}"]
+            if token.subtype == Subtype.ref:
+                lines.append(f"_v = L{ref_list}.pop({ref_idx})"
+                             + self.__record(journaled, f"({_POP}, L{ref_list}, {ref_idx}, _v)"))
+            return lines
+        if command == Command.pop_and_append:
+            if "ref_cell" not in token or not self.__bound(token.ref_cell[0]):
+                return None
+            ref_list, ref_idx = token.ref_cell
+            return lines + [
+                f"_v = L{ref_list}.pop({ref_idx})" + self.__record(journaled, f"({_POP}, L{ref_list}, {ref_idx}, _v)"),
+                f"{target}.append(_v)" + self.__record(journaled, f"({_APPEND}, {target})"),
+            ]
+        if action.get("subtype") == Subtype.list:
+            return lines + [f"_value = {source}"] + self.__replacing(journaled, target) + self.__each_cell(
+                command, target, "_value", f"[{_expression(command, '_x', '_value', self.max_bits)} for _x in {target}]")
+        return lines + setting + [f"{target}[{cell}] = {_expression(command, f'{target}[{cell}]', source, self.max_bits)}"]
+
+    def __record(self, journaled, record):
+        "Code to follow a statement, recording how to undo its change if journaled"
+        return f"; _journal.append({record})" if journaled else ""
+
+    def __each_cell(self, command, target, assign, values):
+        "Statements giving each cell of target its new values, through new_values if vector"
+        if not self.vector or not isinstance(command, Command) or (self.max_bits is not None and command in BOUNDED):
+            return [f"{target}[:] = {values}"]
+        return [
+            f"_values = _new_values(Command.{command.name}, {target}, {assign})",
+            f"{target}[:] = {values} if _values is None else _values"
+        ]
+
+    def __question(self, token):
+        "A question marker: whether its cell (or list) holds positive values decides what follows"
+        passed = "_REPEAT" if token.get("block_type") == "while" else "_CONT"
+        applies_to = token.get("applies_to")
+        if applies_to == "cell" and "ref_cell" in token and self.__bound(token.ref_cell[0]):
+            ref_list, ref_idx = token.ref_cell
+            test = f"len(L{ref_list}) > {ref_idx} and L{ref_list}[{ref_idx}] > 0"
+        elif applies_to == "list" and self.__bound(token.get("ref_list")):
+            values = f"L{token.ref_list}"
+            test = f"any(_v != 0 for _v in {values}) and not any(_v < 0 for _v in {values})"
+        else:
+            return None
+        return [f"_outcome = {passed} if {test} else _ROLLBACK"]
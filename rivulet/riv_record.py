@@ -0,0 +1,443 @@
+"""Compact recordings of a run, and the state at any step of one, replayed from them
+
+A Recorder set as an Interpreter's recorder writes a record for each glyph run:
+the glyph, what its question marker chose (see Action) and the changes it made
+to the state, as the journal reports them (see JournalRollback.changes), so a
+run can only be recorded with the journal rollback, under an engine that keeps
+one (compiled or tree). A change takes a few bytes: its kind, list id, cell and
+new value (the old value is not needed to go forward). The changes a rollback
+makes, undoing its block, are recorded with the glyph run after it, or at the
+end of the run.
+
+The whole state is written every so often too, as a keyframe: once the records
+since the last keyframe take up spacing times its size (and at least min_gap
+bytes), so keyframes are at most about 1/spacing of a recording, which grows
+with the changes a run makes rather than with the size of its state. An index
+of the keyframes ends the file.
+
+A Replay reads a recording back. The state after any number of glyph runs is
+the keyframe at or before it with the changes since applied: nothing is run
+again. A recording cut short (by a crash, say) has no index; it is found by
+reading the file through instead, up to the last record it has whole.
+
+Numbers are written as varints. A value is a zigzag varint shifted left one bit
+if it is an int; otherwise the varint 1 followed by a float, 3 followed by a
+complex number, as little-endian doubles, or 5 for None (the cell a list to
+list append leaves).
+"""
+import struct
+import sys
+from argparse import ArgumentParser
+from bisect import bisect_right
+
+from rivulet.riv_compiler import Action
+
+MAGIC = b"RIVREC\x01\n"
+END_MAGIC = b"RIVEND\x01\n"
+
+# records
+_STEP = 0       # glyph, outcome, changes
+_KEYFRAME = 1   # glyph runs before it, then each list that is not empty: id, length, values
+_END = 2        # the changes made after the last glyph ran
+_INDEX = 3      # number of keyframes, then the glyph runs before each and its offset
+
+# changes, each followed by its list id and then
+_SET = 0        # cell, new value
+_INSERT = 1     # cell, new value (appends too)
+_POP = 2        # cell
+_EXTEND = 3     # cell, count, values
+_TRUNCATE = 4   # cell
+_REPLACE = 5    # count, values
+
+_KINDS = {"set": _SET, "append": _INSERT, "insert": _INSERT, "pop": _POP, "extend": _EXTEND,
+          "truncate": _TRUNCATE, "replace": _REPLACE}
+
+_FLOAT = struct.Struct("<d")
+_COMPLEX = struct.Struct("<dd")
+_TRAILER = struct.Struct("<Q")
+
+
+def write_varint(out:bytearray, n):
+    "Append a varint of a non-negative integer"
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def read_varint(data, pos):
+    "The varint at pos, and the position after it"
+    n = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def write_value(out:bytearray, value):
+    "Append a value of a list: an int, float, complex number or None"
+    if isinstance(value, int):
+        write_varint(out, ((value << 1) if value >= 0 else ((-value << 1) - 1)) << 1)
+    elif isinstance(value, float):
+        out.append(1)
+        out += _FLOAT.pack(value)
+    elif value is None:
+        out.append(5)
+    else:
+        out.append(3)
+        out += _COMPLEX.pack(value.real, value.imag)
+
+
+def read_value(data, pos):
+    "The value at pos, and the position after it"
+    head, pos = read_varint(data, pos)
+    if not head & 1:
+        zigzag = head >> 1
+        return (zigzag >> 1) if not zigzag & 1 else -((zigzag + 1) >> 1), pos
+    if head == 1:
+        return _FLOAT.unpack_from(data, pos)[0], pos + _FLOAT.size
+    if head == 5:
+        return None, pos
+    real, imag = _COMPLEX.unpack_from(data, pos)
+    return complex(real, imag), pos + _COMPLEX.size
+
+
+class Recorder:
+    """Records a run to a file, or an open binary stream (see the module docstring)
+
+    spacing: keyframes take up at most about 1/spacing of the recording
+    min_gap: bytes of records between keyframes, at the least
+
+    A Recorder records one run.
+    """
+
+    def __init__(self, file, spacing=8, min_gap=1 << 16):
+        if hasattr(file, "write"):
+            self.file = file
+            self.owned = False
+        else:
+            self.file = open(file, "wb") # pylint: disable=consider-using-with
+            self.owned = True
+        self.spacing = spacing
+        self.min_gap = min_gap
+        self.runs = 0           # glyph runs recorded
+        self.keyframes = []     # (glyph runs before it, offset) of each keyframe
+        self.__out = bytearray()
+        self.__written = 0      # bytes written to the file
+        self.__gap = 0          # bytes of records the next keyframe waits for
+
+    def start(self, state):
+        "A run is about to start from state (a State): write the header and a first keyframe"
+        out = self.__out
+        out += MAGIC
+        write_varint(out, len(state.ids))
+        for list_id in state.ids:
+            write_varint(out, list_id)
+        self.__keyframe(state)
+
+    def glyph(self, glyph_id, outcome:Action, changes, state):
+        "A glyph has run, choosing outcome, and made changes (ChangeRecords) to state"
+        out = self.__out
+        start = len(out)
+        out.append(_STEP)
+        write_varint(out, glyph_id)
+        out.append(outcome.value)
+        self.__changes(changes)
+        self.runs += 1
+        self.__gap -= len(out) - start
+        if self.__gap <= 0:
+            self.__keyframe(state)
+        if len(out) >= 1 << 16:
+            self.flush()
+
+    def finish(self, changes):
+        "The run has ended, with changes made since the last glyph ran: write them and the index"
+        out = self.__out
+        out.append(_END)
+        self.__changes(changes)
+        index = self.__written + len(out)
+        out.append(_INDEX)
+        write_varint(out, len(self.keyframes))
+        for runs, offset in self.keyframes:
+            write_varint(out, runs)
+            write_varint(out, offset)
+        out += _TRAILER.pack(index)
+        out += END_MAGIC
+        self.flush()
+
+    def __changes(self, changes):
+        out = self.__out
+        write_varint(out, len(changes))
+        for change in changes:
+            kind = _KINDS[change.kind]
+            out.append(kind)
+            write_varint(out, change.list_id)
+            if kind == _REPLACE:
+                write_varint(out, len(change.new))
+                for value in change.new:
+                    write_value(out, value)
+                continue
+            write_varint(out, change.index)
+            if kind == _SET or kind == _INSERT:
+                write_value(out, change.new)
+            elif kind == _EXTEND:
+                write_varint(out, len(change.new))
+                for value in change.new:
+                    write_value(out, value)
+
+    def __keyframe(self, state):
+        "Write the whole state, and work out how many bytes of records to wait for before the next"
+        out = self.__out
+        start = len(out)
+        self.keyframes.append((self.runs, self.__written + start))
+        out.append(_KEYFRAME)
+        write_varint(out, self.runs)
+        lists = [(list_id, values) for list_id, values in state.view().items() if values]
+        write_varint(out, len(lists))
+        for list_id, values in lists:
+            write_varint(out, list_id)
+            write_varint(out, len(values))
+            for value in values:
+                write_value(out, value)
+        self.__gap = max(self.min_gap, self.spacing * (len(out) - start))
+
+    def flush(self):
+        "Write out the records held back"
+        self.file.write(self.__out)
+        self.__written += len(self.__out)
+        self.__out = bytearray()
+        self.file.flush()
+
+    def close(self):
+        "Flush, and close the file if the recorder opened it"
+        self.flush()
+        if self.owned:
+            self.file.close()
+
+
+class Replay:
+    """A recording, read back
+
+    ids: the id of every list in the state
+    keyframes: (glyph runs before it, offset) of each keyframe
+    complete: whether the run was recorded to its end
+    """
+
+    def __init__(self, file):
+        if hasattr(file, "read"):
+            self.data = file.read()
+        else:
+            with open(file, "rb") as stream:
+                self.data = stream.read()
+        data = self.data
+        if not data.startswith(MAGIC):
+            raise ValueError("not a Rivulet recording")
+        try:
+            count, pos = read_varint(data, len(MAGIC))
+            self.ids = []
+            for _ in range(count):
+                list_id, pos = read_varint(data, pos)
+                self.ids.append(list_id)
+        except IndexError:
+            raise ValueError("the recording was cut short in its header") from None
+        self.__first = pos
+        self.complete = data.endswith(END_MAGIC)
+        if self.complete:
+            self.__index = _TRAILER.unpack_from(data, len(data) - len(END_MAGIC) - _TRAILER.size)[0]
+            count, pos = read_varint(data, self.__index + 1)
+            self.keyframes = []
+            for _ in range(count):
+                runs, pos = read_varint(data, pos)
+                offset, pos = read_varint(data, pos)
+                self.keyframes.append((runs, offset))
+            self.runs = self.__count_runs()
+        else:
+            self.__index = len(data)
+            self.keyframes = []
+            self.runs = 0
+            for kind, pos, runs in self.__records(self.__first):
+                if kind == _KEYFRAME:
+                    self.keyframes.append((runs, pos))
+                self.runs = runs + (kind == _STEP)
+            if not self.keyframes:
+                raise ValueError("the recording was cut short before its first keyframe")
+
+    def __len__(self):
+        "Glyph runs recorded"
+        return self.runs
+
+    def __count_runs(self):
+        "Glyph runs in the recording, counted on from the last keyframe"
+        runs = self.keyframes[-1][0]
+        for kind, _, _ in self.__records(self.keyframes[-1][1]):
+            runs += kind == _STEP
+        return runs
+
+    def __records(self, pos):
+        "(kind, offset, glyph runs before it) of each record from pos on, up to the end or the index"
+        data = self.data
+        runs = None
+        while pos < self.__index:
+            kind = data[pos]
+            try:
+                if kind == _KEYFRAME:
+                    runs, _ = read_varint(data, pos + 1)
+                after = self.__skip(kind, pos)
+            except (IndexError, struct.error):
+                return  # cut short mid-record
+            yield kind, pos, runs
+            if kind == _STEP:
+                runs += 1
+            elif kind == _END:
+                return
+            pos = after
+
+    def __skip(self, kind, pos):
+        "The offset after the record at pos"
+        data = self.data
+        pos += 1
+        if kind == _STEP:
+            _, pos = read_varint(data, pos)
+            return self.__apply(None, data, pos + 1)
+        if kind == _END:
+            return self.__apply(None, data, pos)
+        if kind == _KEYFRAME:
+            return self.__keyframe(pos)[1]
+        raise ValueError(f"unknown record {kind} in recording")
+
+    def __keyframe(self, pos):
+        "The state in the keyframe whose body starts at pos, and the offset after it"
+        data = self.data
+        _, pos = read_varint(data, pos)
+        state = dict((list_id, []) for list_id in self.ids)
+        count, pos = read_varint(data, pos)
+        for _ in range(count):
+            list_id, pos = read_varint(data, pos)
+            n, pos = read_varint(data, pos)
+            values = state[list_id]
+            for _ in range(n):
+                value, pos = read_value(data, pos)
+                values.append(value)
+        return state, pos
+
+    @staticmethod
+    def __apply(state, data, pos):
+        "Apply the changes at pos to state (or just skip them, if state is None), returning the offset after them"
+        count, pos = read_varint(data, pos)
+        for _ in range(count):
+            kind = data[pos]
+            list_id, pos = read_varint(data, pos + 1)
+            if kind == _REPLACE:
+                n, pos = read_varint(data, pos)
+                new = []
+                for _ in range(n):
+                    value, pos = read_value(data, pos)
+                    new.append(value)
+                if state is not None:
+                    state[list_id][:] = new
+                continue
+            index, pos = read_varint(data, pos)
+            if kind == _SET or kind == _INSERT:
+                value, pos = read_value(data, pos)
+                if state is not None:
+                    if kind == _SET:
+                        state[list_id][index] = value
+                    else:
+                        state[list_id].insert(index, value)
+            elif kind == _EXTEND:
+                n, pos = read_varint(data, pos)
+                new = []
+                for _ in range(n):
+                    value, pos = read_value(data, pos)
+                    new.append(value)
+                if state is not None:
+                    state[list_id].extend(new)
+            elif state is not None:
+                if kind == _POP:
+                    del state[list_id][index]
+                else:
+                    del state[list_id][index:]
+        return pos
+
+    def events(self):
+        "(glyph id, Action its question marker chose) of each glyph run, in order"
+        data = self.data
+        for kind, pos, _ in self.__records(self.__first):
+            if kind == _STEP:
+                glyph, pos = read_varint(data, pos + 1)
+                yield glyph, Action(data[pos])
+
+    def state(self, runs) -> dict:
+        """The lists by id after the first runs glyph runs (0 for the state the run started
+        with), as a debug callback is given them: before any rollback the last of them set off"""
+        if not 0 <= runs <= self.runs:
+            raise IndexError(f"{runs} glyph runs asked for, of {self.runs}")
+        return self.__replay(runs, False)
+
+    def final(self) -> dict:
+        "The lists by id the run ended with"
+        if not self.complete:
+            raise ValueError("the recording was cut short: it has no final state")
+        return self.__replay(self.runs, True)
+
+    def __replay(self, runs, to_end):
+        "The state after runs glyph runs, and after the end of the run if to_end, from the keyframe before it"
+        data = self.data
+        keyframe = bisect_right(self.keyframes, (runs, sys.maxsize)) - 1
+        done, offset = self.keyframes[keyframe]
+        state, pos = self.__keyframe(offset + 1)
+        while pos < self.__index:
+            kind = data[pos]
+            if kind == _KEYFRAME:
+                if done == runs and not to_end:
+                    break
+                pos = self.__keyframe(pos + 1)[1]
+            elif kind == _STEP:
+                if done == runs:
+                    break
+                _, pos = read_varint(data, pos + 1)
+                pos = self.__apply(state, data, pos + 1)
+                done += 1
+            elif kind == _END:
+                if to_end:
+                    self.__apply(state, data, pos + 1)
+                break
+            else:
+                raise ValueError(f"unknown record {kind} in recording")
+        return state
+
+
+def main():
+    "Print the state after some glyph runs of a recording (riv --record), or its glyph runs"
+    arg_parser = ArgumentParser(description="Replay a Rivulet recording")
+    arg_parser.add_argument("recording", help="file written by riv --record")
+    arg_parser.add_argument("--runs", type=int, default=None, metavar="N",
+                            help="print the state after the first N glyph runs (the final state by default)")
+    arg_parser.add_argument("--events", action="store_true", default=False,
+                            help="print each glyph run and what its question marker chose")
+    args = arg_parser.parse_args()
+
+    replay = Replay(args.recording)
+    if args.events:
+        for n, (glyph, outcome) in enumerate(replay.events(), start=1):
+            print(f"{n} glyph {glyph} {outcome.name}")
+        return
+    if args.runs is not None:
+        if not 0 <= args.runs <= len(replay):
+            arg_parser.error(f"the recording has {len(replay)} glyph runs")
+        state = replay.state(args.runs)
+    elif replay.complete:
+        state = replay.final()
+    else:
+        state = replay.state(len(replay))
+    for list_id, values in state.items():
+        if values:
+            print(f"{list_id}: {values}")
+
+
+if __name__ == "__main__":
+    main()
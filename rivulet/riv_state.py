@@ -0,0 +1,94 @@
+"""The interpreter's state: its lists, each in a slot of its own
+
+A program's lists are numbered by prime list ids. State holds them in a plain
+list instead, one slot per list the program refers to, numbered as the program
+is compiled: execution plans are bound to slots, so running them indexes a
+list rather than hashing list ids. Lists the program never refers to are not
+made at all, unless asked for by id (StateView shows them as empty).
+"""
+import copy
+from collections.abc import Mapping
+
+from rivulet.riv_counted import CountedList
+
+
+def counted_list(list_id): # pylint: disable=unused-argument
+    "A new, empty list for the state"
+    return CountedList()
+
+
+class State(list):
+    """The lists of the state, by slot
+
+    ids: the id of every list in the state, in order (as the keys of a dict, to look them up quickly)
+    slots: the slot of each list made so far, by id
+    new_list: makes the (empty) list for an id, new_list(list_id)
+    """
+    __slots__ = ("ids", "slots", "new_list")
+
+    def __init__(self, ids, referenced=None, new_list=counted_list):
+        super().__init__()
+        self.ids = dict.fromkeys(ids)
+        self.slots = {}
+        self.new_list = new_list
+        referenced = self.ids if referenced is None else set(referenced)
+        for list_id in self.ids:
+            if list_id in referenced:
+                self.slot(list_id)
+
+    def slot(self, list_id):
+        "The slot of a list, made now if it hasn't been; None if the state has no such list"
+        slot = self.slots.get(list_id)
+        if slot is None and list_id in self.ids:
+            slot = self.slots[list_id] = len(self)
+            self.append(self.new_list(list_id))
+        return slot
+
+    def of(self, list_id):
+        "The list with an id (a KeyError if there's none)"
+        slot = self.slot(list_id)
+        if slot is None:
+            raise KeyError(list_id)
+        return self[slot]
+
+    def view(self) -> "StateView":
+        "The lists by id, live"
+        return StateView(self)
+
+    def copy_lists(self) -> dict:
+        "A copy of the lists, as plain lists by id"
+        return dict((list_id, list(values)) for list_id, values in StateView(self).items())
+
+    def __deepcopy__(self, memo):
+        # the values are numbers, so copies of the lists are deep copies
+        copied = State.__new__(State)
+        list.extend(copied, (copy.copy(values) for values in self))
+        copied.ids = self.ids
+        copied.slots = dict(self.slots)
+        copied.new_list = self.new_list
+        return copied
+
+
+class StateView(Mapping):
+    "A State's lists by id, as a read-only dict would give them (a list not yet made is empty)"
+    __slots__ = ("_state",)
+
+    def __init__(self, state):
+        self._state = state
+
+    def __getitem__(self, list_id):
+        slot = self._state.slots.get(list_id)
+        if slot is not None:
+            return self._state[slot]
+        if list_id in self._state.ids:
+            return []
+        raise KeyError(list_id)
+
+    def __iter__(self):
+        return iter(self._state.ids)
+
+    def __len__(self):
+        return len(self._state.ids)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
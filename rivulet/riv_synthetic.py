@@ -0,0 +1,674 @@
+"""Synthetic Rivulet programs of any size, each with the state it should end in
+
+generate() draws a program from a Shape: how many glyphs, how tall, how many
+strands each, how deeply blocks nest and what kind of blocks they are. Each
+glyph is first made as a model of its strands, which is run against a model
+of the state and then drawn, so every program comes with its final state,
+worked out without the parser or the interpreter.
+
+Strands are drawn in a few fixed shapes, each in a band of columns of its own
+with a blank column between bands, so that no two strands touch. A value is
+drawn on row 1, whatever list its strand writes to. Only the last glyph of a
+block asks a question. A while block counts down a counter of its own, on a
+row no other strand writes to: the glyph before the block sets it, and the
+block's last glyph takes one from it and asks if it is still positive, so
+every loop ends.
+
+Anything the model finds the interpreter can't run (a list2list from a shorter
+list, a pop past the end of one) or that would make the program slow to run
+(integers or lists grown past a bound) is drawn again; after a few tries, with
+only strands that can't go wrong. Lists that grow long are popped from, and
+those that hold large integers overwritten, so the programs stay runnable
+however many glyphs they have.
+
+    python -m rivulet.riv_synthetic [--glyphs N] [--height ROWS] [--levels N] [--seed N]
+                                    [-o FILE] [--expected FILE]
+"""
+import json
+import random
+import sys
+from argparse import ArgumentParser
+
+from rivulet.riv_primes import list_ids
+
+# the values of the action strands drawn for each kind of action (see _commands.json):
+# overwrite, insert (append, for a list), subtraction, multiplication and reverse subtraction
+CELL_COMMANDS = (0, 1, -1, 2, 6)
+LIST_COMMANDS = (0, 1, 2, 6)
+LIST2LIST_COMMANDS = (0, 2, 6)
+# pop (from the list a reference reads), to shorten a long list
+POP = 3
+
+# what the model lets a program grow to
+MAX_BITS = 62
+MAX_CELLS = 256
+# lists longer, or with integers larger, than this are as likely as not to be
+# shortened or overwritten by the next strand drawn
+TRIM_CELLS = 32
+TRIM_BITS = 32
+
+# tries at a glyph or block before it is drawn with only strands that can't go wrong
+TRIES = 8
+
+
+class Shape:
+    """What the programs generate() draws are like
+
+    glyphs: glyphs in the program
+    height: rows in each glyph, so lists in the program (at least 4 more than levels)
+    width: least columns in a glyph (glyphs are as wide as their strands need)
+    strands: (fewest, most) strands drawn in a glyph, besides those a block needs
+    levels: the deepest level a glyph is at: 1 for no blocks
+    blocks: the chance a glyph is followed by a nested block, where one can be
+    block_size: (fewest, most) glyphs directly in a block
+    kinds: weights of while, if and plain (question-less) blocks
+    passes: (fewest, most) times the body of a while block runs
+    actions: the chance a strand has an action strand
+    refs: the chance a strand is a reference rather than a value
+    list2list: the chance a reference's action strand is a list2list
+    across: glyphs side by side on each row of the program
+    """
+
+    def __init__(self, glyphs=100, height=9, width=0, strands=(1, 6), levels=3, blocks=0.3, block_size=(1, 4),
+                 kinds=(1, 1, 1), passes=(1, 4), actions=0.3, refs=0.3, list2list=0.3, across=1):
+        self.glyphs = glyphs
+        self.height = height
+        self.width = width
+        self.strands = strands
+        self.levels = levels
+        self.blocks = blocks
+        self.block_size = block_size
+        self.kinds = kinds
+        self.passes = passes
+        self.actions = actions
+        self.refs = refs
+        self.list2list = list2list
+        self.across = across
+
+
+class Strand:
+    """A data strand, and the action strand below it if it has one
+
+    row: the row of its hook, which is the list it writes to
+    value: the value of a value strand, or None for a reference
+    ref_row: the row a reference reads from
+    command: the value of its action strand, or None for no action (addition)
+    applies_to: what the action applies to: "cell", "list" or "list2list"
+    cell, ref_cell: the cells it writes to and reads from (see SyntheticGlyph.place)
+    """
+    __slots__ = ("row", "value", "ref_row", "command", "applies_to", "cell", "ref_cell")
+
+    def __init__(self, row, value=None, ref_row=None, command=None, applies_to="cell"):
+        self.row = row
+        self.value = value
+        self.ref_row = ref_row
+        self.command = command
+        self.applies_to = applies_to
+        self.cell = None
+        self.ref_cell = None
+
+
+class Question:
+    """A glyph's question marker pair
+
+    row: the row it begins on, which is the list it asks about
+    block_type: "while" or "if"
+    applies_to: "cell" or "list"
+    after: how many of the glyph's strands are drawn to its left
+    cell: the cell it asks about (see SyntheticGlyph.place)
+    """
+    __slots__ = ("row", "block_type", "applies_to", "after", "cell")
+
+    def __init__(self, row, block_type, applies_to, after=0):
+        self.row = row
+        self.block_type = block_type
+        self.applies_to = applies_to
+        self.after = after
+        self.cell = None
+
+
+class SyntheticGlyph:
+    "A glyph as its level, its strands in the order they run, and its question, if any"
+    __slots__ = ("level", "strands", "question")
+
+    def __init__(self, level, strands, question=None):
+        self.level = level
+        self.strands = strands
+        self.question = question
+
+    def place(self):
+        """Work out the cells each strand writes to and reads from, as the parser will
+
+        A strand writes to the cell after those written by the strands to its left
+        on its row; a reference reads the cell after the hooks to the left of its end
+        (its own hook too, if it ends on its own row), and a question the cell after
+        the hooks to the left of where it begins."""
+        hooks = {}
+        for n, strand in enumerate(self.strands):
+            if self.question is not None and self.question.after == n:
+                self.question.cell = hooks.get(self.question.row, 0)
+            strand.cell = hooks.get(strand.row, 0)
+            hooks[strand.row] = strand.cell + 1
+            if strand.ref_row is not None:
+                strand.ref_cell = hooks.get(strand.ref_row, 0)
+        if self.question is not None and self.question.after == len(self.strands):
+            self.question.cell = hooks.get(self.question.row, 0)
+
+
+class SyntheticBlock:
+    """A nested block of glyphs and blocks, which starts and ends with a glyph
+
+    kind: "while", "if" or "plain"
+    """
+    __slots__ = ("kind", "items")
+
+    def __init__(self, kind, items):
+        self.kind = kind
+        self.items = items
+
+
+class SyntheticProgram:
+    """A generated program
+
+    source: its text
+    expected: the lists it should end with, by list id
+    glyphs: its glyphs, in the order they are drawn
+    """
+    __slots__ = ("source", "expected", "glyphs")
+
+    def __init__(self, source, expected, glyphs):
+        self.source = source
+        self.expected = expected
+        self.glyphs = glyphs
+
+
+class _Unrunnable(Exception):
+    "The model can't run a glyph as the interpreter would, or it grew past a bound"
+
+
+def _apply(command, initial, source):
+    "A command, by the value of its action strand, applied to a cell"
+    if command == 0:
+        return source
+    if command == -1:
+        return initial - source
+    if command == 2:
+        return initial * source
+    if command == 6:
+        return source - initial
+    return initial + source
+
+
+def _run_strand(strand, state, ids):
+    "Run a strand against the model's state, a dict of lists by list id, as the interpreter would"
+    target = state[ids[strand.row]]
+    command = strand.command
+    if len(target) == strand.cell and not (command == 1 and strand.applies_to == "list"):
+        target.append(0)
+    if len(target) < strand.cell:
+        raise _Unrunnable("cell past the end of the list")
+
+    if strand.applies_to == "list2list":
+        source = state[ids[strand.ref_row]]
+        if len(target) > len(source):
+            raise _Unrunnable("list2list from a shorter list")
+        target.extend([0] * (len(source) - len(target)))
+        for i, value in enumerate(source):
+            target[i] = _apply(command, target[i], value)
+        return
+
+    if strand.value is not None:
+        source = strand.value
+    else:
+        ref = state[ids[strand.ref_row]]
+        source = ref[strand.ref_cell] if strand.ref_cell < len(ref) else 0
+
+    if command is None:
+        target[strand.cell] += source
+    elif command == POP:
+        target[strand.cell] += source
+        popped = state[ids[strand.ref_row]]
+        if strand.ref_cell >= len(popped):
+            raise _Unrunnable("pop past the end of the list")
+        popped.pop(strand.ref_cell)
+    elif strand.applies_to == "list":
+        if command == 1:
+            target.append(source)
+        else:
+            target[:] = [_apply(command, value, source) for value in target]
+    elif command == 1:
+        target.insert(strand.cell, source)
+    else:
+        target[strand.cell] = _apply(command, target[strand.cell], source)
+
+
+def _ask(question, state, ids) -> bool:
+    "Whether a question succeeds"
+    values = state[ids[question.row]]
+    if question.applies_to == "list":
+        return any(v != 0 for v in values) and not any(v < 0 for v in values)
+    return question.cell < len(values) and values[question.cell] > 0
+
+
+def _run_glyph(glyph, state, ids) -> bool:
+    "Run a glyph, returning whether its question (if any) succeeds"
+    for strand in glyph.strands:
+        _run_strand(strand, state, ids)
+    for list_id in set(ids[strand.row] for strand in glyph.strands):
+        values = state[list_id]
+        if len(values) > MAX_CELLS or any(v.bit_length() > MAX_BITS for v in values):
+            raise _Unrunnable("grown past a bound")
+    return glyph.question is None or _ask(glyph.question, state, ids)
+
+
+def _run_items(items, state, ids):
+    "Run a block's glyphs and blocks in order, returning whether the last glyph's question succeeds"
+    succeeds = True
+    for item in items:
+        if isinstance(item, SyntheticBlock):
+            _run_block(item, state, ids)
+        else:
+            succeeds = _run_glyph(item, state, ids)
+    return succeeds
+
+
+def _run_block(block, state, ids):
+    "Run a nested block: a failed question rolls it back, a while block repeats while its question succeeds"
+    while True:
+        saved = dict((k, list(v)) for k, v in state.items()) if block.kind != "plain" else None
+        succeeds = _run_items(block.items, state, ids)
+        if block.kind == "plain" or (succeeds and block.kind == "if"):
+            return
+        if not succeeds:
+            state.clear()
+            state.update(saved)
+            return
+
+
+class _Generator:
+    "Draws the models of a program's glyphs from a Shape, running them as it goes"
+
+    def __init__(self, shape, rng):
+        self.shape = shape
+        self.rng = rng
+        self.ids = list_ids(shape.height)
+        # the counter of a while block at each level is on a row of its own, with the
+        # four rows a question needs from its row down
+        self.counters = dict((level, shape.height - 4 - (level - 2)) for level in range(2, shape.levels + 1))
+        self.rows = [r for r in range(shape.height) if r not in self.counters.values()]
+        self.safe = False
+        self.long = []  # rows whose lists have grown long, and large, as the last top-level glyph or block began
+        self.large = []
+
+    def __fits(self, row, command, applies_to):
+        "Whether an action strand fits below a hook on row"
+        return row + _action_depth(command, applies_to) < self.shape.height
+
+    def trim(self):
+        "A strand popping from a long list or overwriting a list of large integers, or None if it doesn't fit"
+        rng = self.rng
+        if self.long and not self.safe and rng.random() < 0.5:
+            rows = [r for r in self.rows if self.__fits(r, POP, "cell")]
+            if rows:
+                return Strand(rng.choice(rows), ref_row=rng.choice(self.long), command=POP)
+        if self.large:
+            row = rng.choice(self.large)
+            if self.__fits(row, 0, "list"):
+                return Strand(row, value=rng.randint(-3, 5), command=0, applies_to="list")
+        return None
+
+    def strand(self) -> Strand:
+        "A strand drawn at random"
+        rng = self.rng
+        if (self.long or self.large) and rng.random() < 0.5:
+            strand = self.trim()
+            if strand is not None:
+                return strand
+        row = rng.choice(self.rows)
+        # large integers are not read, so they don't spread to lists that can't be overwritten
+        readable = [r for r in range(self.shape.height) if r not in self.large]
+        if readable and rng.random() < self.shape.refs:
+            strand = Strand(row, ref_row=rng.choice(readable))
+        else:
+            strand = Strand(row, value=rng.randint(-3, 5))
+        if self.safe:
+            # only values added, and references overwriting
+            if strand.value is None:
+                if self.__fits(row, 0, "cell"):
+                    strand.command = 0
+                else:
+                    strand.ref_row, strand.value = None, rng.randint(-3, 5)
+            return strand
+        if rng.random() < self.shape.actions:
+            if strand.value is None and rng.random() < self.shape.list2list:
+                applies_to, commands = "list2list", LIST2LIST_COMMANDS
+            elif rng.random() < 0.5:
+                applies_to, commands = "list", LIST_COMMANDS
+            else:
+                applies_to, commands = "cell", CELL_COMMANDS
+            commands = [c for c in commands if self.__fits(row, c, applies_to)]
+            if commands:
+                strand.command = rng.choice(commands)
+                strand.applies_to = applies_to
+        return strand
+
+    def glyph(self, level) -> SyntheticGlyph:
+        "A glyph of strands drawn at random"
+        fewest, most = self.shape.strands
+        return SyntheticGlyph(level, [self.strand() for _ in range(self.rng.randint(fewest, most))])
+
+    def block(self, level, size) -> SyntheticBlock:
+        "A block at level of size glyphs, ending in the question its kind needs"
+        rng = self.rng
+        kind = rng.choices(("while", "if", "plain"), self.shape.kinds)[0]
+        items = self.items(level, size)
+        last = items[-1]
+        if kind == "while":
+            last.strands.append(Strand(self.counters[level], value=-1))
+            # before the counter's hook, so it asks about the counter's cell 0
+            last.question = Question(self.counters[level], "while", rng.choice(("cell", "list")),
+                                     len(last.strands) - 1)
+        elif kind == "if":
+            last.question = Question(rng.randrange(self.shape.height - 3), "if", rng.choice(("cell", "list")),
+                                     rng.randint(0, len(last.strands)))
+        last.place()
+        return SyntheticBlock(kind, items)
+
+    def items(self, level, size) -> list:
+        """size glyphs at level and in blocks nested in it, starting with a glyph, and (below the
+        top level) ending with one; a block always follows a glyph, which sets its counter"""
+        items = [self.glyph(level)]
+        size -= 1
+        last = 0 if level == 1 else 1
+        while size > last:
+            room = size - last
+            if level < self.shape.levels and self.rng.random() < self.shape.blocks:
+                block = self.block(level + 1, min(room, self.rng.randint(*self.shape.block_size)))
+                self.set_counter(items[-1], block, level + 1)
+                items.append(block)
+                size -= _count(block)
+                if size > last:
+                    items.append(self.glyph(level))
+                    size -= 1
+            else:
+                items.append(self.glyph(level))
+                size -= 1
+        if size:
+            items.append(self.glyph(level))
+        for item in items:
+            if isinstance(item, SyntheticGlyph):
+                item.place()
+        return items
+
+    def set_counter(self, glyph, block, level):
+        "Have the glyph before a while block set its counter, to the number of times its body runs"
+        if block.kind == "while":
+            glyph.strands.append(Strand(self.counters[level], value=self.rng.randint(*self.shape.passes), command=0))
+            glyph.place()
+
+    def program(self) -> tuple:
+        """The glyphs and blocks of the program, and the state the model ends with
+
+        Each glyph or block at the top level is run as it is drawn, and drawn again if
+        the model can't run it; a block is run with the glyph before it, which sets its counter."""
+        shape = self.shape
+        state = dict((list_id, []) for list_id in self.ids)
+        before = state
+        items = []
+        size = shape.glyphs
+        while size:
+            self.long = [r for r in self.rows if len(state[self.ids[r]]) > TRIM_CELLS]
+            self.large = [r for r in self.rows if any(v.bit_length() > TRIM_BITS for v in state[self.ids[r]])]
+            nest = bool(items) and isinstance(items[-1], SyntheticGlyph) and shape.levels > 1 \
+                and self.rng.random() < shape.blocks
+            for attempt in range(TRIES + 1):
+                self.safe = attempt == TRIES
+                trial = dict((k, list(v)) for k, v in (before if nest else state).items())
+                try:
+                    if nest:
+                        item = self.block(2, min(size, self.rng.randint(*shape.block_size)))
+                        glyph = _copy_glyph(items[-1])
+                        self.set_counter(glyph, item, 2)
+                        _run_glyph(glyph, trial, self.ids)
+                        _run_block(item, trial, self.ids)
+                    else:
+                        item = glyph = self.glyph(1)
+                        glyph.place()
+                        _run_glyph(glyph, trial, self.ids)
+                    break
+                except _Unrunnable:
+                    if self.safe:
+                        raise
+            if isinstance(item, SyntheticBlock):
+                items[-1] = glyph
+            else:
+                before = state
+            items.append(item)
+            state = trial
+            size -= _count(item)
+        return items, state
+
+
+def _copy_glyph(glyph) -> SyntheticGlyph:
+    "A copy of a glyph that more strands can be added to"
+    return SyntheticGlyph(glyph.level, list(glyph.strands), glyph.question)
+
+
+def _count(item) -> int:
+    "The glyphs in a glyph or block"
+    if isinstance(item, SyntheticBlock):
+        return sum(_count(i) for i in item.items)
+    return 1
+
+
+def _flatten(items, glyphs):
+    "The glyphs of a list of glyphs and blocks, in order"
+    for item in items:
+        if isinstance(item, SyntheticBlock):
+            _flatten(item.items, glyphs)
+        else:
+            glyphs.append(item)
+    return glyphs
+
+
+def _action_steps(command):
+    "The steps down and (in the column to the left) back up an action strand takes for its value"
+    if command >= 1:
+        return command, 0
+    return 1, 1 - command
+
+
+def _action_depth(command, applies_to) -> int:
+    "The rows an action strand takes below its data strand's hook"
+    down, up = _action_steps(command)
+    if applies_to == "cell" and not up:
+        return down + 1
+    return down + 2
+
+
+def _draw_data(strand, cells):
+    "Draw a data strand, its hook at column 0 of its row"
+    y = strand.row
+    if strand.value is None:
+        end = strand.ref_row
+        if end == y:
+            cells.update({(0, y): "╰", (1, y): "─", (2, y): "╶"})
+            return
+        if end < y:
+            cells.update({(0, y): "╰", (1, y): "╯", (1, end): "╭"})
+        else:
+            cells.update({(0, y): "╰", (1, y): "╮", (1, end): "╰"})
+        for row in range(min(y, end) + 1, max(y, end)):
+            cells[(1, row)] = "│"
+        cells.update({(2, end): "─", (3, end): "╶"})
+        return
+
+    # the value is drawn on row 1 (list 1), where each step is worth 1
+    value = strand.value
+    if y == 0:
+        if value > 0:
+            cells[(0, 0)] = "╰"
+            cells.update(((x, 0), "─") for x in range(1, value + 1))
+        elif value < 0:
+            cells[(0, 0)] = "╯"
+            cells.update(((-x, 0), "─") for x in range(1, -value + 1))
+        else:
+            # two steps right on row 1, one left on row 2
+            cells.update({(0, 0): "╰", (1, 0): "─", (2, 0): "─", (3, 0): "╮", (3, 1): "╯", (2, 1): "─"})
+        return
+    cells.update({(0, y): "╰", (1, y): "╯"})
+    if value == 0:
+        cells[(1, y - 1)] = "│"
+        return
+    for row in range(1, y):
+        cells[(1, row)] = "│"
+    if value > 0:
+        cells[(1, 0)] = "╭"
+        cells.update(((x, 0), "─") for x in range(2, value + 2))
+    else:
+        cells[(1, 0)] = "╮"
+        cells.update(((x, 0), "─") for x in range(1 + value, 1))
+
+
+def _draw_action(strand, cells):
+    """Draw an action strand below a data strand's hook at column 0: down its column,
+    each step worth 1, then back up the column to its left, each step worth -1"""
+    top = strand.row + 1
+    down, up = _action_steps(strand.command)
+    cells[(0, top)] = "╭"
+    for row in range(top + 1, top + down + 1):
+        cells[(0, row)] = "│"
+    turn = top + down + 1
+    if not up:
+        if strand.applies_to == "list":
+            cells.update({(0, turn): "╯", (-1, turn): "─"})
+        elif strand.applies_to == "list2list":
+            cells[(0, turn)] = "╷"
+        return
+    cells.update({(0, turn): "╯", (-1, turn): "╰"})
+    for row in range(turn - up, turn):
+        cells[(-1, row)] = "│"
+    if strand.applies_to == "list":
+        cells.update({(-1, turn - up - 1): "╮", (-2, turn - up - 1): "─"})
+    elif strand.applies_to == "list2list":
+        cells[(-1, turn - up - 1)] = "╵"
+
+
+def _draw_question(question, cells):
+    "Draw a question marker pair, beginning at column 0 of its row: a while ends to the right, an if to the left"
+    y = question.row
+    step = 1 if question.block_type == "while" else -1
+    cells.update({(0, y): "╷", (0, y + 1): "╰" if step == 1 else "╯", (step, y + 1): "╮" if step == 1 else "╭",
+                  (step, y + 2): "╷"})
+    if question.applies_to == "cell":
+        cells[(step, y + 3)] = "│"
+    else:
+        cells.update({(step, y + 3): "╰", (step + 1, y + 3): "─"})
+
+
+def _bands(glyph) -> list:
+    "The cells of each band of the glyph, left to right"
+    bands = []
+    for n, strand in enumerate(glyph.strands):
+        if glyph.question is not None and glyph.question.after == n:
+            bands.append(_question_band(glyph.question))
+        cells = {}
+        _draw_data(strand, cells)
+        if strand.command is not None:
+            _draw_action(strand, cells)
+        bands.append(cells)
+    if glyph.question is not None and glyph.question.after == len(glyph.strands):
+        bands.append(_question_band(glyph.question))
+    return bands
+
+
+def _question_band(question):
+    cells = {}
+    _draw_question(question, cells)
+    return cells
+
+
+def draw(glyph, height, width=0) -> list:
+    "The rows of text of a glyph, its start markers at the top left and its end marker at the bottom right"
+    grid = {}
+    for x in range(glyph.level):
+        grid[(x, 0)] = "╵"
+    # a blank column after the start markers and between bands
+    column = glyph.level + 1
+    for cells in _bands(glyph):
+        left = min(x for x, _ in cells)
+        right = max(x for x, _ in cells)
+        grid.update(((x + column - left, y), ch) for (x, y), ch in cells.items())
+        column += right - left + 2
+    width = max(width, column + 1)
+    grid[(width - 1, height - 1)] = "╷"
+    return ["".join(grid.get((x, y), " ") for x in range(width)) for y in range(height)]
+
+
+def render(glyphs, height, width=0, across=1) -> str:
+    "The text of a program of glyphs, across to a row, each row of the program labelled with its list id"
+    ids = list_ids(height)
+    label = len(str(ids[-1]))
+    rows = []
+    for first in range(0, len(glyphs), across):
+        drawn = [draw(g, height, width) for g in glyphs[first:first + across]]
+        for y in range(height):
+            rows.append(f"{ids[y]:>{label}} " + " ".join(d[y] for d in drawn).rstrip())
+        rows.append("")
+    return "\n".join(rows)
+
+
+def generate(shape:Shape=None, seed=0) -> SyntheticProgram:
+    "A program drawn from shape (the default Shape if none), the same for the same seed"
+    shape = shape or Shape()
+    if shape.height < shape.levels + 4:
+        raise ValueError(f"glyphs of {shape.height} rows can't nest {shape.levels} levels deep: "
+                         f"they need {shape.levels + 4}")
+    if shape.glyphs < 1:
+        raise ValueError("a program needs a glyph")
+    items, state = _Generator(shape, random.Random(seed)).program()
+    glyphs = _flatten(items, [])
+    return SyntheticProgram(render(glyphs, shape.height, shape.width, shape.across), state, glyphs)
+
+
+def main():
+    "Write a synthetic program, and the state it should end with"
+    arg_parser = ArgumentParser(description="Generate a synthetic Rivulet program")
+    arg_parser.add_argument("--glyphs", type=int, default=100, help="glyphs in the program")
+    arg_parser.add_argument("--height", type=int, default=9, help="rows in each glyph")
+    arg_parser.add_argument("--width", type=int, default=0, help="least columns in each glyph")
+    arg_parser.add_argument("--strands", type=int, nargs=2, default=(1, 6), metavar=("FEWEST", "MOST"),
+                            help="strands in each glyph")
+    arg_parser.add_argument("--levels", type=int, default=3, help="deepest level of nested blocks (1 for none)")
+    arg_parser.add_argument("--blocks", type=float, default=0.3, help="chance of a nested block after a glyph")
+    arg_parser.add_argument("--kinds", type=float, nargs=3, default=(1, 1, 1), metavar=("WHILE", "IF", "PLAIN"),
+                            help="weights of each kind of block")
+    arg_parser.add_argument("--list2list", type=float, default=0.3,
+                            help="chance a reference's action strand is a list2list")
+    arg_parser.add_argument("--across", type=int, default=1, help="glyphs side by side")
+    arg_parser.add_argument("--seed", type=int, default=0, help="seed: the same seed draws the same program")
+    arg_parser.add_argument("-o", dest="outfile", default=None, metavar="FILE", help="write the program to FILE")
+    arg_parser.add_argument("--expected", default=None, metavar="FILE",
+                            help="write the lists the program should end with to FILE, as JSON")
+    args = arg_parser.parse_args()
+
+    shape = Shape(glyphs=args.glyphs, height=args.height, width=args.width, strands=tuple(args.strands),
+                  levels=args.levels, blocks=args.blocks, kinds=tuple(args.kinds), list2list=args.list2list,
+                  across=args.across)
+    try:
+        program = generate(shape, args.seed)
+    except ValueError as error:
+        arg_parser.exit(2, f"{error}\n")
+
+    if args.outfile:
+        with open(args.outfile, "w", encoding="utf-8") as file:
+            file.write(program.source)
+    else:
+        sys.stdout.write(program.source)
+    if args.expected:
+        with open(args.expected, "w", encoding="utf-8") as file:
+            json.dump(dict((str(k), v) for k, v in program.expected.items()), file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Wall time and work counts of the phases of parsing and running a program
+
+A PhaseTimer is passed to a Parser or an Interpreter through their timer
+attribute; neither times anything unless it is set. Phases nest: a phase
+started inside another is recorded under it, so the parser's phases fall under
+the interpreter's parse phase. Each phase's time adds up over the times it is
+entered, as do the counters of the work done (characters scanned, strands
+traced and so on), which are counted once a phase has done its work rather than
+as it goes.
+"""
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    "Wall time of each phase, by its path of phase names, and counts of the work done in them"
+
+    def __init__(self):
+        self.seconds = {}   # seconds by phase path, a tuple of names outermost first, in the order first entered
+        self.counters = Counter()
+        self.__path = ()
+
+    @contextmanager
+    def phase(self, name):
+        "Time a phase, within any phase already started"
+        outer = self.__path
+        self.__path = outer + (name,)
+        self.seconds.setdefault(self.__path, 0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[self.__path] += time.perf_counter() - start
+            self.__path = outer
+
+    def count(self, name, n=1):
+        "Add n to a counter"
+        self.counters[name] += n
+
+    def total(self, *path) -> float:
+        "Seconds of a phase, given by its path of names (0 if it never ran)"
+        return self.seconds.get(path, 0.0)
+
+    def report(self, stream=None):
+        "Write a table of the phases, each under the phase it ran in, then the counters"
+        stream = stream or sys.stdout
+        stream.write(f"{'phase':<32}{'ms':>12}\n")
+        for path in self.__in_tree_order():
+            name = "  " * (len(path) - 1) + path[-1]
+            stream.write(f"{name:<32}{self.seconds[path] * 1e3:>12.3f}\n")
+        if self.counters:
+            stream.write(f"{'counter':<32}{'count':>12}\n")
+        for name, n in self.counters.items():
+            stream.write(f"{name:<32}{n:>12}\n")
+
+    def __in_tree_order(self):
+        "The phase paths, each followed by the phases within it, in the order they were first entered"
+        order = list(self.seconds)
+        return sorted(order, key=lambda path: [order.index(path[:i + 1]) for i in range(len(path))])
@@ -0,0 +1,256 @@
+"Typed, slotted records for the parser's output: glyphs, the tokens (strands) in them and the cells of each strand"
+import copy
+from enum import StrEnum
+
+
+class TokenType(StrEnum):
+    "The kind of strand, from the reading of its start"
+    data = "data"
+    action = "action"
+    question_marker = "question_marker"
+
+
+class Subtype(StrEnum):
+    "How a strand is read, decided by its end (and for question markers, its order)"
+    value = "value"
+    ref = "ref"
+    element = "element"
+    list = "list"
+    list2list = "list2list"
+    first = "first"
+    second = "second"
+
+
+class Command(StrEnum):
+    "Commands named in _commands.json"
+    overwrite = "overwrite"
+    insert = "insert"
+    append = "append"
+    addition_assignment = "addition_assignment"
+    subtraction_assignment = "subtraction_assignment"
+    reverse_subtraction_assignment = "reverse_subtraction_assignment"
+    multiplication_assignment = "multiplication_assignment"
+    division_assignment = "division_assignment"
+    reverse_division_assignment = "reverse_division_assignment"
+    pop = "pop"
+    pop_and_append = "pop_and_append"
+    exponent_assignment = "exponent_assignment"
+    root_assignment = "root_assignment"
+    mod_assignment = "mod_assignment"
+    reverse_mod_assignment = "reverse_mod_assignment"
+
+
+def intern_command(name):
+    "The Command for a name, or the name itself if it is not one we know"
+    try:
+        return Command(name)
+    except ValueError:
+        return name
+
+
+class Record:
+    """Base for the parser's records: fields are slots, read as attributes in hot code,
+    with a dict-style view (record["field"], "field" in record, get, keys, items...)
+    over the fields that have been set, so they can be used wherever a dict was before.
+
+    A field that has never been set (or has been deleted) is absent from the view,
+    just as a missing key would be.
+    """
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        try:
+            delattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        "Value of a field, or default if it isn't set"
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def keys(self):
+        "Names of the fields that are set"
+        return [k for k in self.__slots__ if hasattr(self, k)]
+
+    def values(self):
+        "Values of the fields that are set"
+        return [getattr(self, k) for k in self.keys()]
+
+    def items(self):
+        "(name, value) for the fields that are set"
+        return [(k, getattr(self, k)) for k in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.items())
+        return f"{type(self).__name__}({fields})"
+
+    def __copy__(self):
+        dup = type(self).__new__(type(self))
+        for k, v in self.items():
+            setattr(dup, k, v)
+        return dup
+
+    def __deepcopy__(self, memo):
+        dup = type(self).__new__(type(self))
+        memo[id(self)] = dup
+        for k, v in self.items():
+            setattr(dup, k, copy.deepcopy(v, memo))
+        return dup
+
+    def to_dict(self):
+        "A plain dict copy, with nested records converted as well"
+        return {k: _plain(v) for k, v in self.items()}
+
+
+def _plain(value):
+    if isinstance(value, Record):
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+
+class Cell(Record):
+    "One character of a strand: its position and the direction the strand leaves it in"
+    __slots__ = ("symbol", "x", "y", "dir")
+
+    def __init__(self, symbol, x, y):
+        # pylint: disable=super-init-not-called
+        self.symbol = symbol
+        self.x = x
+        self.y = y
+
+
+class Token(Record):
+    "A strand: where it starts, how it reads and, once parsed, where in state it applies"
+    __slots__ = (
+        "symbol", "name", "x", "y", "dir", "pos", "type", "action", "value",
+        "vert_value", "subtype", "cells", "end_x", "end_y", "applies_to", "command",
+        "command_note", "list", "order", "assign_to_cell", "ref_cell", "ref_list",
+        "position", "block_type", "second", "end_pos"
+    )
+
+
+class Glyph(Record):
+    "A glyph: its characters, level and tokens (plus block links added by the interpreter)"
+    __slots__ = (
+        "level", "end_loc", "glyph", "tokens", "list_size", "id", "first", "following"
+    )
+
+
+def to_json(obj):
+    "json.dumps default hook for records"
+    if isinstance(obj, Record):
+        return dict(obj.items())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def token_from_json(data):
+    "Rebuild a Token (and its cells, action and second marker) from its JSON form"
+    token = Token()
+    for key, value in data.items():
+        if key == "type" and value is not None:
+            value = TokenType(value)
+        elif key == "subtype" and value is not None:
+            value = Subtype(value)
+        elif key == "command" and isinstance(value, str):
+            value = intern_command(value)
+        elif key == "cells":
+            value = [_cell_from_json(c) for c in value]
+        elif key in ("action", "second") and value is not None:
+            value = token_from_json(value)
+        token[key] = value
+    return token
+
+
+def _cell_from_json(data):
+    cell = Cell(data["symbol"], data["x"], data["y"])
+    if "dir" in data:
+        cell.dir = data["dir"]
+    return cell
+
+
+def glyphs_from_json(data):
+    "Rebuild the parser's output (a list of Glyphs) from its JSON form"
+    glyphs = []
+    for g in data:
+        glyph = Glyph(**{k: v for k, v in g.items() if k != "tokens"})
+        if "tokens" in g:
+            glyph.tokens = [token_from_json(t) for t in g["tokens"]]
+        glyphs.append(glyph)
+    return glyphs
+
+
+# the names of the fields set in each packed token, shared by tokens with the same
+# fields so that pickle sends each tuple once
+_FIELDS = {}
+
+
+def pack_token(token):
+    """A Token (and its cells, action and second marker) as plain tuples, which pickle
+    several times faster than the records: (names of the fields set, their values)"""
+    names = tuple(token.keys())
+    names = _FIELDS.setdefault(names, names)
+    values = []
+    for name in names:
+        value = getattr(token, name)
+        if name == "cells":
+            value = [(c.symbol, c.x, c.y, getattr(c, "dir", None)) for c in value]
+        elif (name == "action" or name == "second") and value is not None:
+            value = pack_token(value)
+        values.append(value)
+    return names, tuple(values)
+
+
+def unpack_token(packed):
+    "Rebuild a Token from pack_token's tuples"
+    names, values = packed
+    token = Token.__new__(Token)
+    for name, value in zip(names, values):
+        if name == "cells":
+            cells = []
+            for symbol, x, y, direction in value:
+                cell = Cell(symbol, x, y)
+                if direction is not None:
+                    cell.dir = direction
+                cells.append(cell)
+            value = cells
+        elif (name == "action" or name == "second") and value is not None:
+            value = unpack_token(value)
+        setattr(token, name, value)
+    return token
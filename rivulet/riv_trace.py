@@ -0,0 +1,163 @@
+"""Trace sinks: where the interpreter reports each glyph it runs
+
+The interpreter hands each sink a GlyphEvent after running a glyph. Events are
+cheap to make and format nothing themselves; a sink asks for the text or JSON
+form only for the events it keeps, and the interpreter skips making events
+altogether for a sink that is not enabled.
+"""
+import json
+import logging
+import sys
+
+from rivulet.riv_python_transpiler import PythonTranspiler
+
+
+class GlyphEvent:
+    """A glyph has run
+
+    glyph: the glyph
+    state: the state just after it ran (still live: copy it to keep it)
+    outcome: the Action its question marker chose, if any (cont otherwise)
+    """
+    __slots__ = ("glyph", "state", "outcome")
+
+    def __init__(self, glyph, state, outcome):
+        self.glyph = glyph
+        self.state = state
+        self.outcome = outcome
+
+    def summary(self) -> str:
+        "The glyph's id and the lists that are not empty"
+        lists = "\n".join([f"{k}: {v}" for k, v in self.state.items() if v])
+        return f" \nglyph: {self.glyph['id']}\n{lists}\n"
+
+    def verbose(self, transpiler) -> str:
+        "The glyph as drawn, its pseudo-code and the whole state"
+        return f"{transpiler.glyph_drawn(self.glyph['glyph'])}\n{transpiler.glyph_pseudo(self.glyph)}\n{self.state}\n\n\n"
+
+    def to_json(self) -> dict:
+        "The event as a JSON object"
+        return {
+            "glyph": self.glyph["id"],
+            "outcome": self.outcome.name,
+            "state": {str(k): list(v) for k, v in self.state.items()}
+        }
+
+
+class TraceSink:
+    "Base for trace sinks: ignores everything"
+    enabled = True
+
+    def glyph(self, event:GlyphEvent):
+        "A glyph has run"
+
+    def flush(self):
+        "Write out anything held back"
+
+    def close(self):
+        "Flush, and release anything the sink opened"
+        self.flush()
+
+
+class NullTrace(TraceSink):
+    "No trace: the interpreter does not even make the events"
+    enabled = False
+
+
+class TextTrace(TraceSink):
+    """The text trace riv prints: each glyph's id and non-empty lists or, if verbose,
+    the glyph, its pseudo-code and the whole state
+
+    stream: where to write (sys.stdout, as it is when flushed, by default)
+    buffer_size: characters held back before writing
+    """
+
+    def __init__(self, stream=None, verbose=False, buffer_size=1 << 16):
+        self.stream = stream
+        self.transpiler = PythonTranspiler() if verbose else None
+        self.buffer_size = buffer_size
+        self.__buffer = []
+        self.__buffered = 0
+
+    def glyph(self, event):
+        text = event.verbose(self.transpiler) if self.transpiler else event.summary()
+        self.__buffer.append(text)
+        self.__buffered += len(text)
+        if self.__buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.__buffer:
+            stream = self.stream or sys.stdout
+            stream.write("".join(self.__buffer))
+            stream.flush()
+            self.__buffer = []
+            self.__buffered = 0
+
+
+class JsonLinesTrace(TraceSink):
+    "One JSON object per glyph run (see GlyphEvent.to_json), to a file or an open text stream"
+
+    def __init__(self, file):
+        if hasattr(file, "write"):
+            self.file = file
+            self.owned = False
+        else:
+            self.file = open(file, "w", encoding="utf-8") # pylint: disable=consider-using-with
+            self.owned = True
+
+    def glyph(self, event):
+        self.file.write(json.dumps(event.to_json()) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.owned:
+            self.file.close()
+        else:
+            self.flush()
+
+
+class SampledTrace(TraceSink):
+    """Passes on only some events to another sink
+
+    every: pass on every nth glyph run
+    rollbacks_only: pass on only glyphs whose question marker rolls their block back
+    """
+
+    def __init__(self, sink:TraceSink, every=1, rollbacks_only=False):
+        self.sink = sink
+        self.every = every
+        self.rollbacks_only = rollbacks_only
+        self.enabled = sink.enabled
+        self.seen = 0
+
+    def glyph(self, event):
+        if self.rollbacks_only:
+            if event.outcome.name == "rollback":
+                self.sink.glyph(event)
+            return
+        self.seen += 1
+        if self.seen % self.every == 0:
+            self.sink.glyph(event)
+
+    def flush(self):
+        self.sink.flush()
+
+    def close(self):
+        self.sink.close()
+
+
+class LoggingTrace(TraceSink):
+    "Each glyph's summary (or verbose text) as a debug message, formatted only if the logger will emit it"
+
+    def __init__(self, logger=None, verbose=False, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger("rivulet.trace")
+        self.transpiler = PythonTranspiler() if verbose else None
+        self.level = level
+
+    def glyph(self, event):
+        if self.logger.isEnabledFor(self.level):
+            text = event.verbose(self.transpiler) if self.transpiler else event.summary()
+            self.logger.log(self.level, "%s", text.rstrip("\n"))
@@ -0,0 +1,118 @@
+"""List commands over whole lists at once with NumPy, when it is installed
+
+new_values gives the new value of every cell of a list after a list or list to
+list command, computed as one array operation. It gives None whenever the array
+result could differ from the cell-by-cell Python one: lists of big ints, of ints
+and floats mixed, or of anything other than numbers; a divisor of zero (Python
+raises); a result that could overflow 64 bits; or roots and powers of floats,
+which NumPy rounds differently from Python. The caller then runs the command
+cell by cell, as it would without NumPy.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from rivulet.riv_tokens import Command
+
+AVAILABLE = numpy is not None
+
+# lists shorter than this are quicker cell by cell than converted to arrays
+MIN_CELLS = 64
+
+# ints up to this size convert to floats exactly, and sum without overflow
+_EXACT = 2 ** 53
+
+_OPERATIONS = {} if numpy is None else {
+    Command.addition_assignment: numpy.add,
+    Command.subtraction_assignment: numpy.subtract,
+    Command.reverse_subtraction_assignment: lambda initial, assign: numpy.subtract(assign, initial),
+    Command.multiplication_assignment: numpy.multiply,
+    Command.division_assignment: numpy.true_divide,
+    Command.reverse_division_assignment: lambda initial, assign: numpy.true_divide(assign, initial),
+    Command.mod_assignment: numpy.remainder,
+    Command.reverse_mod_assignment: lambda initial, assign: numpy.remainder(assign, initial),
+    Command.exponent_assignment: numpy.power,
+}
+
+# the operand the command divides by, if any
+_DIVISOR = {
+    Command.division_assignment: "assign",
+    Command.reverse_division_assignment: "initial",
+    Command.mod_assignment: "assign",
+    Command.reverse_mod_assignment: "initial",
+}
+
+
+def new_values(command, target, assign):
+    """The new values of target's cells, with assign (a number, or a list as long as
+    target) applied to each by command; or None to run the command cell by cell"""
+    if numpy is None or len(target) < MIN_CELLS:
+        return None
+    if command == Command.overwrite:
+        if isinstance(assign, list):
+            return list(assign) if len(assign) == len(target) else None
+        return [assign] * len(target)
+    operation = _OPERATIONS.get(command)
+    if operation is None:
+        return None
+
+    initial = _array(target)
+    if initial is None:
+        return None
+    if isinstance(assign, list):
+        if len(assign) != len(target):
+            return None
+        assign = _array(assign)
+        if assign is None:
+            return None
+    elif type(assign) not in (int, float) or (type(assign) is int and abs(assign) >= _EXACT):
+        return None
+
+    is_float = initial.dtype.kind == "f" or _is_float(assign)
+    if command == Command.exponent_assignment:
+        if is_float or numpy.min(assign) < 0:
+            return None
+        # |initial| ** assign must fit in 63 bits
+        base = _magnitude(initial)
+        if base > 1 and base.bit_length() * int(numpy.max(assign)) > 62:
+            return None
+    elif command == Command.multiplication_assignment and not is_float:
+        if _magnitude(initial) * _magnitude(assign) >= 2 ** 63:
+            return None
+
+    divisor = _DIVISOR.get(command)
+    if divisor is not None and not numpy.all(initial if divisor == "initial" else assign):
+        return None
+
+    # floats overflow to inf quietly in Python, so they do here too
+    with numpy.errstate(all="ignore"):
+        return operation(initial, assign).tolist()
+
+
+def _array(values):
+    "values as an array of int64 or float64, or None if that would change them"
+    try:
+        array = numpy.array(values)
+    except (OverflowError, ValueError):
+        return None
+    if array.dtype == numpy.int64:
+        if array.size and _magnitude(array) >= _EXACT:
+            return None
+        return array
+    if array.dtype == numpy.float64 and all(type(v) is float for v in values):
+        return array
+    return None
+
+
+def _magnitude(values) -> int:
+    "Largest absolute value in values (an int64 array or an int)"
+    if isinstance(values, int):
+        return abs(values)
+    return max(-int(numpy.min(values)), int(numpy.max(values)))
+
+
+def _is_float(assign) -> bool:
+    if isinstance(assign, float):
+        return True
+    return not isinstance(assign, int) and assign.dtype.kind == "f"
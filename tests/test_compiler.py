@@ -0,0 +1,59 @@
+# pylint: skip-file
+"""
+Test compiled execution plans against the tree-walking interpreter
+"""
+import pytest
+from pathlib import Path
+from rivulet.riv_compiler import Action, compile_glyph
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_tokens import Command, Glyph, Subtype, Token, TokenType
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+def _trace(program, engine):
+    states = []
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.engine = engine
+    intr.interpret_program(program, False, states.append)
+    return states
+
+@pytest.mark.parametrize("name", sorted(p.name for p in PROGRAMS.glob("*.riv")))
+def test_compiled_matches_tree(name, capsys):
+    program = (PROGRAMS / name).read_text(encoding="utf-8")
+    assert _trace(program, Interpreter.Engine.compiled) == _trace(program, Interpreter.Engine.tree)
+
+def test_plans_are_tuples_of_callables(capsys):
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.interpret_program((PROGRAMS / "fibonacci1.riv").read_text(encoding="utf-8"), False)
+    assert intr.plans
+    for plan in intr.plans.values():
+        assert isinstance(plan, tuple)
+        assert all(callable(step) for step in plan)
+
+def test_tree_engine_compiles_nothing(capsys):
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.engine = Interpreter.Engine.tree
+    intr.interpret_program((PROGRAMS / "fibonacci1.riv").read_text(encoding="utf-8"), False)
+    assert intr.plans == {}
+
+def test_element_command_bound():
+    action = Token(type=TokenType.action, subtype=Subtype.element, command=Command.reverse_subtraction_assignment)
+    token = Token(type=TokenType.data, subtype=Subtype.value, value=10, list=2, assign_to_cell=1, action=action)
+    step, = compile_glyph(Glyph(tokens=[token]), None)
+    state = {1: [], 2: [4]}
+    assert step(state) is None
+    # the missing cell is padded with zero before the command applies
+    assert state[2] == [4, 10]
+
+def test_unknown_question_falls_back():
+    token = Token(type=TokenType.question_marker, subtype=Subtype.first)
+    seen = []
+    def reference(tok, state):
+        seen.append(tok)
+        return Action.cont
+    step, = compile_glyph(Glyph(tokens=[token]), reference)
+    assert step({}) is Action.cont
+    assert seen == [token]
@@ -0,0 +1,117 @@
+# pylint: skip-file
+"""
+Test the zero and negative counts kept for list questions
+"""
+import copy
+import random
+import pytest
+from rivulet.riv_counted import CountedList, list_question, scan
+from rivulet.riv_exceptions import InternalError
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_journal import JournalRollback, SnapshotRollback
+from rivulet.riv_state import State
+from rivulet.riv_tokens import Command, Glyph, Subtype, Token, TokenType
+
+def _change(values, rng):
+    "One random change, of the kinds the interpreter makes"
+    op = rng.randrange(6)
+    if op == 0 and values:
+        values[rng.randrange(-len(values), len(values))] += rng.randrange(-5, 5)
+    elif op == 1:
+        values.append(rng.randrange(10))
+    elif op == 2:
+        values.insert(rng.randrange(-3, len(values) + 3), rng.randrange(10))
+    elif op == 3 and values:
+        values.pop(rng.randrange(-len(values), len(values)))
+    elif op == 4:
+        values.extend([0] * rng.randrange(3))
+    elif op == 5 and values:
+        del values[rng.randrange(len(values))]
+
+def _counts(values):
+    return (values.zeros, values.negatives, values.unordered)
+
+def _fresh(values):
+    return _counts(CountedList(values))
+
+@pytest.mark.parametrize("values, succeeds", [
+    ([], False), ([0, 0], False), ([0, 3], True), ([2, -1], False), ([0.5], True), ([float("nan")], True)])
+def test_counts_answer_as_a_scan_would(values, succeeds):
+    assert CountedList(values).positive() == scan(values) == succeeds
+
+def test_counts_follow_every_change():
+    rng = random.Random(7)
+    values = CountedList([0, -1, 2])
+    for _ in range(500):
+        _change(values, rng)
+        assert _counts(values) == _fresh(values)
+    values[1:3] = [0, 0, -4]
+    values += [-1, 0]
+    values *= 2
+    assert _counts(values) == _fresh(values)
+    values.clear()
+    assert _counts(values) == (0, 0, 0)
+
+@pytest.mark.parametrize("strategy", [JournalRollback, SnapshotRollback])
+def test_rollback_restores_counts(strategy):
+    rng = random.Random(5)
+    rollback = strategy()
+    state = State([1, 2])
+    state.of(1).extend([0, -2, 4])
+    state = rollback.track(state)
+    for _ in range(100):
+        savepoint = rollback.savepoint(state)
+        for _ in range(rng.randrange(20)):
+            _change(state.of(rng.choice([1, 2])), rng)
+        state = rollback.rollback(state, savepoint)
+        rollback.discard(savepoint)
+        assert all(_counts(values) == _fresh(values) for values in state)
+
+def test_copies_keep_counts():
+    values = CountedList([0, -3, 5])
+    assert type(copy.deepcopy(values)) is CountedList
+    assert _counts(copy.copy(values)) == _counts(values)
+
+def test_unordered_values_scan():
+    values = CountedList([1, None])
+    with pytest.raises(TypeError):
+        values.positive()
+    values.pop()
+    assert values.positive()
+
+def test_checked_counts_catch_drift():
+    values = CountedList([0, 1])
+    values.zeros = 2
+    assert not list_question(values)
+    with pytest.raises(InternalError):
+        list_question(values, True)
+    assert list_question(values)
+
+def _sign_flip(n):
+    "list2 = [1, 2 ... n], then a while block taking 1 from each cell until a list question on it fails"
+    fill = [Token(type=TokenType.data, subtype=Subtype.value, value=i + 1, list=2, assign_to_cell=i, action=None)
+            for i in range(n)]
+    step = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=2, assign_to_cell=0,
+                 action=Token(type=TokenType.action, subtype=Subtype.list, command=Command.subtraction_assignment))
+    count = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=1, assign_to_cell=0, action=None)
+    question = Token(type=TokenType.question_marker, subtype=Subtype.first, applies_to="list",
+                     ref_list=2, block_type="while")
+    return [
+        Glyph(level=1, tokens=fill, list_size=3, glyph=[[" "]]),
+        Glyph(level=2, tokens=[step, count, question], list_size=3, glyph=[[" "]]),
+    ]
+
+@pytest.mark.parametrize("engine", list(Interpreter.Engine))
+@pytest.mark.parametrize("rollback", list(Interpreter.Rollback))
+def test_list_questions_in_loops(engine, rollback):
+    states = []
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.engine = engine
+    intr.rollback = rollback
+    intr.check_counts = True
+    intr.interpret_glyphs(_sign_flip(50), states.append)
+    final = states[-1]
+    # the pass taking list2[0] to zero leaves a zero and no negatives, so succeeds; the next fails
+    assert final[2] == [i for i in range(50)]
+    assert final[1] == [1]
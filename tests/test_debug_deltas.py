@@ -0,0 +1,111 @@
+# pylint: skip-file
+"""
+Test debug callbacks that take deltas rather than copies of the state
+"""
+import random
+import pytest
+from pathlib import Path
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_journal import ChangeRecord, JournalRollback, StateDelta
+from rivulet.riv_state import State
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+def _apply(state, change):
+    "Make a change to a plain copy of the state"
+    values = state[change.list_id]
+    if change.kind == "set":
+        assert values[change.index] == change.old
+        values[change.index] = change.new
+    elif change.kind in ("append", "insert"):
+        values.insert(change.index, change.new)
+    elif change.kind == "pop":
+        assert values.pop(change.index) == change.old
+    elif change.kind == "extend":
+        assert len(values) == change.index
+        values.extend(change.new)
+    elif change.kind == "truncate":
+        assert tuple(values[change.index:]) == tuple(change.old)
+        del values[change.index:]
+    else:
+        assert values == change.old
+        values[:] = change.new
+
+def _run(name, deltas, engine=Interpreter.Engine.compiled):
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.engine = engine
+    intr.debug_deltas = deltas
+    calls = []
+    intr.interpret_program((PROGRAMS / name).read_text(encoding="utf-8"), False, calls.append)
+    return calls
+
+@pytest.mark.parametrize("engine", [Interpreter.Engine.compiled, Interpreter.Engine.tree])
+@pytest.mark.parametrize("name", sorted(p.name for p in PROGRAMS.glob("*.riv")))
+def test_deltas_replay_to_snapshots(name, engine, capsys):
+    snapshots = _run(name, False, engine)
+    deltas = _run(name, True, engine)
+    assert len(deltas) == len(snapshots)
+    assert all(isinstance(d, StateDelta) for d in deltas)
+    assert deltas[-1].glyph is None
+
+    state = dict((list_id, []) for list_id in snapshots[0])
+    for delta, snapshot in zip(deltas, snapshots):
+        for change in delta.changes:
+            _apply(state, change)
+        assert state == snapshot
+
+def test_materialize_full_state():
+    seen = []
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.debug_deltas = True
+    intr.interpret_program((PROGRAMS / "fibonacci1.riv").read_text(encoding="utf-8"), False,
+                           lambda delta: seen.append((delta.glyph, delta.state())))
+    snapshots = _run("fibonacci1.riv", False)
+    assert [s for _, s in seen] == snapshots
+    assert seen[0][0] == 0
+    assert type(seen[0][1][2]) is list
+
+def test_rollback_is_reported_as_changes():
+    # fibonacci1's glyph 4 finally rolls its block back, undoing its own change first
+    deltas = _run("fibonacci1.riv", True)
+    assert [d.glyph for d in deltas[-3:]] == [4, 5, None]
+    assert deltas[-3].changes[-1] == ChangeRecord("set", 3, 2, 21, 0)
+    assert deltas[-2].changes[0] == ChangeRecord("set", 3, 2, 0, 21)
+
+@pytest.mark.parametrize("rollback, engine", [
+    (Interpreter.Rollback.snapshot, Interpreter.Engine.compiled),
+    (Interpreter.Rollback.journal, Interpreter.Engine.python)])
+def test_deltas_need_the_journal(rollback, engine):
+    intr = Interpreter()
+    intr.rollback = rollback
+    intr.engine = engine
+    intr.debug_deltas = True
+    with pytest.raises(ValueError):
+        intr.interpret_program((PROGRAMS / "zero.riv").read_text(encoding="utf-8"), False, lambda delta: None)
+
+def test_reporting_keeps_unreported_changes():
+    rng = random.Random(5)
+    rollback = JournalRollback(reporting=True)
+    state = State([1, 2])
+    state.of(1).extend([1, 2])
+    state = rollback.track(state)
+    shadow = state.copy_lists()
+    for _ in range(300):
+        savepoint = rollback.savepoint(state)
+        for _ in range(rng.randrange(6)):
+            values = state.of(rng.choice([1, 2]))
+            if values and rng.random() < 0.5:
+                values[rng.randrange(len(values))] += 1
+            elif values and rng.random() < 0.3:
+                values.pop(0)
+            else:
+                values.extend([0] * rng.randrange(3))
+        if rng.random() < 0.3:
+            rollback.rollback(state, savepoint)
+        rollback.discard(savepoint)
+        if rng.random() < 0.5:
+            for change in rollback.changes():
+                _apply(shadow, change)
+            assert shadow == state.copy_lists()
@@ -3,7 +3,10 @@
 Test glyph locating and separation
 """
 import copy
+import math
+import random
 import pytest
+from rivulet.riv_exceptions import RivuletSyntaxError
 from rivulet.riv_parser import Parser
 
 def _prepare(glyph):
@@ -436,3 +439,50 @@ def test_levels_really_big_whitespace():
     assert glyph_locs[2]['start'] == {"y": 3, "x": 5}
     assert glyph_locs[2]['end'] == {"y": 8, "x": 14}
     assert glyph_locs[2]['level'] == 2
+
+def _reference_match(starts, ends):
+    "The original pairwise matcher, kept to check the indexed one against"
+    matches = []
+    for e in ends:
+        possible_starts = []
+        for s in [s for s in starts if s['x'] < e['x'] and s['y'] < e['y']]:
+            in_betweens = [os for os in starts if os['x'] >= s['x'] and os['x'] <= e['x'] and os['y'] >= s['y'] and os['y'] <= e['y'] and s != os]
+            if len(in_betweens) == 0:
+                possible_starts.append(s)
+        if not possible_starts:
+            return f"End glyph at {e['x']}, {e['y']} has no corresponding Start"
+        closest_start = min(possible_starts, key=lambda s: math.dist([s["x"], s["y"]], [e["x"], e["y"]]))
+        level = closest_start["level"]
+        del closest_start["level"]
+        matches.append({"start": closest_start, "end": e, "level": level})
+        starts.remove(closest_start)
+    if len(starts) > 0:
+        return f"Start glyph at {starts[0]['x']}, {starts[0]['y']} has no matching end"
+    return sorted(matches, key=lambda x: (x["start"]['y'], x["start"]['x']))
+
+def test_match_starts_ends_same_as_reference():
+    "Random layouts of Starts and Ends pair up (or fail) exactly as the pairwise matcher did"
+    rnd = random.Random(7)
+    lexr = Parser()
+    for _ in range(500):
+        size = rnd.randint(2, 12)
+        cells = rnd.sample([(x, y) for x in range(size) for y in range(size)], rnd.randint(1, min(16, size * size)))
+        split = rnd.randint(0, len(cells))
+        starts = sorted(({"x": x, "y": y, "level": rnd.randint(1, 3)} for x, y in cells[:split]), key=lambda s: (s["y"], s["x"]))
+        ends = sorted(({"x": x, "y": y} for x, y in cells[split:]), key=lambda e: (e["y"], e["x"]))
+
+        expected = _reference_match(copy.deepcopy(starts), copy.deepcopy(ends))
+        try:
+            actual = lexr._Parser__match_starts_ends(starts, ends)
+        except RivuletSyntaxError as err:
+            actual = str(err).removeprefix("SYNTAX ERROR: ")
+        assert actual == expected
+
+def test_match_thousands_of_glyphs():
+    "A grid of 60x60 glyph markers pairs each end with the start diagonally above it"
+    lexr = Parser()
+    starts = [{"x": 3 * i, "y": 3 * j, "level": 1} for j in range(60) for i in range(60)]
+    ends = [{"x": 3 * i + 2, "y": 3 * j + 2} for j in range(60) for i in range(60)]
+    matches = lexr._Parser__match_starts_ends(starts, ends)
+    assert len(matches) == 3600
+    assert all(m["end"]["x"] == m["start"]["x"] + 2 and m["end"]["y"] == m["start"]["y"] + 2 for m in matches)
@@ -446,3 +446,14 @@ def test_question_strand_while_1():
     assert block["tokens"][0]["applies_to"] == "list"
     assert block["tokens"][0]["block_type"] == "while"
     assert block["tokens"][0]["ref_list"] == 1
+
+def test_many_strands_per_row():
+    "Hundreds of strands in a row keep their cell order and ref cells"
+    n = 2000
+    values = "╵" + "╰─╮" * n + "\n" + " " + " ─┘" * n + "\n" + " " * (3 * n + 1) + "╷\n"
+    tokens = Parser().parse_program(values)[0]["tokens"]
+    assert [t["assign_to_cell"] for t in tokens] == list(range(n))
+
+    refs = "╵" + "╰─╮" * n + "\n" + " " + "╴─┘" * n + "\n" + " " * (3 * n + 1) + "╷\n"
+    tokens = Parser().parse_program(refs)[0]["tokens"]
+    assert all(t["subtype"] == "ref" and t["ref_cell"] == [2, 0] for t in tokens)
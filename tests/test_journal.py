@@ -0,0 +1,83 @@
+# pylint: skip-file
+"""
+Test rolling state back through the journal
+"""
+import copy
+import random
+import pytest
+from pathlib import Path
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_journal import JournaledList, JournalRollback
+from rivulet.riv_state import State
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+def _state(lists):
+    "A State holding copies of lists, a dict of them by list id"
+    state = State(lists.keys())
+    for list_id, values in lists.items():
+        state.of(list_id).extend(values)
+    return state
+
+def _change(values, rng):
+    "One random change, of the kinds the interpreter makes"
+    op = rng.randrange(6)
+    if op == 0 and values:
+        values[rng.randrange(-len(values), len(values))] += rng.randrange(-5, 5)
+    elif op == 1:
+        values.append(rng.randrange(10))
+    elif op == 2:
+        values.insert(rng.randrange(-3, len(values) + 3), rng.randrange(10))
+    elif op == 3 and values:
+        values.pop(rng.randrange(-len(values), len(values)))
+    elif op == 4:
+        values.extend([0] * rng.randrange(3))
+    elif op == 5 and values:
+        del values[rng.randrange(len(values))]
+
+def test_nested_rollbacks_restore_state():
+    rng = random.Random(3)
+    rollback = JournalRollback()
+    state = rollback.track(_state({1: [1, 2, 3], 2: [], 3: [5]}))
+
+    for _ in range(200):
+        saved = copy.deepcopy(state)
+        outer = rollback.savepoint(state)
+        for _ in range(rng.randrange(20)):
+            _change(state.of(rng.choice([1, 2, 3])), rng)
+        middle = copy.deepcopy(state)
+        inner = rollback.savepoint(state)
+        for _ in range(rng.randrange(20)):
+            _change(state.of(rng.choice([1, 2, 3])), rng)
+
+        assert rollback.rollback(state, inner) == middle
+        if rng.random() < 0.5:
+            assert rollback.rollback(state, outer) == saved
+
+def test_journaled_lists_copy_as_lists():
+    values = JournaledList([], [1, 2])
+    assert type(copy.deepcopy(values)) is list
+    assert type(copy.copy(values)) is list
+    assert copy.deepcopy({1: values}) == {1: [1, 2]}
+
+def test_release_returns_plain_lists():
+    rollback = JournalRollback()
+    state = rollback.track(_state({1: [4]}))
+    state.of(1).append(5)
+    released = rollback.release(state)
+    assert released == {1: [4, 5]}
+    assert type(released[1]) is list
+    assert rollback.journal == []
+
+@pytest.mark.parametrize("name", ["fibonacci1.riv", "primeTester.riv", "hello.riv"])
+def test_strategies_agree(name, capsys):
+    program = (PROGRAMS / name).read_text(encoding="utf-8")
+    traces = []
+    for strategy in Interpreter.Rollback:
+        states = []
+        intr = Interpreter()
+        intr.output = Interpreter.OutputOption.numeric
+        intr.rollback = strategy
+        intr.interpret_program(program, False, states.append)
+        traces.append(states)
+    assert traces[0] == traces[1]
@@ -0,0 +1,47 @@
+# pylint: skip-file
+"""
+Test the compiled lexicon and command tables
+"""
+import copy
+import pytest
+from rivulet.riv_lexicon import DIR_BIT, compile_lexicon
+from rivulet.riv_parser import Parser
+
+def test_lexicon_compiled_once():
+    "Every Parser shares the same compiled tables"
+    assert Parser().lex is Parser().lex
+    assert compile_lexicon() is Parser().lex
+
+def test_lookup_by_char():
+    lex = compile_lexicon()
+    assert lex.by_char["╮"]["name"] == "dl_corner"
+    assert lex.by_char["┐"] is lex.by_char["╮"]
+    assert " " not in lex.by_char
+    assert lex.symbols_by_name["start_glyph"] == ("╵",)
+
+def test_direction_masks():
+    lex = compile_lexicon()
+    assert lex.connects["─"] == DIR_BIT["left"] | DIR_BIT["right"]
+    # pre_start readings are decorative and do not join
+    assert lex.connects["╴"] == DIR_BIT["left"] | DIR_BIT["right"]
+    assert lex.joins["╴"] == DIR_BIT["right"]
+
+def test_readings_by_pos_and_type():
+    lex = compile_lexicon()
+    assert lex.readings_by_pos["│"]["continue"]["dir"] == ["up", "down"]
+    assert len(lex.readings_by_type["╷"]["question_marker"]) == 1
+    assert lex.start_readings["╭"]["down"][0]["type"] == "action"
+    assert lex.path_reading["╷"]["type"] == "question_marker"
+
+def test_commands_split_and_frozen():
+    lex = compile_lexicon()
+    assert lex.command(1, False)["name"] == "insert"
+    assert lex.command(1, True)["name"] == "append"
+    assert lex.command(2, True) is lex.command(2, False)
+    assert "list" not in lex.command(3, False)
+    assert lex.command(99, False) is None
+
+    cmd = lex.command(2, False)
+    with pytest.raises(TypeError):
+        cmd["name"] = "overwrite"
+    assert copy.deepcopy(cmd) is cmd
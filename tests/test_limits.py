@@ -0,0 +1,119 @@
+# pylint: skip-file
+"""
+Test the limits on a program's run
+"""
+import pickle
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+from rivulet.riv_exceptions import LimitExceeded
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_limits import Limits, bounded_power, bounded_product
+from rivulet.riv_tokens import Command, Glyph, Subtype, Token, TokenType
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+ENGINES = list(Interpreter.Engine)
+
+def _run(glyphs, limits, engine=Interpreter.Engine.compiled):
+    intr = Interpreter()
+    intr.engine = engine
+    intr.limits = limits
+    intr.interpret_glyphs(glyphs)
+
+def _countdown(n):
+    "list2[0] = n, then a while block taking 1 from it and adding 1 to list1[0] until it reaches 0"
+    start = Token(type=TokenType.data, subtype=Subtype.value, value=n, list=2, assign_to_cell=0, action=None)
+    step = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=2, assign_to_cell=0,
+                 action=Token(type=TokenType.action, subtype=Subtype.element, command=Command.subtraction_assignment))
+    count = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=1, assign_to_cell=0, action=None)
+    question = Token(type=TokenType.question_marker, subtype=Subtype.first, applies_to="cell",
+                     ref_cell=[2, 0], block_type="while")
+    return [
+        Glyph(level=1, tokens=[start], list_size=3, glyph=[[" "]]),
+        Glyph(level=2, tokens=[step, count, question], list_size=3, glyph=[[" "]]),
+    ]
+
+def _squaring(n):
+    "list2[0] = n, then a while block squaring it and counting passes in list1[0], for ever"
+    square = Token(type=TokenType.data, subtype=Subtype.ref, ref_cell=[2, 0], list=2, assign_to_cell=0,
+                   action=Token(type=TokenType.action, subtype=Subtype.element, command=Command.multiplication_assignment))
+    count = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=1, assign_to_cell=0, action=None)
+    question = Token(type=TokenType.question_marker, subtype=Subtype.first, applies_to="cell",
+                     ref_cell=[2, 0], block_type="while")
+    return [
+        Glyph(level=1, list_size=3, glyph=[[" "]], tokens=[
+            Token(type=TokenType.data, subtype=Subtype.value, value=n, list=2, assign_to_cell=0, action=None)]),
+        Glyph(level=2, list_size=3, glyph=[[" "]], tokens=[square, count, question]),
+    ]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_glyph_limit(engine):
+    with pytest.raises(LimitExceeded) as caught:
+        _run(_countdown(1000), Limits(glyphs=100), engine)
+    error = caught.value
+    assert (error.limit, error.bound, error.glyph_runs) == ("glyphs", 100, 101)
+    assert error.glyph == 1
+    assert error.state[1][0] + error.state[2][0] == 1000
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_token_limit(engine):
+    with pytest.raises(LimitExceeded) as caught:
+        _run(_countdown(1000), Limits(tokens=31), engine)
+    # one token, then three a pass
+    assert caught.value.limit == "tokens"
+    assert caught.value.token_runs == 34
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_int_bits_stop_squaring(engine):
+    with pytest.raises(LimitExceeded) as caught:
+        _run(_squaring(3), Limits(int_bits=4096), engine)
+    error = caught.value
+    assert error.limit == "int_bits" and error.glyph == 1
+    # 3 ** 2 ** 11 is the largest square under 4096 bits
+    assert error.state[2] == [3 ** 2 ** 11]
+    assert error.state[1] == [11]
+
+def test_time_and_cell_checks_are_amortized():
+    with pytest.raises(LimitExceeded) as caught:
+        _run(_countdown(10 ** 6), Limits(seconds=0, interval=50))
+    assert caught.value.limit == "seconds" and caught.value.glyph_runs == 50
+
+def test_no_limits_no_budget():
+    intr = Interpreter()
+    intr.interpret_glyphs(_countdown(10))
+    assert intr.budget is None
+
+@pytest.mark.parametrize("initial, assign", [(3, 7), (-5, 12), (2 ** 30, 2 ** 3), (7, 0), (1.5, 3), (0, 10 ** 9)])
+def test_bounded_kernels_agree_within_bounds(initial, assign):
+    assert bounded_product(initial, assign, 256) == initial * assign
+    assert bounded_power(initial, assign, 256) == initial ** assign
+
+@pytest.mark.parametrize("max_bits", [8, 63, 64, 65, 1000])
+def test_bounded_kernels_exact_at_the_bound(max_bits):
+    for a in (2 ** (max_bits // 2), 2 ** (max_bits // 2 + 1) - 1, 3, 2 ** max_bits - 1):
+        for b in (2, 3, 2 ** (max_bits // 2) + 1):
+            try:
+                product = bounded_product(a, b, max_bits)
+            except LimitExceeded:
+                assert (a * b).bit_length() > max_bits
+            else:
+                assert product.bit_length() <= max_bits
+            try:
+                power = bounded_power(a, b, max_bits) if b < 100 else None
+            except LimitExceeded:
+                assert (a ** b).bit_length() > max_bits
+            else:
+                assert power is None or power.bit_length() <= max_bits
+
+def test_limit_exceeded_pickles():
+    error = pickle.loads(pickle.dumps(LimitExceeded("cells", 10, 3, 40, 120, {1: [5]})))
+    assert (error.limit, error.glyph, error.token_runs, error.state) == ("cells", 3, 120, {1: [5]})
+    assert str(error) == "LIMIT EXCEEDED: cells over 10 in glyph 3, after 40 glyph and 120 token runs"
+
+def test_riv_flags():
+    done = subprocess.run([sys.executable, "-m", "rivulet.riv_interpreter", "--max-glyphs", "3",
+                           str(PROGRAMS / "fibonacci1.riv")], capture_output=True, text=True)
+    assert done.returncode == 1
+    assert done.stderr.startswith("LIMIT EXCEEDED: glyphs over 3")
@@ -0,0 +1,43 @@
+# pylint: skip-file
+"""
+Test long-running while loops
+"""
+import pytest
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_tokens import Command, Glyph, Subtype, Token, TokenType
+
+def _countdown(n):
+    "list2[0] = n, then a while block taking 1 from it and adding 1 to list1[0] until it reaches 0"
+    start = Token(type=TokenType.data, subtype=Subtype.value, value=n, list=2, assign_to_cell=0, action=None)
+    step = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=2, assign_to_cell=0,
+                 action=Token(type=TokenType.action, subtype=Subtype.element, command=Command.subtraction_assignment))
+    count = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=1, assign_to_cell=0, action=None)
+    question = Token(type=TokenType.question_marker, subtype=Subtype.first, applies_to="cell",
+                     ref_cell=[2, 0], block_type="while")
+    return [
+        Glyph(level=1, tokens=[start], list_size=3, glyph=[[" "]]),
+        Glyph(level=2, tokens=[step, count, question], list_size=3, glyph=[[" "]]),
+    ]
+
+@pytest.mark.parametrize("engine", list(Interpreter.Engine))
+@pytest.mark.parametrize("rollback", list(Interpreter.Rollback))
+def test_long_loop_runs_in_constant_stack(engine, rollback):
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.engine = engine
+    intr.rollback = rollback
+    final = []
+    intr.interpret_glyphs(_countdown(5000), final.append)
+    # the last iteration takes list2[0] to zero, so fails and is rolled back
+    assert final[-1][2] == [1]
+    assert final[-1][1] == [4999]
+
+def test_journal_stays_small():
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    longest = 0
+    def callback(state):
+        nonlocal longest
+        longest = max(longest, len(intr.states.journal))
+    intr.interpret_glyphs(_countdown(5000), callback)
+    assert longest < 20
@@ -0,0 +1,39 @@
+# pylint: skip-file
+"""
+Test lexing glyphs across worker processes
+"""
+import pickle
+import pytest
+from pathlib import Path
+from rivulet.riv_parser import Parser
+from rivulet.riv_exceptions import RivuletSyntaxError
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+def _all_programs():
+    return "\n\n".join(p.read_text(encoding="utf-8").strip("\n") for p in sorted(PROGRAMS.glob("*.riv")))
+
+def test_parallel_matches_serial():
+    program = _all_programs()
+    serial = Parser().parse_program(program)
+    parallel = Parser(workers=2, parallel_min_glyphs=1).parse_program(program)
+    assert parallel == serial
+    assert [g["end_loc"] for g in parallel] == [g["end_loc"] for g in serial]
+
+def test_small_programs_stay_serial(monkeypatch):
+    program = (PROGRAMS / "fibonacci1.riv").read_text(encoding="utf-8")
+    def fail(*args):
+        raise AssertionError("parsed in parallel")
+    monkeypatch.setattr(Parser, "_Parser__lex_glyphs_in_parallel", fail)
+    assert Parser(workers=4).parse_program(program) == Parser().parse_program(program)
+
+def test_worker_errors_propagate():
+    program = _all_programs() + "\n\n╵╰─╮\n   │\n   ╰─╮\n   ╰─┘╷\n"
+    with pytest.raises(RivuletSyntaxError) as err:
+        Parser(workers=2, parallel_min_glyphs=1).parse_program(program)
+    assert str(err.value).startswith("SYNTAX ERROR: ")
+    assert not str(err.value).startswith("SYNTAX ERROR: SYNTAX ERROR")
+
+def test_syntax_error_pickles():
+    err = pickle.loads(pickle.dumps(RivuletSyntaxError("Bad strand")))
+    assert str(err) == "SYNTAX ERROR: Bad strand"
@@ -0,0 +1,102 @@
+# pylint: skip-file
+"""
+Test the on-disk parse cache
+"""
+import json
+import os
+import zlib
+import pytest
+from pathlib import Path
+from rivulet.riv_cache import CACHE_SUFFIX, CODE_SUFFIX, ParseCache
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_parser import Parser
+from rivulet.riv_tokens import Token, TokenType
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+def _program(name):
+    return (PROGRAMS / name).read_text(encoding="utf-8")
+
+def test_cached_parse_matches_parser(tmp_path):
+    cache = ParseCache(tmp_path)
+    program = _program("fibonacci1.riv")
+    first = cache.parse(program)
+    second = cache.parse(program)
+    assert cache.misses == 1
+    assert cache.hits == 1
+    assert Parser().parse_program(program) == second
+    assert first == second
+    assert type(second[0]["tokens"][0]) is Token
+    assert second[0]["tokens"][0].type is TokenType.data
+
+def test_key_depends_on_program(tmp_path):
+    cache = ParseCache(tmp_path)
+    assert cache.key(_program("hello.riv")) != cache.key(_program("helloCompact.riv"))
+    assert cache.key(_program("hello.riv")) == ParseCache(tmp_path / "other").key(_program("hello.riv"))
+
+def test_interpreter_uses_cache(tmp_path):
+    intr = Interpreter()
+    intr.cache = ParseCache(tmp_path)
+    st = None
+
+    def callback(state):
+        nonlocal st
+        st = state
+
+    for _ in range(2):
+        intr.interpret_program(_program("fibonacci1.riv"), False, callback)
+        assert st[1] == [0, 1, 1, 2, 3, 5, 8, 13, 21]
+    assert intr.cache.hits == 1
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = ParseCache(tmp_path)
+    program = _program("zero.riv")
+    (tmp_path / f"{cache.key(program)}{CACHE_SUFFIX}").write_bytes(b"not a cache entry")
+    assert cache.parse(program)
+    assert cache.misses == 1
+    assert cache.parse(program)
+    assert cache.hits == 1
+
+@pytest.mark.parametrize("data", [[1, 2], {"level": 1}, [{"tokens": [1]}], "glyphs"])
+def test_entry_of_the_wrong_shape_is_a_miss(tmp_path, data):
+    cache = ParseCache(tmp_path)
+    program = _program("zero.riv")
+    (tmp_path / f"{cache.key(program)}{CACHE_SUFFIX}").write_bytes(zlib.compress(json.dumps(data).encode("utf-8")))
+    assert cache.load(cache.key(program)) is None
+    assert cache.parse(program) == Parser().parse_program(program)
+    assert cache.misses == 1
+
+def test_eviction_keeps_cache_under_size(tmp_path):
+    cache = ParseCache(tmp_path, max_bytes=0)
+    cache.parse(_program("hello.riv"))
+    assert list(tmp_path.glob(f"*{CACHE_SUFFIX}")) == []
+
+    cache.max_bytes = 10 ** 6
+    names = ["hello.riv", "zero.riv", "fibonacci1.riv"]
+    for age, name in enumerate(names):
+        cache.parse(_program(name))
+        # make the access order unambiguous
+        path = tmp_path / f"{cache.key(_program(name))}{CACHE_SUFFIX}"
+        os.utime(path, (1000 + age, 1000 + age))
+    sizes = {name: (tmp_path / f"{cache.key(_program(name))}{CACHE_SUFFIX}").stat().st_size for name in names}
+
+    cache.max_bytes = sizes["zero.riv"] + sizes["fibonacci1.riv"]
+    cache.evict()
+    remaining = {p.name for p in tmp_path.glob(f"*{CACHE_SUFFIX}")}
+    assert remaining == {f"{cache.key(_program(n))}{CACHE_SUFFIX}" for n in ["zero.riv", "fibonacci1.riv"]}
+
+@pytest.mark.skipif(not hasattr(os, "geteuid"), reason="no owners or modes to check")
+def test_code_is_only_kept_in_a_private_directory(tmp_path):
+    code = compile("x = 1", "<test>", "exec")
+    cache = ParseCache(tmp_path / "cache")
+    assert not cache.trusted()
+    cache.store_code("k", code)
+    assert cache.trusted()
+    assert cache.load_code("k") == code
+    for mode in (0o770, 0o707):
+        cache.directory.chmod(mode)
+        assert not cache.trusted()
+        assert cache.load_code("k") is None
+    cache.directory.chmod(0o700)
+    (cache.directory / f"k{CODE_SUFFIX}").chmod(0o666)
+    assert cache.load_code("k") is None
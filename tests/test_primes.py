@@ -0,0 +1,35 @@
+# pylint: skip-file
+"""
+Test the shared prime table
+"""
+import math
+import pytest
+from rivulet.riv_primes import PrimeTable, first_primes, list_ids
+
+def _trial_division(count):
+    primes = []
+    num = 2
+    while len(primes) < count:
+        if all(num % i != 0 for i in range(2, math.isqrt(num) + 1)):
+            primes.append(num)
+        num += 1
+    return primes
+
+def test_first_primes_match_trial_division():
+    assert first_primes(2000) == _trial_division(2000)
+
+def test_segments_past_the_initial_table():
+    table = PrimeTable()
+    table.SEGMENT_SIZE = 64
+    assert table.first(500) == _trial_division(500)
+
+def test_list_ids():
+    assert list_ids(0) == []
+    assert list_ids(1) == [1]
+    assert list_ids(6) == [1, 2, 3, 5, 7, 11]
+
+def test_many_list_ids():
+    "Tall glyphs need one list id per row"
+    ids = list_ids(200000)
+    assert len(ids) == 200000
+    assert ids[-1] == 2750131
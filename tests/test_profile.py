@@ -0,0 +1,111 @@
+# pylint: skip-file
+"""
+Test the glyph profiler
+"""
+import io
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_profile import GlyphProfiler
+from rivulet.riv_tokens import Command, Glyph, Subtype, Token, TokenType
+from rivulet.riv_trace import TraceSink
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+class Recorder(TraceSink):
+    def __init__(self):
+        self.events = []
+    def glyph(self, event):
+        self.events.append((event.glyph.id, event.outcome.name))
+
+def _profile(trace=None, engine=Interpreter.Engine.compiled, rollback=Interpreter.Rollback.journal):
+    "A profile of fibonacci1.riv"
+    intr = Interpreter()
+    intr.profiler = GlyphProfiler()
+    intr.trace = trace
+    intr.engine = engine
+    intr.rollback = rollback
+    intr.interpret_program((PROGRAMS / "fibonacci1.riv").read_text(encoding="utf-8"), False)
+    return intr.profiler
+
+def _profile_loop(n):
+    "A profile of list2[0] = n, then a while block taking 1 from it and adding 1 to list1[0] until it reaches 0"
+    start = Token(type=TokenType.data, subtype=Subtype.value, value=n, list=2, assign_to_cell=0, action=None)
+    step = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=2, assign_to_cell=0,
+                 action=Token(type=TokenType.action, subtype=Subtype.element, command=Command.subtraction_assignment))
+    count = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=1, assign_to_cell=0, action=None)
+    question = Token(type=TokenType.question_marker, subtype=Subtype.first, applies_to="cell",
+                     ref_cell=[2, 0], block_type="while")
+    intr = Interpreter()
+    intr.profiler = GlyphProfiler()
+    intr.interpret_glyphs([
+        Glyph(level=1, tokens=[start], list_size=3, glyph=[[" "]]),
+        Glyph(level=2, tokens=[step, count, question], list_size=3, glyph=[[" "]]),
+    ])
+    return intr.profiler
+
+@pytest.mark.parametrize("engine", list(Interpreter.Engine))
+def test_runs_match_the_trace(engine):
+    recorder = Recorder()
+    profiler = _profile(trace=recorder, engine=engine)
+    assert len(recorder.events) == 34
+    for glyph, profile in profiler.profiles.items():
+        assert profile.runs == sum(1 for g, _ in recorder.events if g == glyph)
+        assert profile.repeats == sum(1 for g, o in recorder.events if g == glyph and o == "repeat")
+        assert profile.rollbacks == sum(1 for g, o in recorder.events if g == glyph and o == "rollback")
+    assert sum(p.runs for p in profiler.profiles.values()) == 34
+
+def test_loop_counts():
+    profiler = _profile_loop(50)
+    assert [(p.runs, p.tokens, p.repeats) for p in profiler.profiles.values()] == [(1, 1, 0), (50, 150, 49)]
+    assert profiler.stacks == {0: (0,), 1: (0, 1)}
+
+def test_cumulative_time_includes_the_block():
+    profiler = _profile_loop(50)
+    cumulative = profiler.cumulative()
+    assert cumulative[1] == pytest.approx(profiler.profiles[1].seconds)
+    assert cumulative[0] == pytest.approx(profiler.profiles[0].seconds + profiler.profiles[1].seconds)
+
+def test_copied_bytes_by_rollback():
+    snapshot = _profile(rollback=Interpreter.Rollback.snapshot)
+    assert sum(p.copied for p in snapshot.profiles.values()) > 0
+    journal = _profile(rollback=Interpreter.Rollback.journal)
+    assert sum(p.copied for p in journal.profiles.values()) == 0
+
+def test_events_are_passed_on():
+    recorder = Recorder()
+    profiler = _profile(trace=recorder)
+    assert profiler.sink is recorder
+    assert len(recorder.events) == 34
+
+def test_report_and_folded():
+    profiler = _profile_loop(50)
+    stream = io.StringIO()
+    profiler.report(stream)
+    lines = stream.getvalue().splitlines()
+    assert lines[0].split() == ["glyph", "level", "runs", "tokens", "self", "ms", "cum", "ms",
+                                "rollbacks", "repeats", "copied"]
+    assert len(lines) == 3
+    assert lines[1].split()[0] == "1"
+    assert lines[1].split()[2:4] == ["50", "150"]
+    folded = profiler.folded()
+    assert [line.rsplit(" ", 1)[0] for line in folded] == ["block 0;glyph 0", "block 0;block 1;glyph 1"]
+    assert int(folded[1].rsplit(" ", 1)[1]) > 0
+
+def test_no_profiler_no_profile(capsys):
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.interpret_program((PROGRAMS / "fibonacci1.riv").read_text(encoding="utf-8"), False)
+    assert intr.profiler is None
+    assert capsys.readouterr().out == "0 1 1 2 3 5 8 13 21\n"
+
+def test_riv_profile(tmp_path):
+    folded = tmp_path / "fib.folded"
+    result = subprocess.run([sys.executable, "-m", "rivulet.riv_interpreter", str(PROGRAMS / "fibonacci1.riv"),
+                             "-o", "numeric", "--profile", "--profile-folded", str(folded)], capture_output=True, text=True)
+    assert result.returncode == 0
+    assert result.stdout == "0 1 1 2 3 5 8 13 21\n"
+    assert result.stderr.startswith(" glyph level")
+    assert folded.read_text().startswith("block 0;")
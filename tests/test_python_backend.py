@@ -0,0 +1,169 @@
+# pylint: skip-file
+"""
+Test the Python backend against the tree-walking interpreter
+"""
+import os
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+from rivulet.riv_cache import CODE_SUFFIX, ParseCache
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_parser import Parser
+from rivulet.riv_python_backend import PythonBackend
+from rivulet.riv_tokens import Command, Glyph, Subtype, Token, TokenType
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+def _program(name):
+    return (PROGRAMS / name).read_text(encoding="utf-8")
+
+def _interpreter(engine, output=Interpreter.OutputOption.numeric, cache=None, cache_code=False):
+    intr = Interpreter()
+    intr.output = output
+    intr.engine = engine
+    intr.cache = cache
+    intr.cache_code = cache_code
+    return intr
+
+def _trace(program, engine):
+    states = []
+    _interpreter(engine).interpret_program(program, False, states.append)
+    return states
+
+def _run_glyphs(glyphs, engine):
+    states = []
+    _interpreter(engine).interpret_glyphs(glyphs, states.append)
+    return states
+
+def _output(program, engine, capsys, output=Interpreter.OutputOption.numeric, verbose=False):
+    _interpreter(engine, output).interpret_program(program, verbose)
+    return capsys.readouterr().out
+
+def _countdown_glyphs(n):
+    "A while loop moving n from list 2 to list 1, one at a time"
+    add = Token(type=TokenType.action, subtype=Subtype.element, command=Command.addition_assignment)
+    sub = Token(type=TokenType.action, subtype=Subtype.element, command=Command.subtraction_assignment)
+    return [
+        Glyph(level=1, list_size=2, tokens=[
+            Token(type=TokenType.data, subtype=Subtype.value, value=n, list=2, assign_to_cell=0, action=None)]),
+        Glyph(level=2, list_size=2, tokens=[
+            Token(type=TokenType.data, subtype=Subtype.value, value=1, list=1, assign_to_cell=0, action=add),
+            Token(type=TokenType.data, subtype=Subtype.value, value=1, list=2, assign_to_cell=0, action=sub),
+            Token(type=TokenType.question_marker, applies_to="cell", ref_cell=[2, 0], block_type="while")]),
+    ]
+
+@pytest.mark.parametrize("name", sorted(p.name for p in PROGRAMS.glob("*.riv")))
+def test_python_matches_tree(name, capsys):
+    text = _program(name)
+    assert _trace(text, Interpreter.Engine.python) == _trace(text, Interpreter.Engine.tree)
+
+@pytest.mark.parametrize("name", sorted(p.name for p in PROGRAMS.glob("*.riv")))
+def test_python_output_matches_tree(name, capsys):
+    text = _program(name)
+    for output in Interpreter.OutputOption:
+        assert _output(text, Interpreter.Engine.python, capsys, output) == _output(text, Interpreter.Engine.tree, capsys, output)
+    assert _output(text, Interpreter.Engine.python, capsys, verbose=True) == _output(text, Interpreter.Engine.tree, capsys, verbose=True)
+
+def test_modules_cached_by_program(capsys):
+    text = _program("fibonacci2.riv")
+    PythonBackend.modules.clear()
+    intr = _interpreter(Interpreter.Engine.python)
+    intr.interpret_program(text, False)
+    intr.interpret_program(text, False)
+    assert (intr.backend.misses, intr.backend.hits) == (1, 1)
+    # traced runs use a module of their own
+    intr.interpret_program(text, False, lambda state: None)
+    assert intr.backend.misses == 2
+    assert len(PythonBackend.modules) == 2
+    assert capsys.readouterr().out == "0 1 1 2 3 5 8 13 21\n" * 3
+
+def test_modules_kept_on_disk(tmp_path, capsys):
+    text = _program("fibonacci2.riv")
+    PythonBackend.modules.clear()
+    first = _interpreter(Interpreter.Engine.python, cache=ParseCache(tmp_path), cache_code=True)
+    first.interpret_program(text, False)
+    assert first.backend.misses == 1
+    assert len(list(tmp_path.glob(f"*{CODE_SUFFIX}"))) == 1
+    # as in a new process: nothing in memory
+    PythonBackend.modules.clear()
+    second = _interpreter(Interpreter.Engine.python, cache=ParseCache(tmp_path), cache_code=True)
+    second.interpret_program(text, False)
+    assert (second.backend.misses, second.backend.hits) == (0, 1)
+    assert capsys.readouterr().out == "0 1 1 2 3 5 8 13 21\n" * 2
+
+def test_unreadable_module_is_compiled_again(tmp_path, capsys):
+    text = _program("fibonacci2.riv")
+    PythonBackend.modules.clear()
+    _interpreter(Interpreter.Engine.python, cache=ParseCache(tmp_path), cache_code=True).interpret_program(text, False)
+    [path] = tmp_path.glob(f"*{CODE_SUFFIX}")
+    path.write_bytes(b"not marshalled code")
+    PythonBackend.modules.clear()
+    intr = _interpreter(Interpreter.Engine.python, cache=ParseCache(tmp_path), cache_code=True)
+    intr.interpret_program(text, False)
+    assert intr.backend.misses == 1
+    assert capsys.readouterr().out == "0 1 1 2 3 5 8 13 21\n" * 2
+
+def test_code_is_only_cached_when_asked(tmp_path, capsys):
+    PythonBackend.modules.clear()
+    intr = _interpreter(Interpreter.Engine.python, cache=ParseCache(tmp_path))
+    intr.interpret_program(_program("fibonacci2.riv"), False)
+    assert intr.cache.misses == 1
+    assert list(tmp_path.glob(f"*{CODE_SUFFIX}")) == []
+
+@pytest.mark.skipif(not hasattr(os, "geteuid"), reason="no owners or modes to check")
+def test_code_in_a_shared_directory_is_not_run(tmp_path, capsys):
+    text = _program("fibonacci2.riv")
+    PythonBackend.modules.clear()
+    _interpreter(Interpreter.Engine.python, cache=ParseCache(tmp_path), cache_code=True).interpret_program(text, False)
+    assert len(list(tmp_path.glob(f"*{CODE_SUFFIX}"))) == 1
+    # once others can write there, what is there can't be trusted
+    tmp_path.chmod(0o777)
+    PythonBackend.modules.clear()
+    intr = _interpreter(Interpreter.Engine.python, cache=ParseCache(tmp_path), cache_code=True)
+    intr.interpret_program(text, False)
+    assert (intr.backend.misses, intr.backend.hits) == (1, 0)
+    assert capsys.readouterr().out == "0 1 1 2 3 5 8 13 21\n" * 2
+
+def test_riv_keeps_modules_on_disk(tmp_path):
+    command = [sys.executable, "-m", "rivulet.riv_interpreter", str(PROGRAMS / "fibonacci2.riv"), "-o", "numeric",
+               "--engine", "python", "--cache-dir", str(tmp_path), "--cache-code"]
+    assert subprocess.run(command, capture_output=True, text=True, check=True).stdout == "0 1 1 2 3 5 8 13 21\n"
+    [path] = tmp_path.glob(f"*{CODE_SUFFIX}")
+    inode = path.stat().st_ino
+    # the second run loads the module rather than writing it again
+    assert subprocess.run(command, capture_output=True, text=True, check=True).stdout == "0 1 1 2 3 5 8 13 21\n"
+    assert path.stat().st_ino == inode
+
+def test_source_is_python(capsys):
+    glyphs = Parser().parse_program(_program("fibonacci1.riv"))
+    _interpreter(Interpreter.Engine.python).interpret_glyphs(glyphs)
+    source = PythonBackend().source([g for g in glyphs], [1, 2, 3])
+    compile(source, "<test>", "exec")
+    assert "def run(" in source
+    # all in one block, glyphs with while questions before the last don't recurse
+    assert "_pending.append(" in source
+    assert source.count("_block0()") == 2    # its definition, and the call from run
+
+def test_while_loop_is_a_python_loop():
+    states = _run_glyphs(_countdown_glyphs(100000), Interpreter.Engine.python)
+    # the last pass rolls back, so list 1 holds one less than n
+    assert states[-1][1] == [99999]
+    assert states[-1][2] == [1]
+    # the first glyph, each pass of the loop and the final state
+    assert len(states) == 1 + 100000 + 1
+
+def test_repeat_before_the_last_glyph_does_not_recurse():
+    # each pass repeats the block from its first glyph, then carries on to the second
+    glyphs = _countdown_glyphs(3000) + [Glyph(level=2, list_size=3, glyph=[[" "]], tokens=[
+        Token(type=TokenType.data, subtype=Subtype.value, value=1, list=3, assign_to_cell=0, action=None)])]
+    tree = _run_glyphs(glyphs, Interpreter.Engine.tree)[-1]
+    assert _run_glyphs(glyphs, Interpreter.Engine.python)[-1] == tree == {1: [2999], 2: [1], 3: [2999]}
+
+def test_unknown_tokens_run_through_the_tree_walker(capsys):
+    # a pop_and_append of a value has no cell to pop: the tree-walker reports it
+    action = Token(type=TokenType.action, subtype=Subtype.element, command=Command.pop_and_append)
+    token = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=2, assign_to_cell=0, action=action)
+    glyphs = [Glyph(level=1, list_size=2, id=0, tokens=[token])]
+    source = PythonBackend().source(glyphs, [1, 2])
+    assert "_reference(_glyphs[" in source
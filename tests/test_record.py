@@ -0,0 +1,200 @@
+# pylint: skip-file
+"""
+Test recording runs and replaying the state from the recordings
+"""
+import io
+import random
+import subprocess
+import sys
+import pytest
+from pathlib import Path
+from rivulet.riv_compiler import Action
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_record import Recorder, Replay, read_value, write_value
+from rivulet.riv_synthetic import Shape, Strand, SyntheticGlyph, draw, generate
+from rivulet.riv_tokens import Command, Glyph, Subtype, Token, TokenType
+from rivulet.riv_trace import TraceSink
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+FIBONACCI = (PROGRAMS / "fibonacci1.riv").read_text(encoding="utf-8")
+
+class Outcomes(TraceSink):
+    def __init__(self):
+        self.events = []
+    def glyph(self, event):
+        self.events.append((event.glyph.id, event.outcome))
+
+def _run(text, recorder, engine=Interpreter.Engine.compiled, rollback=Interpreter.Rollback.journal, trace=None,
+         debug_deltas=False):
+    "The states a program's text passes through, as given to the debug callback, with the run recorded"
+    states = []
+    intr = Interpreter()
+    intr.recorder = recorder
+    intr.engine = engine
+    intr.rollback = rollback
+    intr.trace = trace
+    intr.debug_deltas = debug_deltas
+    intr.interpret_program(text, False, states.append)
+    return states
+
+def _countdown(n):
+    "list2[0] = n, then a while block taking 1 from it and adding 1 to list1[0] until it reaches 0"
+    start = Token(type=TokenType.data, subtype=Subtype.value, value=n, list=2, assign_to_cell=0, action=None)
+    step = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=2, assign_to_cell=0,
+                 action=Token(type=TokenType.action, subtype=Subtype.element, command=Command.subtraction_assignment))
+    count = Token(type=TokenType.data, subtype=Subtype.value, value=1, list=1, assign_to_cell=0, action=None)
+    question = Token(type=TokenType.question_marker, subtype=Subtype.first, applies_to="cell",
+                     ref_cell=[2, 0], block_type="while")
+    return [
+        Glyph(level=1, tokens=[start], list_size=3, glyph=[[" "]]),
+        Glyph(level=2, tokens=[step, count, question], list_size=3, glyph=[[" "]]),
+    ]
+
+def _record(text, min_gap=1 << 16, **settings):
+    "The states a run passes through, and a Replay of its recording"
+    stream = io.BytesIO()
+    states = _run(text, Recorder(stream, min_gap=min_gap), **settings)
+    stream.seek(0)
+    return states, Replay(stream)
+
+@pytest.mark.parametrize("engine", [Interpreter.Engine.compiled, Interpreter.Engine.tree])
+@pytest.mark.parametrize("name", sorted(p.name for p in PROGRAMS.glob("*.riv")))
+def test_replay_matches_the_run(name, engine, capsys):
+    states, replay = _record((PROGRAMS / name).read_text(encoding="utf-8"), min_gap=16, engine=engine)
+    assert replay.complete
+    assert len(replay) == len(states) - 1
+    for runs, state in enumerate(states[:-1], start=1):
+        assert replay.state(runs) == state
+    assert replay.final() == states[-1]
+    assert replay.state(0) == dict((list_id, []) for list_id in replay.ids)
+
+def test_events():
+    sink = Outcomes()
+    stream = io.BytesIO()
+    _run(FIBONACCI, Recorder(stream), trace=sink)
+    events = list(Replay(io.BytesIO(stream.getvalue())).events())
+    assert events == sink.events
+    assert set(outcome for _, outcome in events) == {Action.cont, Action.repeat, Action.rollback}
+
+def test_seeking_reads_from_a_keyframe():
+    program = generate(Shape(glyphs=400, blocks=0.5), 2)
+    states, replay = _record(program.source, min_gap=256)
+    assert len(replay.keyframes) > 10
+    assert [runs for runs, _ in replay.keyframes] == sorted(set(runs for runs, _ in replay.keyframes))
+    for runs in random.Random(0).sample(range(len(replay) + 1), 40):
+        assert replay.state(runs) == (states[runs - 1] if runs else replay.state(0))
+    assert replay.final() == program.expected
+    with pytest.raises(IndexError):
+        replay.state(len(replay) + 1)
+
+def test_keyframes_are_a_share_of_the_recording():
+    program = generate(Shape(glyphs=1000, blocks=0.5), 1)
+    stream = io.BytesIO()
+    _run(program.source, Recorder(stream, spacing=4, min_gap=0))
+    replay = Replay(io.BytesIO(stream.getvalue()))
+    assert len(replay.keyframes) > 10
+    # each keyframe waits for records of four times the size of the one before it
+    values = bytearray()
+    for runs, _ in replay.keyframes:
+        for cells in replay.state(runs).values():
+            for value in cells:
+                write_value(values, value)
+    assert len(values) <= len(replay.data) / 4
+
+def test_size_grows_with_changes_not_state():
+    small, large = io.BytesIO(), io.BytesIO()
+    for stream, n in ((small, 1000), (large, 2000)):
+        intr = Interpreter()
+        intr.recorder = Recorder(stream)
+        intr.interpret_glyphs(_countdown(n))
+    per_run = (len(large.getvalue()) - len(small.getvalue())) / 1000
+    assert per_run < 20
+
+def test_list_appended_to_a_list():
+    # appending list 1 to list 2 leaves None in list 2's cells
+    glyph = SyntheticGlyph(1, [Strand(0, value=3), Strand(0, value=4),
+                               Strand(1, ref_row=0, command=1, applies_to="list2list")])
+    glyph.place()
+    states, replay = _record("\n".join(draw(glyph, 9)))
+    assert states[-1][2] == [None, None]
+    assert replay.state(1) == states[0]
+    assert replay.final() == states[-1]
+
+@pytest.mark.parametrize("value", [0, 1, -1, 63, -64, 64, 2 ** 70, -(2 ** 70) - 3, 0.5, -2.25, float("inf"),
+                                   complex(1, -2), complex(0, 0.5), None])
+def test_values_round_trip(value):
+    out = bytearray()
+    write_value(out, value)
+    out += b"\xff"
+    read, pos = read_value(bytes(out), 0)
+    assert read == value and type(read) == type(value)
+    assert pos == len(out) - 1
+
+def test_small_ints_take_a_byte():
+    out = bytearray()
+    for value in range(-16, 16):
+        write_value(out, value)
+    assert len(out) == 32
+
+def test_cut_short_recording():
+    program = generate(Shape(glyphs=200, blocks=0.5), 5)
+    states, replay = _record(program.source, min_gap=128)
+    data = replay.data
+    cut = Replay(io.BytesIO(data[:replay.keyframes[-1][1] + 40]))
+    assert not cut.complete
+    assert len(cut.keyframes) == len(replay.keyframes) - 1
+    assert 0 < len(cut) <= len(replay)
+    for runs in range(0, len(cut) + 1, 7):
+        assert cut.state(runs) == replay.state(runs)
+    with pytest.raises(ValueError):
+        cut.final()
+
+def test_cut_at_every_offset():
+    program = generate(Shape(glyphs=60, blocks=0.5), 3)
+    _, replay = _record(program.source, min_gap=32)
+    data = replay.data
+    for size in range(len(data)):
+        try:
+            cut = Replay(io.BytesIO(data[:size]))
+        except ValueError:
+            # nothing to replay: cut in the header, before the first keyframe, or not a recording at all
+            assert size < replay.keyframes[1][1]
+            continue
+        assert len(cut) <= len(replay)
+        for runs in (0, len(cut) // 2, len(cut)):
+            assert cut.state(runs) == replay.state(runs)
+        if not cut.complete:
+            with pytest.raises(ValueError):
+                cut.final()
+
+def test_recording_with_debug_deltas():
+    stream = io.BytesIO()
+    deltas = _run(FIBONACCI, Recorder(stream), debug_deltas=True)
+    replay = Replay(io.BytesIO(stream.getvalue()))
+    assert replay.final() == _run(FIBONACCI, None)[-1]
+    assert sum(len(d.changes) for d in deltas) > 0
+
+@pytest.mark.parametrize("settings", [{"engine": Interpreter.Engine.python},
+                                      {"rollback": Interpreter.Rollback.snapshot}])
+def test_recording_needs_the_journal(settings):
+    with pytest.raises(ValueError):
+        _run(FIBONACCI, Recorder(io.BytesIO()), **settings)
+
+def test_not_a_recording():
+    with pytest.raises(ValueError):
+        Replay(io.BytesIO(b"not a recording"))
+
+def test_riv_record(tmp_path):
+    recording = tmp_path / "fib.rivrec"
+    result = subprocess.run([sys.executable, "-m", "rivulet.riv_interpreter", str(PROGRAMS / "fibonacci1.riv"),
+                             "-o", "numeric", "--record", str(recording)], capture_output=True, text=True)
+    assert result.returncode == 0
+    assert result.stdout == "0 1 1 2 3 5 8 13 21\n"
+    final = subprocess.run([sys.executable, "-m", "rivulet.riv_record", str(recording)],
+                           capture_output=True, text=True, check=True)
+    assert final.stdout == "1: [0, 1, 1, 2, 3, 5, 8, 13, 21]\n3: [21, 13, 8]\n"
+    events = subprocess.run([sys.executable, "-m", "rivulet.riv_record", str(recording), "--events"],
+                            capture_output=True, text=True, check=True)
+    assert events.stdout.splitlines()[0] == "1 glyph 0 cont"
+    assert len(events.stdout.splitlines()) == 34
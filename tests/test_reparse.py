@@ -0,0 +1,76 @@
+# pylint: skip-file
+"""
+Test re-parsing a program after an edit
+"""
+import pytest
+from pathlib import Path
+from rivulet.riv_parser import Parser
+from rivulet.riv_exceptions import RivuletSyntaxError
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+def _program(*names):
+    return "\n\n".join((PROGRAMS / n).read_text(encoding="utf-8").strip("\n") for n in names)
+
+def _source():
+    return _program("fibonacci1.riv", "primeTester.riv", "fibonacci1.riv")
+
+def test_parse_for_edits_matches_parse_program():
+    source = _source()
+    parsed = Parser().parse_for_edits(source)
+    assert parsed.glyphs == Parser().parse_program(source)
+    assert len(parsed.tops) == len(parsed.bottoms) == len(parsed.glyphs)
+
+def test_unchanged_program_is_reused():
+    source = _source()
+    parsed = Parser().parse_for_edits(source)
+    assert Parser().reparse_program(parsed, source) is parsed
+
+def test_inserted_line_reuses_other_glyphs():
+    source = _source()
+    parsed = Parser().parse_for_edits(source)
+    lines = source.splitlines()
+    g = len(parsed.glyphs) // 2
+    lines.insert(parsed.tops[g], "")
+    edited = "\n".join(lines)
+
+    reparsed = Parser().reparse_program(parsed, edited)
+    assert reparsed.glyphs == Parser().parse_program(edited)
+    assert reparsed.glyphs[0] is parsed.glyphs[0]
+    assert reparsed.glyphs[-1] is parsed.glyphs[-1]
+    assert reparsed.tops[-1] == parsed.tops[-1] + 1
+    assert reparsed.primes is parsed.primes
+
+def test_added_and_removed_glyphs():
+    parsed = Parser().parse_for_edits(_program("fibonacci1.riv"))
+    edited = _program("fibonacci1.riv", "primeTester.riv")
+    reparsed = Parser().reparse_program(parsed, edited)
+    assert reparsed.glyphs == Parser().parse_program(edited)
+
+    shrunk = Parser().reparse_program(reparsed, _program("fibonacci1.riv"))
+    assert shrunk.glyphs == parsed.glyphs
+
+def test_reparse_lines():
+    source = _source()
+    parsed = Parser().parse_for_edits(source)
+    lines = source.splitlines()
+    g = 1
+    first, last = parsed.tops[g], parsed.bottoms[g] + 1
+    reparsed = Parser().reparse_lines(parsed, first, last, [])
+    assert reparsed.glyphs == Parser().parse_program("\n".join(lines[:first] + lines[last:]))
+
+def test_errors_match_parse_program():
+    source = _source()
+    parsed = Parser().parse_for_edits(source)
+    lines = source.splitlines()
+    # lose the End of a glyph
+    g = len(parsed.glyphs) // 2
+    end = parsed.bottoms[g]
+    lines[end] = lines[end].replace("╷", " ")
+    edited = "\n".join(lines)
+
+    with pytest.raises(RivuletSyntaxError) as expected:
+        Parser().parse_program(edited)
+    with pytest.raises(RivuletSyntaxError) as err:
+        Parser().reparse_program(parsed, edited)
+    assert str(err.value) == str(expected.value)
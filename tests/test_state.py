@@ -0,0 +1,56 @@
+# pylint: skip-file
+"""
+Test the slotted state store
+"""
+import copy
+import pytest
+from rivulet.riv_counted import CountedList
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_state import State
+from rivulet.riv_tokens import Glyph, Subtype, Token, TokenType
+
+def test_only_referenced_lists_are_made():
+    made = State([1, 2, 3, 5, 7], referenced=[7, 2, 11])
+    assert made.slots == {2: 0, 7: 1}
+    assert made.slot(11) is None
+    assert all(type(values) is CountedList for values in made)
+
+def test_lists_are_made_when_asked_for():
+    made = State([1, 2, 3], referenced=[3])
+    made.of(1).append(4)
+    assert made.slots == {3: 0, 1: 1}
+    assert made.copy_lists() == {1: [4], 2: [], 3: []}
+    with pytest.raises(KeyError):
+        made.of(5)
+
+def test_view_reads_like_a_dict():
+    made = State([1, 2, 3], referenced=[2])
+    made.of(2).extend([7, 8])
+    view = made.view()
+    assert view == {1: [], 2: [7, 8], 3: []}
+    assert repr(view) == "{1: [], 2: [7, 8], 3: []}"
+    assert 3 in view and 4 not in view
+    # unmade lists stay unmade
+    assert made.slots == {2: 0}
+
+def test_deep_copies_are_independent():
+    made = State([1, 2])
+    made.of(1).append(1)
+    made.of(2).extend([0, -1])
+    copied = copy.deepcopy(made)
+    copied.of(2).append(5)
+    assert made.copy_lists() == {1: [1], 2: [0, -1]}
+    assert type(copied) is State and type(copied[0]) is CountedList
+
+@pytest.mark.parametrize("engine", list(Interpreter.Engine))
+def test_unreferenced_lists_still_reported(engine):
+    tokens = [Token(type=TokenType.data, subtype=Subtype.value, value=value, list=list_id, assign_to_cell=0,
+                    action=None) for list_id, value in ((1, 2), (2, 1))]
+    states = []
+    intr = Interpreter()
+    intr.engine = engine
+    intr.interpret_glyphs([Glyph(level=1, tokens=tokens, list_size=40, glyph=[[" "]])], states.append)
+    final = states[-1]
+    assert len(final) == 40
+    assert final[1] == [2] and final[2] == [1]
+    assert not any(values for list_id, values in final.items() if list_id not in (1, 2))
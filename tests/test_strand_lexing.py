@@ -298,3 +298,41 @@ def test_lex_right_prestart():
     assert len(starts) == 1
     assert starts[0]["type"] == "action"
     assert starts[0]["subtype"] == "list"
+
+def test_long_horizontal_strand():
+    "A strand far longer than the recursion limit is traced in full"
+    lexr = Parser()
+    gl = [{"glyph": [["╰"] + ["─"] * 12000]}]
+    lexr._Parser__load_primes(gl)
+    starts = lexr._Parser__lex_glyph(gl[0]["glyph"])
+    assert len(starts) == 1
+    assert starts[0]["subtype"] == "value"
+    assert starts[0]["value"] == 12000
+    assert len(starts[0]["cells"]) == 12000
+    assert starts[0]["cells"][-1] == {"symbol": "─", "x": 12000, "y": 0}
+
+def test_long_vertical_strand():
+    lexr = Parser()
+    gl = [{"glyph": [["╮"]] + [["│"] for _ in range(12000)]}]
+    lexr._Parser__load_primes(gl)
+    starts = lexr._Parser__lex_glyph(gl[0]["glyph"])
+    assert len(starts) == 1
+    assert starts[0]["type"] == "data"
+    assert starts[0]["subtype"] == "value"
+    assert len(starts[0]["cells"]) == 12000
+    assert all(c["dir"] == "down" for c in starts[0]["cells"][:-1])
+
+def test_long_winding_strand():
+    "Corners all the way along a strand of 12k cells"
+    lexr = Parser()
+    gl = [{"glyph": [
+        list("╰" + "╮╭" * 3000 + "─"),
+        list(" " + "╰╯" * 3000 + " "),
+    ]}]
+    lexr._Parser__load_primes(gl)
+    starts = lexr._Parser__lex_glyph(gl[0]["glyph"])
+    assert len(starts) == 1
+    assert starts[0]["subtype"] == "value"
+    assert starts[0]["value"] == 1
+    assert len(starts[0]["cells"]) == 12001
+    assert [c["dir"] for c in starts[0]["cells"][:4]] == ["down", "right", "up", "right"]
@@ -0,0 +1,144 @@
+# pylint: skip-file
+"""
+Test the synthetic program generator against the parser and the interpreter
+"""
+import json
+import subprocess
+import sys
+import pytest
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_parser import Parser
+from rivulet.riv_synthetic import Shape, Strand, SyntheticGlyph, Question, draw, generate
+from rivulet.riv_tokens import Subtype
+
+SHAPES = {
+    "default": Shape(glyphs=60),
+    "flat": Shape(glyphs=40, levels=1),
+    "deep": Shape(glyphs=60, height=12, levels=6, blocks=0.6),
+    "while": Shape(glyphs=50, kinds=(1, 0, 0), blocks=0.6, block_size=(1, 6)),
+    "if": Shape(glyphs=50, kinds=(0, 1, 0), height=14, strands=(4, 10)),
+    "list2list": Shape(glyphs=60, actions=0.9, refs=0.8, list2list=1),
+    "across": Shape(glyphs=30, across=4, width=20),
+    "short": Shape(glyphs=30, height=5, levels=1, strands=(0, 3)),
+}
+
+def _final(source, engine=Interpreter.Engine.compiled, rollback=Interpreter.Rollback.journal):
+    "The state a program's text ends with"
+    states = []
+    intr = Interpreter()
+    intr.engine = engine
+    intr.rollback = rollback
+    intr.interpret_program(source, False, states.append)
+    return states[-1]
+
+def _parse(glyph, height=9):
+    "Tokens of a single glyph, drawn"
+    return Parser().parse_program("\n".join(draw(glyph, height)))[0]["tokens"]
+
+@pytest.mark.parametrize("name", SHAPES)
+@pytest.mark.parametrize("engine", list(Interpreter.Engine))
+def test_expected_state(name, engine):
+    for seed in range(4):
+        program = generate(SHAPES[name], seed)
+        assert _final(program.source, engine) == program.expected
+
+@pytest.mark.parametrize("rollback", list(Interpreter.Rollback))
+def test_expected_state_by_rollback(rollback):
+    program = generate(Shape(glyphs=200, blocks=0.5), 3)
+    assert _final(program.source, rollback=rollback) == program.expected
+
+def test_glyph_count_and_levels():
+    shape = Shape(glyphs=300, levels=4, height=9)
+    program = generate(shape, 1)
+    glyphs = Parser().parse_program(program.source)
+    assert len(glyphs) == len(program.glyphs) == 300
+    assert [g["level"] for g in glyphs] == [g.level for g in program.glyphs]
+    assert 1 < max(g.level for g in program.glyphs) <= 4
+    assert glyphs[0]["level"] == 1
+    assert all(len(g["glyph"]) == 9 for g in glyphs)
+
+def test_tokens_match_the_model():
+    program = generate(Shape(glyphs=200, list2list=0.5), 2)
+    for glyph, model in zip(Parser().parse_program(program.source), program.glyphs):
+        data = [t for t in glyph["tokens"] if t["type"] == "data"]
+        assert [t["list"] for t in data] == [[1, 2, 3, 5, 7, 11, 13, 17, 19][s.row] for s in model.strands]
+        assert [t["assign_to_cell"] for t in data] == [s.cell for s in model.strands]
+        for token, strand in zip(data, model.strands):
+            if strand.value is not None:
+                assert token["value"] == strand.value
+            elif strand.applies_to != "list2list":
+                assert token["ref_cell"][1] == strand.ref_cell
+            if strand.command is None:
+                assert token["action"] is None
+            else:
+                assert token["action"]["subtype"] == {"cell": Subtype.element, "list": Subtype.list,
+                                                      "list2list": Subtype.list2list}[strand.applies_to]
+        questions = [t for t in glyph["tokens"] if t["type"] == "question_marker"]
+        if model.question is None:
+            assert questions == []
+        else:
+            assert questions[0]["block_type"] == model.question.block_type
+            assert questions[0]["applies_to"] == model.question.applies_to
+
+def test_every_kind_of_strand_is_drawn():
+    program = generate(Shape(glyphs=500, list2list=0.5), 0)
+    strands = [s for g in program.glyphs for s in g.strands]
+    assert set((s.applies_to, s.command) for s in strands if s.command is not None) >= {
+        ("cell", 0), ("cell", 1), ("cell", -1), ("cell", 2), ("cell", 6),
+        ("list", 0), ("list", 1), ("list", 2), ("list", 6), ("list2list", 0), ("list2list", 2)}
+    questions = [g.question for g in program.glyphs if g.question is not None]
+    assert set((q.block_type, q.applies_to) for q in questions) == {
+        ("while", "cell"), ("while", "list"), ("if", "cell"), ("if", "list")}
+
+@pytest.mark.parametrize("value", [-3, -1, 0, 1, 4])
+@pytest.mark.parametrize("row", [0, 1, 4])
+def test_value_strands(row, value):
+    [token] = _parse(SyntheticGlyph(1, [Strand(row, value=value)]))
+    assert (token["list"], token["value"], token["subtype"]) == ([1, 2, 3, 5, 7][row], value, Subtype.value)
+
+@pytest.mark.parametrize("ref_row", [0, 2, 5])
+def test_reference_strands(ref_row):
+    glyph = SyntheticGlyph(1, [Strand(2, value=1), Strand(2, ref_row=ref_row)])
+    glyph.place()
+    tokens = _parse(glyph)
+    assert tokens[1]["ref_cell"] == [[1, 2, 3, 5, 7, 11][ref_row], glyph.strands[1].ref_cell]
+    assert glyph.strands[1].ref_cell == (2 if ref_row == 2 else 0)
+
+@pytest.mark.parametrize("command,name", [(0, "overwrite"), (1, "insert"), (-1, "subtraction_assignment"),
+                                          (2, "multiplication_assignment"), (3, "pop"),
+                                          (6, "reverse_subtraction_assignment")])
+def test_cell_actions(command, name):
+    [token] = _parse(SyntheticGlyph(1, [Strand(0, ref_row=1, command=command)]), 11)
+    assert (token["action"]["command"], token["action"]["subtype"]) == (name, Subtype.element)
+
+@pytest.mark.parametrize("block_type", ["while", "if"])
+@pytest.mark.parametrize("applies_to", ["cell", "list"])
+def test_questions(block_type, applies_to):
+    glyph = SyntheticGlyph(2, [Strand(3, value=2), Strand(3, value=1)], Question(3, block_type, applies_to, 1))
+    glyph.place()
+    question = [t for t in _parse(glyph) if t["type"] == "question_marker"][0]
+    assert (question["block_type"], question["applies_to"]) == (block_type, applies_to)
+    if applies_to == "cell":
+        assert question["ref_cell"] == [5, 1] and glyph.question.cell == 1
+    else:
+        assert question["ref_list"] == 5
+
+def test_same_seed_same_program():
+    assert generate(Shape(glyphs=50), 7).source == generate(Shape(glyphs=50), 7).source
+    assert generate(Shape(glyphs=50), 7).source != generate(Shape(glyphs=50), 8).source
+
+def test_runs_past_the_recursion_limit():
+    program = generate(Shape(glyphs=sys.getrecursionlimit() + 500, levels=2), 0)
+    assert _final(program.source) == program.expected
+
+def test_shape_too_short():
+    with pytest.raises(ValueError):
+        generate(Shape(height=6, levels=3))
+
+def test_command_line(tmp_path):
+    source, expected = tmp_path / "synthetic.riv", tmp_path / "expected.json"
+    subprocess.run([sys.executable, "-m", "rivulet.riv_synthetic", "--glyphs", "20", "--seed", "4",
+                    "-o", str(source), "--expected", str(expected)], check=True)
+    program = generate(Shape(glyphs=20), 4)
+    assert source.read_text(encoding="utf-8") == program.source
+    assert json.loads(expected.read_text()) == dict((str(k), v) for k, v in program.expected.items())
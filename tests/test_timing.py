@@ -0,0 +1,114 @@
+# pylint: skip-file
+"""
+Test the phase timer and the parser's counts of its work
+"""
+import io
+import subprocess
+import sys
+from pathlib import Path
+from rivulet.riv_cache import ParseCache
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_parser import Parser
+from rivulet.riv_synthetic import Strand, SyntheticGlyph, draw
+from rivulet.riv_timing import PhaseTimer
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+FIBONACCI = (PROGRAMS / "fibonacci1.riv").read_text(encoding="utf-8")
+
+PARSE_PHASES = ["make grid", "remove blank lines", "locate glyphs", "prepare glyphs", "load primes",
+                "lex glyphs", "parse glyphs"]
+
+def _parse(text, **settings):
+    parser = Parser(**settings)
+    parser.timer = PhaseTimer()
+    return parser.parse_program(text), parser.timer
+
+def test_phases_nest():
+    timer = PhaseTimer()
+    with timer.phase("outer"):
+        with timer.phase("inner"):
+            pass
+        with timer.phase("inner"):
+            pass
+    with timer.phase("after"):
+        pass
+    assert list(timer.seconds) == [("outer",), ("outer", "inner"), ("after",)]
+    assert timer.total("outer") >= timer.total("outer", "inner") > 0
+    assert timer.total("missing") == 0
+
+def test_parser_phases():
+    glyphs, timer = _parse(FIBONACCI)
+    assert [path[0] for path in timer.seconds] == PARSE_PHASES
+    assert all(secs > 0 for secs in timer.seconds.values())
+    assert timer.counters["glyphs"] == len(glyphs) == 6
+
+def test_parser_counters():
+    text = "\n".join(draw(SyntheticGlyph(1, [Strand(0, value=1)]), 5))
+    glyphs, timer = _parse(text)
+    assert timer.counters["characters scanned"] == len(text) - text.count("\n")
+    assert timer.counters["glyph candidates"] == 2
+    assert timer.counters["strands traced"] == 1
+    assert timer.counters["cells visited"] == len(glyphs[0]["tokens"][0]["cells"])
+    assert timer.counters["refs resolved"] == 0
+
+def test_refs_and_question_markers_are_counted():
+    glyphs, timer = _parse(FIBONACCI)
+    tokens = [t for g in glyphs for t in g["tokens"]]
+    questions = [t for t in tokens if t["type"] == "question_marker"]
+    refs = [t for t in tokens if t["subtype"] == "ref"]
+    assert timer.counters["refs resolved"] == len(refs) + 2 * len(questions)
+    actions = [t for t in tokens if t.get("action") is not None]
+    assert timer.counters["strands traced"] == len(tokens) + len(actions) + len(questions)
+
+def test_parallel_counts_match_serial():
+    text = "\n\n".join(p.read_text(encoding="utf-8").strip("\n") for p in sorted(PROGRAMS.glob("*.riv")))
+    _, serial = _parse(text)
+    _, parallel = _parse(text, workers=2, parallel_min_glyphs=1)
+    assert parallel.counters == serial.counters
+    assert ("lex and parse glyphs",) in parallel.seconds and ("lex glyphs",) not in parallel.seconds
+
+def test_no_timer_no_timing():
+    parser = Parser()
+    parser.parse_program(FIBONACCI)
+    assert parser.timer is None
+
+def test_interpreter_phases(capsys):
+    intr = Interpreter()
+    intr.output = Interpreter.OutputOption.numeric
+    intr.timer = PhaseTimer()
+    intr.interpret_program(FIBONACCI, False)
+    assert capsys.readouterr().out == "0 1 1 2 3 5 8 13 21\n"
+    paths = list(intr.timer.seconds)
+    assert [p for p in paths if len(p) == 1] == [("parse",), ("execute",), ("output",)]
+    assert [p[1] for p in paths if p[0] == "parse" and len(p) == 2] == PARSE_PHASES
+
+def test_cached_parse_has_no_parser_phases(tmp_path):
+    first = Interpreter()
+    first.cache = ParseCache(tmp_path)
+    first.interpret_program(FIBONACCI, False)
+    intr = Interpreter()
+    intr.cache = ParseCache(tmp_path)
+    intr.timer = PhaseTimer()
+    intr.interpret_program(FIBONACCI, False)
+    assert [p for p in intr.timer.seconds if p[0] == "parse"] == [("parse",)]
+    assert not intr.timer.counters
+
+def test_report():
+    _, timer = _parse(FIBONACCI)
+    stream = io.StringIO()
+    timer.report(stream)
+    lines = stream.getvalue().splitlines()
+    assert lines[0].split() == ["phase", "ms"]
+    assert [line.split()[0] for line in lines[1:8]] == [p.split()[0] for p in PARSE_PHASES]
+    assert lines[8].split() == ["counter", "count"]
+    assert lines[9].split() == ["characters", "scanned", str(timer.counters["characters scanned"])]
+
+def test_riv_time():
+    result = subprocess.run([sys.executable, "-m", "rivulet.riv_interpreter", str(PROGRAMS / "fibonacci1.riv"),
+                             "-o", "numeric", "--time"], capture_output=True, text=True)
+    assert result.returncode == 0
+    assert result.stdout == "0 1 1 2 3 5 8 13 21\n"
+    names = [line.split()[0] for line in result.stderr.splitlines()]
+    assert names[:2] == ["phase", "parse"]
+    assert "execute" in names and "output" in names and "refs" in names
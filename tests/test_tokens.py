@@ -0,0 +1,74 @@
+# pylint: skip-file
+"""
+Test the typed token model and its dict-style view
+"""
+import copy
+import json
+import pickle
+import pytest
+from pathlib import Path
+from rivulet.riv_parser import Parser
+from rivulet.riv_tokens import (Cell, Command, Glyph, Subtype, Token, TokenType, glyphs_from_json, pack_token,
+                                to_json, unpack_token)
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+def _parse(name):
+    return Parser().parse_program((PROGRAMS / name).read_text(encoding="utf-8"))
+
+def test_dict_view():
+    token = Token(x=1, y=2, type=TokenType.data, action=None)
+    assert token["x"] == 1
+    assert token.y == 2
+    assert "action" in token
+    assert "cells" not in token
+    assert "keys" not in token
+    assert token.get("cells") is None
+    assert token.keys() == ["x", "y", "type", "action"]
+    with pytest.raises(KeyError):
+        token["cells"]
+    with pytest.raises(KeyError):
+        token["not_a_field"] = 1
+
+    token["cells"] = [Cell("─", 2, 2)]
+    assert token.cells[0] == {"symbol": "─", "x": 2, "y": 2}
+    del token["cells"]
+    assert "cells" not in token
+
+def test_enums_compare_as_strings():
+    assert TokenType.question_marker == "question_marker"
+    assert Subtype.list2list == "list2list"
+    assert Command("pop_and_append") is Command.pop_and_append
+    assert json.dumps([Subtype.ref]) == '["ref"]'
+
+def test_parse_output_is_typed():
+    glyphs = _parse("fibonacci1.riv")
+    assert all(isinstance(g, Glyph) for g in glyphs)
+    tokens = [t for g in glyphs for t in g["tokens"]]
+    assert all(isinstance(t, Token) and isinstance(t.type, TokenType) for t in tokens)
+    assert all(isinstance(c, Cell) for t in tokens for c in t.cells)
+    actions = [t.action for t in tokens if t.action]
+    assert actions
+    assert all(isinstance(a.command, Command) and isinstance(a.subtype, Subtype) for a in actions)
+
+def test_copies_are_independent():
+    glyphs = _parse("fibonacci1.riv")
+    dup = copy.deepcopy(glyphs)
+    assert dup == glyphs
+    dup[0].tokens[0].cells[0].x = 99
+    assert glyphs[0].tokens[0].cells[0].x != 99
+
+def test_json_round_trip():
+    glyphs = _parse("primeTester.riv")
+    loaded = glyphs_from_json(json.loads(json.dumps(glyphs, default=to_json)))
+    assert loaded == glyphs
+    assert [type(t.action.command) for g in loaded for t in g.tokens if t.action] == \
+        [type(t.action.command) for g in glyphs for t in g.tokens if t.action]
+
+def test_packed_round_trip():
+    tokens = [t for g in _parse("primeTester.riv") for t in g.tokens]
+    packed = pickle.loads(pickle.dumps([pack_token(t) for t in tokens]))
+    unpacked = [unpack_token(p) for p in packed]
+    assert unpacked == tokens
+    assert all(type(t) is Token and all(type(c) is Cell for c in t.cells) for t in unpacked)
+    assert [c.get("dir") for t in unpacked for c in t.cells] == [c.get("dir") for t in tokens for c in t.cells]
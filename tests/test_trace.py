@@ -0,0 +1,69 @@
+# pylint: skip-file
+"""
+Test the interpreter's trace sinks
+"""
+import io
+import json
+import logging
+from pathlib import Path
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_trace import JsonLinesTrace, LoggingTrace, NullTrace, SampledTrace, TextTrace, TraceSink
+
+PROGRAMS = Path(__file__).parent.parent / "programs"
+
+def _run(trace=None, output=Interpreter.OutputOption.numeric, name="fibonacci1.riv"):
+    intr = Interpreter()
+    intr.output = output
+    intr.trace = trace
+    states = []
+    intr.interpret_program((PROGRAMS / name).read_text(encoding="utf-8"), False, states.append)
+    return states
+
+class Recorder(TraceSink):
+    def __init__(self):
+        self.events = []
+    def glyph(self, event):
+        self.events.append((event.glyph["id"], event.outcome.name))
+
+def test_default_text_trace(capsys):
+    _run(output=Interpreter.OutputOption.none)
+    out = capsys.readouterr().out
+    assert out.startswith(" \nglyph: 0\n2: [0, 1]\n3: [21]\n")
+    assert out.count("glyph: ") == 34
+
+def test_text_trace_to_stream(capsys):
+    stream = io.StringIO()
+    _run(TextTrace(stream, buffer_size=100))
+    assert capsys.readouterr().out == "0 1 1 2 3 5 8 13 21\n"
+    assert stream.getvalue().count("glyph: ") == 34
+
+def test_null_trace_makes_no_events(monkeypatch, capsys):
+    def fail(*args):
+        raise AssertionError("event made")
+    monkeypatch.setattr("rivulet.riv_interpreter.GlyphEvent", fail)
+    _run(NullTrace(), output=Interpreter.OutputOption.none)
+    assert "glyph:" not in capsys.readouterr().out
+
+def test_json_lines_trace(capsys):
+    stream = io.StringIO()
+    states = _run(JsonLinesTrace(stream))
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(events) == len(states) - 1
+    assert events[0]["glyph"] == 0
+    assert events[-1]["state"]["1"] == [0, 1, 1, 2, 3, 5, 8, 13, 21]
+    assert {e["outcome"] for e in events} == {"cont", "repeat", "rollback"}
+
+def test_sampled_trace(capsys):
+    every = Recorder()
+    _run(SampledTrace(every, every=5))
+    assert len(every.events) == 34 // 5
+
+    rollbacks = Recorder()
+    _run(SampledTrace(rollbacks, rollbacks_only=True))
+    assert rollbacks.events == [(4, "rollback")]
+
+def test_logging_trace(caplog, capsys):
+    with caplog.at_level(logging.DEBUG, logger="rivulet.trace"):
+        _run(LoggingTrace())
+    assert len(caplog.records) == 34
+    assert caplog.records[0].getMessage().startswith(" \nglyph: 0")
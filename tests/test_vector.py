@@ -0,0 +1,105 @@
+# pylint: skip-file
+"""
+Test list commands run with NumPy against running them cell by cell
+"""
+import random
+import pytest
+from rivulet.riv_compiler import KERNELS, kernel
+from rivulet.riv_interpreter import Interpreter
+from rivulet.riv_tokens import Command, Glyph, Subtype, Token, TokenType
+
+numpy = pytest.importorskip("numpy")
+from rivulet.riv_vector import MIN_CELLS, new_values
+
+def _cell_by_cell(command, target, assign):
+    op = kernel(command)
+    values = list(target)
+    for i, v in enumerate(values):
+        values[i] = op(v, assign[i] if isinstance(assign, list) else assign)
+    return values
+
+def _same(a, b):
+    return [(type(x), x) for x in a] == [(type(y), y) for y in b]
+
+def _values(rng, n, kind):
+    if kind == "small":
+        return [rng.randrange(-50, 50) for _ in range(n)]
+    if kind == "positive":
+        return [rng.randrange(1, 9) for _ in range(n)]
+    if kind == "float":
+        return [rng.uniform(-100, 100) for _ in range(n)]
+    if kind == "big":
+        return [rng.randrange(-50, 50) * 2 ** 70 for _ in range(n)]
+    return [rng.choice([1, 2.5, -3]) for _ in range(n)]
+
+@pytest.mark.parametrize("command", list(KERNELS))
+@pytest.mark.parametrize("kind", ["small", "positive", "float", "big", "mixed"])
+def test_same_as_cell_by_cell(command, kind):
+    rng = random.Random(hash((command, kind)) & 0xffff)
+    n = MIN_CELLS * 2
+    # powers of big ints by big ints would never finish cell by cell
+    assigns = _values(rng, n, "positive" if command == Command.exponent_assignment else kind)
+    for assign in (rng.randrange(-9, 9), rng.uniform(-5, 5), assigns, _values(rng, n, "positive")):
+        target = _values(rng, n, kind)
+        try:
+            expected = _cell_by_cell(command, target, assign)
+        except (ArithmeticError, TypeError):
+            expected = None
+        values = new_values(command, target, assign)
+        if values is not None:
+            assert expected is not None
+            assert _same(values, expected)
+
+def test_vectorized_when_it_can_be():
+    target = list(range(MIN_CELLS * 10))
+    assert new_values(Command.addition_assignment, target, 3) == [v + 3 for v in target]
+    assert new_values(Command.division_assignment, target, 2) == [v / 2 for v in target]
+    assert new_values(Command.exponent_assignment, target, 2) == [v ** 2 for v in target]
+    divisors = [v + 1 for v in target[::-1]]
+    assert new_values(Command.mod_assignment, target, divisors) == [a % b for a, b in zip(target, divisors)]
+
+def test_falls_back():
+    target = list(range(1, MIN_CELLS * 2))
+    assert new_values(Command.addition_assignment, target[:MIN_CELLS - 1], 1) is None
+    assert new_values(Command.addition_assignment, target + [2 ** 64], 1) is None
+    assert new_values(Command.addition_assignment, target + [0.5], 1) is None
+    assert new_values(Command.addition_assignment, target + [None], 1) is None
+    assert new_values(Command.division_assignment, target, 0) is None
+    assert new_values(Command.reverse_mod_assignment, target + [0], 3) is None
+    assert new_values(Command.exponent_assignment, target, 40) is None
+    assert new_values(Command.exponent_assignment, target, -1) is None
+    assert new_values(Command.root_assignment, target, 2) is None
+    assert new_values(Command.multiplication_assignment, target, 2 ** 60) is None
+
+def _list_glyphs(cells, command, subtype):
+    "Fill list 2 with cells values, then apply command to all of it from a value or from list 3"
+    fill = Token(type=TokenType.action, subtype=Subtype.element, command=Command.append)
+    glyphs = [Glyph(level=1, list_size=3, tokens=[
+        Token(type=TokenType.data, subtype=Subtype.value, value=v, list=l, assign_to_cell=0, action=fill)
+        for v in range(cells) for l in (2, 3)])]
+    action = Token(type=TokenType.action, subtype=subtype, command=command)
+    if subtype == Subtype.list:
+        token = Token(type=TokenType.data, subtype=Subtype.value, value=3, list=2, assign_to_cell=0, action=action)
+    else:
+        token = Token(type=TokenType.data, subtype=Subtype.ref, ref_cell=[3, 0], list=2, assign_to_cell=0, action=action)
+    glyphs.append(Glyph(level=1, list_size=3, tokens=[token, token]))
+    return glyphs
+
+@pytest.mark.parametrize("engine", list(Interpreter.Engine))
+@pytest.mark.parametrize("subtype", [Subtype.list, Subtype.list2list])
+@pytest.mark.parametrize("command", [Command.addition_assignment, Command.reverse_division_assignment,
+                                     Command.exponent_assignment, Command.root_assignment])
+def test_engines_agree(engine, subtype, command):
+    def final(list_engine):
+        states = []
+        intr = Interpreter()
+        intr.output = Interpreter.OutputOption.numeric
+        intr.engine = engine
+        intr.list_engine = list_engine
+        try:
+            intr.interpret_glyphs(_list_glyphs(MIN_CELLS * 3, command, subtype), states.append)
+        except ZeroDivisionError:
+            return "ZeroDivisionError"
+        return states[-1]
+    expected = final(Interpreter.ListEngine.python)
+    assert final(Interpreter.ListEngine.numpy) == expected